@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.services.ocr.admission import admission
+
+router = APIRouter(prefix="/api/admission", tags=["admission"])
+
+
+@router.get("")
+async def admission_stats():
+    """
+    Mistral admission control state for this worker process:
+    rate_limiter {rate_per_second, burst, tokens, waiting},
+    endpoints {chat|ocr|transcribe|embed|files: {concurrency, in_flight, queued, calls,
+    retries, failures, rejected, breaker {state, consecutive_failures, opens, retry_in_seconds}}}
+    """
+    return JSONResponse(admission.stats())
@@ -1,13 +1,16 @@
+import asyncio
+import logging
+
 from fastapi import APIRouter, Request
 from fastapi.responses import RedirectResponse
 from authlib.integrations.starlette_client import OAuth
 
 from app.core.config import settings
-from fastapi import Depends
-from sqlalchemy.orm import Session
-from app.db.models.deps import get_db
+from app.core.metrics import stage
 from app.db.models.identity import upsert_google_user
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/auth/google", tags=["auth"])
 
 oauth = OAuth()
@@ -15,15 +18,46 @@ oauth.register(
     name="google",
     client_id=settings.GOOGLE_CLIENT_ID,
     client_secret=settings.GOOGLE_CLIENT_SECRET,
-    server_metadata_url="https://accounts.google.com/.well-known/openid-configuration",
+    server_metadata_url=settings.GOOGLE_METADATA_URL,
     client_kwargs={"scope": "openid email profile"},
 )
 
 
+async def prefetch_oauth_metadata() -> None:
+    """
+    Background task (lifespan): load Google's discovery document and JWKS into the
+    client's cache so /login and /callback never fetch them on the request path.
+    Retries with backoff until Google answers, then refreshes the JWKS periodically.
+    """
+    if not settings.OAUTH_PREFETCH or not settings.GOOGLE_CLIENT_ID:
+        return
+    delay = 1.0
+    while True:
+        try:
+            with stage("oauth_metadata", flow="auth"):
+                await oauth.google.load_server_metadata()
+                await oauth.google.fetch_jwk_set(force=True)
+            break
+        except Exception as e:
+            logger.warning("OAuth metadata prefetch failed, retrying in %.0fs: %s", delay, e)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60.0)
+
+    while settings.OAUTH_JWKS_REFRESH_SECONDS > 0:
+        await asyncio.sleep(settings.OAUTH_JWKS_REFRESH_SECONDS)
+        try:
+            with stage("oauth_jwks", flow="auth"):
+                await oauth.google.fetch_jwk_set(force=True)
+        except Exception as e:
+            logger.warning("OAuth JWKS refresh failed (keeping the cached set): %s", e)
+
+
 @router.get("/login")
 async def google_login(request: Request):
-    # Redirect user to Google
-    return await oauth.google.authorize_redirect(request, settings.GOOGLE_REDIRECT_URI)
+    # Redirect user to Google (OpenID metadata is prefetched at startup, see prefetch_oauth_metadata)
+    with stage("oauth_redirect"):
+        response = await oauth.google.authorize_redirect(request, settings.GOOGLE_REDIRECT_URI)
+    return response
 
 """
 @router.get("/callback")
@@ -44,18 +78,22 @@ async def google_callback(request: Request):
     return RedirectResponse(url="/studio", status_code=302)
 """
 @router.get("/callback")
-async def google_callback(request: Request, db: Session = Depends(get_db)):
-    token = await oauth.google.authorize_access_token(request)
+async def google_callback(request: Request):
+    with stage("oauth_token"):
+        token = await oauth.google.authorize_access_token(request)
 
     # Get profile
-    resp = await oauth.google.get(
-        "https://openidconnect.googleapis.com/v1/userinfo",
-        token=token
-    )
-    profile = resp.json()
-
-    # ✅ Save or update user in Postgres
-    db_user = upsert_google_user(db, profile)
+    with stage("oauth_userinfo"):
+        resp = await oauth.google.get(
+            "https://openidconnect.googleapis.com/v1/userinfo",
+            token=token
+        )
+    with stage("json_parse"):
+        profile = resp.json()
+
+    # ✅ Save or update user in Postgres (one INSERT ... ON CONFLICT round trip, off the event loop)
+    with stage("db_upsert"):
+        db_user = await upsert_google_user(profile)
 
     # ✅ Store session
     request.session["user"] = {
@@ -0,0 +1,61 @@
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.core.config import settings
+from app.core.sse import sse_event
+from app.services.jobs.queue import job_queue
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+FINAL_STATUSES = ("done", "failed")
+
+
+@router.get("/{job_id}")
+async def job_status(job_id: str):
+    """
+    Status of a background upload job (see ?mode=async on the upload endpoints).
+    Returns: job_id, kind, status (queued|running|done|failed), progress, result, error
+    """
+    status = await job_queue.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return JSONResponse(status)
+
+
+@router.get("/{job_id}/events")
+async def job_events(request: Request, job_id: str):
+    """
+    Server-Sent Events for one job, read from the job table so any node can serve them:
+        event: status    data: {...}   whenever status or progress changes
+        event: done      data: {...}   final status (done or failed); stream ends
+    """
+    status = await job_queue.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    async def gen():
+        nonlocal status
+        last = None
+        while True:
+            if status["status"] in FINAL_STATUSES:
+                yield sse_event("done", status)
+                return
+            seen = (status["status"], status["progress"], status["attempts"])
+            if seen != last:
+                yield sse_event("status", status)
+                last = seen
+            await asyncio.sleep(min(1.0, settings.JOB_POLL_SECONDS))
+            if await request.is_disconnected():
+                return
+            status = await job_queue.status(job_id)
+            if status is None:
+                yield sse_event("error", {"detail": "Job not found."})
+                return
+
+    return StreamingResponse(
+        gen(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import render
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus text exposition (0.0.4) of stage latencies, HTTP and Mistral counters and
+    queue gauges, merged across gunicorn workers when METRICS_DIR is set.
+    Meant for the internal scrape network; do not expose it publicly.
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    body = await run_in_threadpool(render)  # reads every worker's snapshot file
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
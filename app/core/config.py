@@ -10,12 +10,192 @@ class Settings:
     GOOGLE_CLIENT_ID: str = os.getenv("GOOGLE_CLIENT_ID", "")
     GOOGLE_CLIENT_SECRET: str = os.getenv("GOOGLE_CLIENT_SECRET", "")
     GOOGLE_REDIRECT_URI: str = os.getenv("GOOGLE_REDIRECT_URI", "http://127.0.0.1:8000/auth/google/callback")
+    GOOGLE_METADATA_URL: str = os.getenv("GOOGLE_METADATA_URL", "https://accounts.google.com/.well-known/openid-configuration")
+    # Fetch the OpenID discovery document + JWKS in the background at startup (skipped
+    # without GOOGLE_CLIENT_ID) so the first login does not wait on Google; JWKS refreshed
+    # every OAUTH_JWKS_REFRESH_SECONDS (0 = never)
+    OAUTH_PREFETCH: bool = os.getenv("OAUTH_PREFETCH", "true").lower() in ("1", "true", "yes")
+    OAUTH_JWKS_REFRESH_SECONDS: float = float(os.getenv("OAUTH_JWKS_REFRESH_SECONDS", "3600"))
     
     # --- Mistral AI ---
     MISTRAL_API_KEY: str = os.getenv("MISTRAL_API_KEY", "")
     MISTRAL_OCR_MODEL: str = os.getenv("MISTRAL_OCR_MODEL", "mistral-ocr-2512")
     MISTRAL_CHAT_MODEL: str = os.getenv("MISTRAL_CHAT_MODEL", "mistral-small-latest")
+    MISTRAL_EMBED_MODEL: str = os.getenv("MISTRAL_EMBED_MODEL", "mistral-embed")
+    MISTRAL_VOXTRAL_MODEL: str = os.getenv("MISTRAL_VOXTRAL_MODEL", "voxtral-mini-latest")
+    MISTRAL_BASE_URL: str = os.getenv("MISTRAL_BASE_URL", "https://api.mistral.ai")
+
+    # Shared async client: keep-alive pool + per-endpoint timeouts (seconds)
+    MISTRAL_MAX_CONNECTIONS: int = int(os.getenv("MISTRAL_MAX_CONNECTIONS", "20"))
+    MISTRAL_MAX_KEEPALIVE: int = int(os.getenv("MISTRAL_MAX_KEEPALIVE", "10"))
+    MISTRAL_KEEPALIVE_EXPIRY: float = float(os.getenv("MISTRAL_KEEPALIVE_EXPIRY", "30"))
+    MISTRAL_CHAT_TIMEOUT: float = float(os.getenv("MISTRAL_CHAT_TIMEOUT", "60"))
+    MISTRAL_OCR_TIMEOUT: float = float(os.getenv("MISTRAL_OCR_TIMEOUT", "120"))
+    MISTRAL_TRANSCRIBE_TIMEOUT: float = float(os.getenv("MISTRAL_TRANSCRIBE_TIMEOUT", "180"))
+    MISTRAL_EMBED_TIMEOUT: float = float(os.getenv("MISTRAL_EMBED_TIMEOUT", "60"))
+
+    # Admission control around every Mistral call (app/services/ocr/admission.py).
+    # Limits are per worker process.
+    MISTRAL_RATE_LIMIT_RPS: float = float(os.getenv("MISTRAL_RATE_LIMIT_RPS", "0"))  # 0 = no rate limit
+    MISTRAL_RATE_LIMIT_BURST: int = int(os.getenv("MISTRAL_RATE_LIMIT_BURST", "10"))
+    MISTRAL_CONCURRENCY_CHAT: int = int(os.getenv("MISTRAL_CONCURRENCY_CHAT", "8"))
+    MISTRAL_CONCURRENCY_OCR: int = int(os.getenv("MISTRAL_CONCURRENCY_OCR", "4"))
+    MISTRAL_CONCURRENCY_TRANSCRIBE: int = int(os.getenv("MISTRAL_CONCURRENCY_TRANSCRIBE", "4"))
+    MISTRAL_CONCURRENCY_EMBED: int = int(os.getenv("MISTRAL_CONCURRENCY_EMBED", "4"))
+    MISTRAL_CONCURRENCY_FILES: int = int(os.getenv("MISTRAL_CONCURRENCY_FILES", "4"))
+    MISTRAL_RETRIES: int = int(os.getenv("MISTRAL_RETRIES", "3"))
+    MISTRAL_RETRY_BASE_SECONDS: float = float(os.getenv("MISTRAL_RETRY_BASE_SECONDS", "0.5"))
+    MISTRAL_RETRY_MAX_WAIT: float = float(os.getenv("MISTRAL_RETRY_MAX_WAIT", "30"))  # longer Retry-After -> 503
+    MISTRAL_BREAKER_FAILURES: int = int(os.getenv("MISTRAL_BREAKER_FAILURES", "5"))  # 0 = no circuit breaker
+    MISTRAL_BREAKER_RESET_SECONDS: float = float(os.getenv("MISTRAL_BREAKER_RESET_SECONDS", "30"))
+
+    # --- Uploads ---
+    UPLOAD_MAX_MB: int = int(os.getenv("UPLOAD_MAX_MB", "50"))
+
+    # --- OCR image preprocessing (process pool) ---
+    OCR_PREPROCESS_WORKERS: int = int(os.getenv("OCR_PREPROCESS_WORKERS", "0"))  # 0 = os.cpu_count()
+    OCR_PREPROCESS_MAX_QUEUE: int = int(os.getenv("OCR_PREPROCESS_MAX_QUEUE", "8"))
+    OCR_PREPROCESS_MODE: str = os.getenv("OCR_PREPROCESS_MODE", "adaptive")  # adaptive | full
+    OCR_TARGET_MAX_SIDE: int = int(os.getenv("OCR_TARGET_MAX_SIDE", "2200"))
+    OCR_MIN_CONTRAST_SPREAD: float = float(os.getenv("OCR_MIN_CONTRAST_SPREAD", "140"))
+    OCR_NOISE_SIGMA_THRESHOLD: float = float(os.getenv("OCR_NOISE_SIGMA_THRESHOLD", "2.5"))
+    OCR_BLUR_VAR_THRESHOLD: float = float(os.getenv("OCR_BLUR_VAR_THRESHOLD", "300"))
+    OCR_CLIPBOARD_CONCURRENCY: int = int(os.getenv("OCR_CLIPBOARD_CONCURRENCY", "4"))
+
+    # --- Page-batched OCR for large PDFs ---
+    # PDFs with more than OCR_BATCH_MIN_PAGES pages are OCR'd as OCR_BATCH_PAGES-page ranges
+    OCR_BATCH_MIN_PAGES: int = int(os.getenv("OCR_BATCH_MIN_PAGES", "30"))
+    OCR_BATCH_PAGES: int = int(os.getenv("OCR_BATCH_PAGES", "10"))
+    OCR_BATCH_CONCURRENCY: int = int(os.getenv("OCR_BATCH_CONCURRENCY", "4"))
+    OCR_BATCH_RETRIES: int = int(os.getenv("OCR_BATCH_RETRIES", "2"))
+
+    # --- OCR result cache (content-addressed) ---
+    OCR_CACHE_ENABLED: bool = os.getenv("OCR_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    OCR_CACHE_MEMORY_ITEMS: int = int(os.getenv("OCR_CACHE_MEMORY_ITEMS", "256"))
+    OCR_CACHE_MEMORY_MB: int = int(os.getenv("OCR_CACHE_MEMORY_MB", "64"))
+    OCR_CACHE_DIR: str = os.getenv("OCR_CACHE_DIR", ".cache/ocr")  # empty = memory tier only
+    OCR_CACHE_DISK_MB: int = int(os.getenv("OCR_CACHE_DISK_MB", "1024"))
+    OCR_CACHE_TTL_SECONDS: int = int(os.getenv("OCR_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+    # --- Server-side document / transcript store ---
+    DOC_STORE_CACHE_ITEMS: int = int(os.getenv("DOC_STORE_CACHE_ITEMS", "64"))
+    DOC_STORE_CACHE_TTL_SECONDS: int = int(os.getenv("DOC_STORE_CACHE_TTL_SECONDS", "300"))
+
+    # --- RAG (chunking / embeddings / retrieval) ---
+    RAG_EMBEDDING_BACKEND: str = os.getenv("RAG_EMBEDDING_BACKEND", "mistral")  # mistral | hashing
+    RAG_EMBEDDING_DIM: int = int(os.getenv("RAG_EMBEDDING_DIM", "512"))  # hashing backend only
+    RAG_EMBED_BATCH: int = int(os.getenv("RAG_EMBED_BATCH", "32"))
+    RAG_CHUNK_TOKENS: int = int(os.getenv("RAG_CHUNK_TOKENS", "400"))
+    RAG_CHUNK_MIN_TOKENS: int = int(os.getenv("RAG_CHUNK_MIN_TOKENS", "80"))
+    RAG_TOP_K: int = int(os.getenv("RAG_TOP_K", "6"))
+    RAG_FULL_DOC_MAX_TOKENS: int = int(os.getenv("RAG_FULL_DOC_MAX_TOKENS", "6000"))
+    RAG_HYBRID: bool = os.getenv("RAG_HYBRID", "true").lower() in ("1", "true", "yes")  # BM25 + vector
+    RAG_RRF_K: int = int(os.getenv("RAG_RRF_K", "60"))
+    RAG_BM25_MIN_RATIO: float = float(os.getenv("RAG_BM25_MIN_RATIO", "0.25"))
+    RAG_LEXICAL_CACHE_ITEMS: int = int(os.getenv("RAG_LEXICAL_CACHE_ITEMS", "128"))
+    RAG_INDEX_DIR: str = os.getenv("RAG_INDEX_DIR", ".cache/rag-index")
+    RAG_INDEX_DTYPE: str = os.getenv("RAG_INDEX_DTYPE", "float32")  # float32 | int8
+    RAG_INDEX_COMPACT_RATIO: float = float(os.getenv("RAG_INDEX_COMPACT_RATIO", "0.3"))
+    RAG_INDEX_COMPACT_INTERVAL_SECONDS: int = int(os.getenv("RAG_INDEX_COMPACT_INTERVAL_SECONDS", "600"))
+
+    # --- Docchat answer cache (content hash + normalized question, optional paraphrase match) ---
+    ANSWER_CACHE_ENABLED: bool = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    # Paraphrase matching is opt-in: a false match serves another question's answer
+    ANSWER_CACHE_SEMANTIC: bool = os.getenv("ANSWER_CACHE_SEMANTIC", "false").lower() in ("1", "true", "yes")
+    # Cosine threshold for paraphrase matches. It depends on the embedding model: 0.92 was
+    # tuned for mistral-embed; re-tune it when RAG_EMBEDDING_BACKEND or MISTRAL_EMBED_MODEL changes
+    # (the hashing backend scores unrelated short questions higher, so keep it strict there)
+    ANSWER_CACHE_SIMILARITY: float = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))
+    ANSWER_CACHE_TTL_SECONDS: int = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600)))
+    ANSWER_CACHE_PER_DOC: int = int(os.getenv("ANSWER_CACHE_PER_DOC", "200"))
+    ANSWER_CACHE_DOCS: int = int(os.getenv("ANSWER_CACHE_DOCS", "256"))  # per-worker LRU of documents
+
+    # --- Map-reduce answering for content larger than one prompt ---
+    # Content over MAPREDUCE_CONTEXT_TOKENS (or a whole-document question over a large
+    # document) is digested per section, then answered from the digests
+    MAPREDUCE_CONTEXT_TOKENS: int = int(os.getenv("MAPREDUCE_CONTEXT_TOKENS", "24000"))
+    MAPREDUCE_SECTION_TOKENS: int = int(os.getenv("MAPREDUCE_SECTION_TOKENS", "3000"))
+    MAPREDUCE_REDUCE_TOKENS: int = int(os.getenv("MAPREDUCE_REDUCE_TOKENS", "12000"))
+    MAPREDUCE_MAP_MAX_TOKENS: int = int(os.getenv("MAPREDUCE_MAP_MAX_TOKENS", "700"))
+    MAPREDUCE_CONCURRENCY: int = int(os.getenv("MAPREDUCE_CONCURRENCY", "4"))
+    MAPREDUCE_CACHE_ITEMS: int = int(os.getenv("MAPREDUCE_CACHE_ITEMS", "2048"))
+    MAPREDUCE_CACHE_MEMORY_MB: int = int(os.getenv("MAPREDUCE_CACHE_MEMORY_MB", "32"))
+    MAPREDUCE_CACHE_DIR: str = os.getenv("MAPREDUCE_CACHE_DIR", ".cache/mapreduce")  # empty = memory only
+    MAPREDUCE_CACHE_DISK_MB: int = int(os.getenv("MAPREDUCE_CACHE_DISK_MB", "256"))
+    MAPREDUCE_CACHE_TTL_SECONDS: int = int(os.getenv("MAPREDUCE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+    # --- Audio normalization before transcription (mono, resample, silence trimming) ---
+    VOICE_PREPROCESS: bool = os.getenv("VOICE_PREPROCESS", "true").lower() in ("1", "true", "yes")
+    VOICE_SAMPLE_RATE: int = int(os.getenv("VOICE_SAMPLE_RATE", "16000"))
+    # Silences longer than this are shortened to VOICE_TRIM_KEEP_MS (leading/trailing always)
+    VOICE_TRIM_MIN_SILENCE_MS: int = int(os.getenv("VOICE_TRIM_MIN_SILENCE_MS", "1000"))
+    VOICE_TRIM_KEEP_MS: int = int(os.getenv("VOICE_TRIM_KEEP_MS", "300"))
+
+    # --- Transcript segments (timestamps + speakers) for voice Q&A ---
+    VOICE_DIARIZE: bool = os.getenv("VOICE_DIARIZE", "true").lower() in ("1", "true", "yes")
+    # Token budget for transcript segments sent with one question
+    VOICE_QA_CONTEXT_TOKENS: int = int(os.getenv("VOICE_QA_CONTEXT_TOKENS", "4000"))
+
+    # --- Two-tier sentiment (local lexicon pre-scan, LLM on flagged windows only) ---
+    # Segments scoring at or below this (range -1..1) are flagged negative
+    VOICE_SENTIMENT_NEGATIVE_THRESHOLD: float = float(os.getenv("VOICE_SENTIMENT_NEGATIVE_THRESHOLD", "-0.35"))
+    # Neighbouring segments sent with each flagged one
+    VOICE_SENTIMENT_CONTEXT_SEGMENTS: int = int(os.getenv("VOICE_SENTIMENT_CONTEXT_SEGMENTS", "1"))
+    VOICE_SENTIMENT_WINDOW_TOKENS: int = int(os.getenv("VOICE_SENTIMENT_WINDOW_TOKENS", "3000"))
+    VOICE_SENTIMENT_LLM_MAX_TOKENS: int = int(os.getenv("VOICE_SENTIMENT_LLM_MAX_TOKENS", "900"))
+    VOICE_SENTIMENT_BATCH_MAX: int = int(os.getenv("VOICE_SENTIMENT_BATCH_MAX", "500"))
+
+    # --- Long-audio chunked transcription ---
+    # Recordings longer than VOICE_CHUNK_MIN_SECONDS are cut at silences into ~VOICE_CHUNK_SECONDS
+    # segments (hard limit VOICE_CHUNK_MAX_SECONDS) and transcribed concurrently
+    VOICE_CHUNK_MIN_SECONDS: float = float(os.getenv("VOICE_CHUNK_MIN_SECONDS", "240"))
+    VOICE_CHUNK_SECONDS: float = float(os.getenv("VOICE_CHUNK_SECONDS", "120"))
+    VOICE_CHUNK_MAX_SECONDS: float = float(os.getenv("VOICE_CHUNK_MAX_SECONDS", "180"))
+    VOICE_CHUNK_CONCURRENCY: int = int(os.getenv("VOICE_CHUNK_CONCURRENCY", "4"))
+    VOICE_CHUNK_RETRIES: int = int(os.getenv("VOICE_CHUNK_RETRIES", "2"))
+    VOICE_MIN_SILENCE_MS: int = int(os.getenv("VOICE_MIN_SILENCE_MS", "400"))
+
+    # --- Live transcription (WebSocket) ---
+    VOICE_LIVE_WINDOW_SECONDS: float = float(os.getenv("VOICE_LIVE_WINDOW_SECONDS", "10"))
+    # 0 disables partial (in-window) transcripts / live sentiment flags
+    VOICE_LIVE_PARTIAL_SECONDS: float = float(os.getenv("VOICE_LIVE_PARTIAL_SECONDS", "3"))
+    VOICE_LIVE_SENTIMENT_SECONDS: float = float(os.getenv("VOICE_LIVE_SENTIMENT_SECONDS", "30"))
+    VOICE_LIVE_SENTIMENT_MAX_CHARS: int = int(os.getenv("VOICE_LIVE_SENTIMENT_MAX_CHARS", "6000"))
+    VOICE_LIVE_MAX_SECONDS: int = int(os.getenv("VOICE_LIVE_MAX_SECONDS", "14400"))
+
+    # --- Background jobs (uploads with ?mode=async) ---
+    # Workers per process; 0 = this process only enqueues (another node does the work)
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_POLL_SECONDS: float = float(os.getenv("JOB_POLL_SECONDS", "2"))
+    JOB_HEARTBEAT_SECONDS: float = float(os.getenv("JOB_HEARTBEAT_SECONDS", "10"))
+    # A running job whose heartbeat is older than this is re-claimed (worker died/restarted)
+    JOB_STALE_SECONDS: int = int(os.getenv("JOB_STALE_SECONDS", "60"))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    # A failed attempt waits JOB_RETRY_BASE_SECONDS * 2^(attempt-1) (capped) before it can be
+    # claimed again; MistralUnavailable waits its Retry-After and does not use up an attempt
+    JOB_RETRY_BASE_SECONDS: float = float(os.getenv("JOB_RETRY_BASE_SECONDS", "10"))
+    JOB_RETRY_MAX_SECONDS: float = float(os.getenv("JOB_RETRY_MAX_SECONDS", "300"))
+    JOB_RETENTION_SECONDS: int = int(os.getenv("JOB_RETENTION_SECONDS", "86400"))
+
+    # --- Metrics (GET /metrics, Prometheus text format) ---
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+    # Shared directory for per-worker snapshots so /metrics aggregates all gunicorn workers;
+    # empty = each worker reports only itself. Empty the directory on deploy.
+    METRICS_DIR: str = os.getenv("METRICS_DIR", "")
+    METRICS_FLUSH_SECONDS: float = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
 
     # --- Postgres ---
     DATABASE_URL: str = os.getenv("DATABASE_URL", "")
+    # Async engine (psycopg 3) for request-path queries; derived from a postgresql DATABASE_URL
+    # when empty. Without one (e.g. SQLite) those queries run on the sync engine in a thread.
+    DATABASE_ASYNC_URL: str = os.getenv("DATABASE_ASYNC_URL", "")
+    # Per worker and per engine: at most DB_POOL_SIZE + DB_MAX_OVERFLOW connections
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+    # Pre-ping costs a round trip per checkout; the async engine skips it by default and
+    # retries once on a connection that turns out to be dead
+    DB_ASYNC_POOL_PRE_PING: bool = os.getenv("DB_ASYNC_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
 settings = Settings()
@@ -0,0 +1,368 @@
+# app/core/metrics.py
+"""
+Lightweight in-process metrics with Prometheus text exposition (GET /metrics).
+
+- Counter / Gauge / Histogram keyed by label values; an observation is a lock + dict update
+  (well under a microsecond), so instrumentation stays on in production.
+- stage(name): times one step of a request (preprocess, base64, upstream_ocr, json_parse,
+  template_render, ...) into app_stage_duration_seconds{flow, stage}. The flow (docchat |
+  voicechat | auth | ...) comes from a context variable set by MetricsMiddleware from the
+  URL, or by the job queue from the job kind, so deep code does not need to know its caller.
+- MetricsMiddleware (pure ASGI, so streaming responses are timed to their last byte):
+  http_requests_total, http_request_duration_seconds by route template, in-flight gauge.
+- Gauges that mirror live state (Mistral admission queues, preprocess pool) are filled by
+  collectors registered with add_collector(), run just before a snapshot.
+
+Gunicorn workers: with METRICS_DIR set, every worker writes its snapshot to
+METRICS_DIR/<pid>.json every METRICS_FLUSH_SECONDS (atomic replace) and /metrics, served
+by any worker, merges all of them. Counters and histograms of exited workers are kept so
+totals never go backwards; their gauges are dropped. Empty the directory on deploy (as
+with prometheus_client's multiprocess mode). Without METRICS_DIR each worker reports only
+itself.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Callable
+from contextlib import contextmanager
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+current_flow: contextvars.ContextVar[str] = contextvars.ContextVar("metrics_flow", default="other")
+
+_FLOW_PREFIXES = (
+    ("/api/docchat", "docchat"),
+    ("/tools/docchat", "docchat"),
+    ("/api/voice", "voicechat"),
+    ("/tools/voice", "voicechat"),
+    ("/auth", "auth"),
+    ("/tools/bi", "bi"),
+    ("/api/jobs", "jobs"),
+)
+
+
+def flow_for_path(path: str) -> str:
+    for prefix, flow in _FLOW_PREFIXES:
+        if path.startswith(prefix):
+            return flow
+    return "other"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()  # observations also come from threadpool threads
+
+    def _key(self, labels: tuple) -> tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {labels}")
+        return tuple(str(v) for v in labels)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = [[list(k), v if not isinstance(v, list) else list(v)] for k, v in self._values.items()]
+        return {"type": self.kind, "help": self.help, "labelnames": list(self.labelnames), "samples": samples}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, *labels, value: float) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, *labels, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *labels, value: float) -> None:
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)  # le semantics: value <= bound
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                # per-bucket (non-cumulative) counts, +Inf last, then sum and count
+                row = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(*labels, value=time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        snap = super().snapshot()
+        snap["buckets"] = list(self.buckets)
+        return snap
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, fn: Callable[[], None]) -> None:
+        """fn() refreshes gauges from live state; called before every snapshot."""
+        self._collectors.append(fn)
+
+    def snapshot(self) -> dict:
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception:
+                logger.exception("Metrics collector failed")
+        return {name: m.snapshot() for name, m in self._metrics.items()}
+
+
+registry = Registry()
+
+
+def counter(name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+    return registry.register(Counter(name, help, labelnames))
+
+
+def gauge(name: str, help: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+    return registry.register(Gauge(name, help, labelnames))
+
+
+def histogram(name: str, help: str, labelnames: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, help, labelnames, buckets))
+
+
+add_collector = registry.add_collector
+
+# --- Shared metrics ---
+
+STAGE_SECONDS = histogram(
+    "app_stage_duration_seconds", "Time spent in one stage of a request or job.", ("flow", "stage")
+)
+HTTP_REQUESTS = counter(
+    "http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status")
+)
+HTTP_SECONDS = histogram(
+    "http_request_duration_seconds", "HTTP request latency (to the last body byte).", ("method", "route")
+)
+HTTP_IN_FLIGHT = gauge("http_requests_in_flight", "HTTP requests being served.", ("flow",))
+UPSTREAM_RESPONSES = counter(
+    "mistral_responses_total",
+    "Mistral API attempts by endpoint and HTTP status (or transport error name).",
+    ("endpoint", "status"),
+)
+
+
+@contextmanager
+def stage(name: str, flow: str | None = None):
+    """Times the with-block into app_stage_duration_seconds{flow, stage}."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(flow or current_flow.get(), name, value=time.perf_counter() - start)
+
+
+def observe_stage(name: str, seconds: float, flow: str | None = None) -> None:
+    STAGE_SECONDS.observe(flow or current_flow.get(), name, value=seconds)
+
+
+# --- Middleware ---
+
+class MetricsMiddleware:
+    """Per-request flow context, latency and status counters (route templates, not raw paths)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        flow = flow_for_path(scope["path"])
+        token = current_flow.set(flow)
+        status = 500
+        start = time.perf_counter()
+        HTTP_IN_FLIGHT.inc(flow)
+
+        async def _send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            HTTP_IN_FLIGHT.dec(flow)
+            current_flow.reset(token)
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            # Scrapes are not traffic. No return in finally: it would swallow the exception
+            if template != "/metrics":
+                HTTP_REQUESTS.inc(scope["method"], template, status)
+                HTTP_SECONDS.observe(scope["method"], template, value=time.perf_counter() - start)
+
+
+# --- Multi-worker aggregation + exposition ---
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(settings.METRICS_DIR, f"{pid}.json")
+
+
+def write_snapshot() -> None:
+    if not settings.METRICS_DIR:
+        return
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    path = _snapshot_path(os.getpid())
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"pid": os.getpid(), "written_at": time.time(), "metrics": registry.snapshot()}, f)
+    os.replace(tmp, path)
+
+
+async def flush_loop() -> None:
+    """Background task (lifespan): keeps this worker's snapshot file fresh."""
+    while True:
+        await asyncio.sleep(settings.METRICS_FLUSH_SECONDS)
+        try:
+            write_snapshot()
+        except Exception:
+            logger.exception("Writing metrics snapshot failed")
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_snapshots() -> list[tuple[dict, bool]]:
+    """(metrics, alive) for this worker (live values) and every other worker's file."""
+    snapshots = [(registry.snapshot(), True)]
+    if not settings.METRICS_DIR or not os.path.isdir(settings.METRICS_DIR):
+        return snapshots
+    me = os.getpid()
+    for entry in os.scandir(settings.METRICS_DIR):
+        if not entry.name.endswith(".json"):
+            continue
+        try:
+            pid = int(entry.name[:-5])
+        except ValueError:
+            continue
+        if pid == me:
+            continue
+        try:
+            with open(entry.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue  # being replaced right now; next scrape picks it up
+        snapshots.append((data.get("metrics") or {}, _alive(pid)))
+    return snapshots
+
+
+def _merge(snapshots: list[tuple[dict, bool]]) -> dict:
+    merged: dict[str, dict] = {}
+    for metrics, alive in snapshots:
+        for name, m in metrics.items():
+            if m["type"] == "gauge" and not alive:
+                continue
+            out = merged.setdefault(name, {**m, "samples": {}})
+            if m["type"] == "histogram" and m.get("buckets") != out.get("buckets"):
+                continue  # bucket layout changed between deploys; skip the stale file
+            samples = out["samples"]
+            for labels, value in m["samples"]:
+                key = tuple(labels)
+                if m["type"] == "histogram":
+                    prev = samples.get(key)
+                    samples[key] = list(value) if prev is None else [a + b for a, b in zip(prev, value)]
+                else:
+                    samples[key] = samples.get(key, 0.0) + value
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == int(v):
+        return str(int(v))
+    return repr(float(v))
+
+
+def render() -> str:
+    """Prometheus text exposition format (version 0.0.4), merged across workers."""
+    lines: list[str] = []
+    for name, m in sorted(_merge(_read_snapshots()).items()):
+        lines.append(f"# HELP {name} {m['help']}")
+        lines.append(f"# TYPE {name} {m['type']}")
+        names = m["labelnames"]
+        for key, value in sorted(m["samples"].items()):
+            if m["type"] != "histogram":
+                lines.append(f"{name}{_labels(names, key)} {_num(value)}")
+                continue
+            cumulative = 0
+            for bound, n in zip(m["buckets"] + ["+Inf"], value[:-2]):
+                cumulative += n
+                le = "+Inf" if bound == "+Inf" else _num(bound)
+                bucket_labels = _labels(names, key, f'le="{le}"')
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, key)} {_num(value[-2])}")
+            lines.append(f"{name}_count{_labels(names, key)} {value[-1]}")
+    return "\n".join(lines) + "\n"
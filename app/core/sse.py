@@ -0,0 +1,37 @@
+import json
+from collections.abc import AsyncIterator
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(request: Request, deltas: AsyncIterator[str], extra: dict | None = None) -> StreamingResponse:
+    """
+    Wraps a stream of text deltas as Server-Sent Events:
+        event: token  data: {"delta": "..."}
+        event: done   data: {...extra}
+        event: error  data: {"detail": "..."}
+    Stops (and closes the upstream stream) as soon as the client disconnects.
+    """
+    async def gen():
+        try:
+            async for delta in deltas:
+                if await request.is_disconnected():
+                    break
+                yield sse_event("token", {"delta": delta})
+            else:
+                yield sse_event("done", extra or {})
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+        finally:
+            await deltas.aclose()
+
+    return StreamingResponse(
+        gen(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
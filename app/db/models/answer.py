@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+from sqlalchemy import String, Integer, DateTime, Text, LargeBinary
+from sqlalchemy.orm import Mapped, mapped_column, Session
+
+from app.db.base import Base
+
+
+class CachedAnswer(Base):
+    """
+    A docchat answer keyed by the document's content hash and the normalized question
+    (see app/services/rag/answers.py). Keyed by content rather than doc_id, so the same
+    document uploaded by several people shares answers.
+    """
+    __tablename__ = "cached_answers"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    content_sha256: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    # Chat model + answer mode; answers from another model or mode are not reused
+    variant: Mapped[str] = mapped_column(String(128), nullable=False)
+    question: Mapped[str] = mapped_column(Text, nullable=False)  # normalized
+    answer: Mapped[str] = mapped_column(Text, nullable=False)
+    # float32 question embedding for paraphrase matches (None when semantic matching is off)
+    embedding: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    embedding_model: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    hits: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
+
+
+def get_answers(db: Session, content_sha256: str, max_age: timedelta) -> list[CachedAnswer]:
+    cutoff = datetime.utcnow() - max_age
+    return (
+        db.query(CachedAnswer)
+        .filter(CachedAnswer.content_sha256 == content_sha256, CachedAnswer.created_at >= cutoff)
+        .order_by(CachedAnswer.created_at)
+        .all()
+    )
+
+
+def add_answer(db: Session, row: CachedAnswer, max_per_document: int, max_age: timedelta) -> None:
+    """Insert, dropping expired rows and the oldest ones beyond max_per_document."""
+    sha = row.content_sha256
+    db.query(CachedAnswer).filter(
+        CachedAnswer.content_sha256 == sha,
+        CachedAnswer.created_at < datetime.utcnow() - max_age,
+    ).delete(synchronize_session=False)
+    db.add(row)
+    db.flush()
+    keep = (
+        db.query(CachedAnswer.id)
+        .filter(CachedAnswer.content_sha256 == sha)
+        .order_by(CachedAnswer.created_at.desc(), CachedAnswer.id.desc())
+        .limit(max_per_document)
+    )
+    db.query(CachedAnswer).filter(
+        CachedAnswer.content_sha256 == sha,
+        CachedAnswer.id.not_in(keep.scalar_subquery()),
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def count_hit(db: Session, answer_id: int) -> None:
+    db.query(CachedAnswer).filter(CachedAnswer.id == answer_id).update(
+        {CachedAnswer.hits: CachedAnswer.hits + 1}, synchronize_session=False
+    )
+    db.commit()
+
+
+def delete_answers(db: Session, content_sha256: str) -> int:
+    deleted = db.query(CachedAnswer).filter(CachedAnswer.content_sha256 == content_sha256).delete()
+    db.commit()
+    return deleted
@@ -0,0 +1,41 @@
+from datetime import datetime
+from sqlalchemy import String, Integer, DateTime, Text
+from sqlalchemy.orm import Mapped, mapped_column, Session
+
+from app.db.base import Base
+
+
+class DocumentChunk(Base):
+    """
+    One retrievable chunk of a stored document's markdown (see app/services/rag).
+    Its embedding lives in the mmap VectorIndex at row (doc range start + ord).
+    """
+    __tablename__ = "document_chunks"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    doc_id: Mapped[str] = mapped_column(String(36), nullable=False, index=True)
+    ord: Mapped[int] = mapped_column(Integer, nullable=False)
+    heading: Mapped[str] = mapped_column(Text, nullable=False, default="")
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    tokens: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
+
+
+def replace_chunks(db: Session, doc_id: str, chunks: list[DocumentChunk]) -> None:
+    db.query(DocumentChunk).filter(DocumentChunk.doc_id == doc_id).delete()
+    db.add_all(chunks)
+    db.commit()
+
+
+def get_chunks(db: Session, doc_id: str, ords: list[int] | None = None) -> list[DocumentChunk]:
+    q = db.query(DocumentChunk).filter(DocumentChunk.doc_id == doc_id)
+    if ords is not None:
+        q = q.filter(DocumentChunk.ord.in_(ords))
+    return q.order_by(DocumentChunk.ord).all()
+
+
+def delete_chunks(db: Session, doc_id: str) -> int:
+    deleted = db.query(DocumentChunk).filter(DocumentChunk.doc_id == doc_id).delete()
+    db.commit()
+    return deleted
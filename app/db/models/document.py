@@ -0,0 +1,42 @@
+from datetime import datetime
+from sqlalchemy import String, Integer, DateTime, Text
+from sqlalchemy.orm import Mapped, mapped_column, Session
+
+from app.db.base import Base
+
+
+class StoredDocument(Base):
+    """
+    Server-side copy of OCR markdown (kind="doc", keyed by doc_id) or a voice transcript
+    (kind="audio", keyed by audio_id). Queries load content from here instead of having
+    the browser resend it with every question.
+    """
+    __tablename__ = "stored_documents"
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(16), nullable=False, default="doc")
+    filename: Mapped[str | None] = mapped_column(Text, nullable=True)
+    pages: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    content: Mapped[str] = mapped_column(Text, nullable=False)
+    content_sha256: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
+
+
+def save_document(db: Session, doc: StoredDocument) -> StoredDocument:
+    db.merge(doc)
+    db.commit()
+    return doc
+
+
+def get_document(db: Session, doc_id: str, kind: str) -> StoredDocument | None:
+    doc = db.get(StoredDocument, doc_id)
+    if doc is None or doc.kind != kind:
+        return None
+    return doc
+
+
+def delete_document(db: Session, doc_id: str) -> bool:
+    deleted = db.query(StoredDocument).filter(StoredDocument.id == doc_id).delete()
+    db.commit()
+    return bool(deleted)
@@ -24,40 +24,79 @@ class AppUser(Base):
     )
 
 
-from datetime import datetime
-from sqlalchemy.orm import Session
-from app.db.models.identity import AppUser
+from sqlalchemy import Row, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DBAPIError
+from starlette.concurrency import run_in_threadpool
+
+from app.db.session import async_engine, engine
+
+_INSERT = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
 
-def upsert_google_user(db: Session, profile: dict) -> AppUser:
+
+def _google_upsert(dialect: str, profile: dict):
+    """
+    INSERT ... ON CONFLICT (email) DO UPDATE ... RETURNING for a Google profile.
+    On conflict: name / picture only overwritten by non-empty values, provider_user_id
+    kept once set, last_login_at / updated_at bumped.
+    """
     email = (profile.get("email") or "").lower().strip()
     sub = str(profile.get("sub") or "").strip()
 
     if not email or not sub:
         raise ValueError("Google profile missing email or sub")
 
-    user = db.query(AppUser).filter(AppUser.email == email).first()
-
     now = datetime.utcnow()
+    users = AppUser.__table__
+    stmt = _INSERT[dialect](users).values(
+        auth_provider="google",
+        provider_user_id=sub,
+        email=email,
+        full_name=profile.get("name"),
+        picture_url=profile.get("picture"),
+        is_active=True,
+        last_login_at=now,
+        created_at=now,
+        updated_at=now,
+    )
+    new = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[users.c.email],
+        set_={
+            "full_name": func.coalesce(func.nullif(new.full_name, ""), users.c.full_name),
+            "picture_url": func.coalesce(func.nullif(new.picture_url, ""), users.c.picture_url),
+            "provider_user_id": func.coalesce(func.nullif(users.c.provider_user_id, ""), new.provider_user_id),
+            "last_login_at": new.last_login_at,
+            "updated_at": new.updated_at,
+        },
+    )
+    return stmt.returning(users.c.id, users.c.email, users.c.full_name, users.c.picture_url)
+
+
+def _upsert_sync(profile: dict) -> Row:
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        return conn.execute(_google_upsert(engine.dialect.name, profile)).one()
+
+
+async def upsert_google_user(profile: dict) -> Row:
+    """
+    Creates or updates the user for a Google login; returns (id, email, full_name, picture_url).
+
+    One statement on an autocommit connection, so a login is a single round trip and
+    concurrent first logins for the same email cannot race (the second one updates the
+    row the first inserted). Runs on the async engine; on the sync engine in a thread
+    when there is none (SQLite).
+    """
+    if async_engine is None:
+        return await run_in_threadpool(_upsert_sync, profile)
 
-    if user is None:
-        user = AppUser(
-            auth_provider="google",
-            provider_user_id=sub,
-            email=email,
-            full_name=profile.get("name"),
-            picture_url=profile.get("picture"),
-            last_login_at=now,
-            created_at=now,
-            updated_at=now,
-        )
-        db.add(user)
-    else:
-        user.full_name = profile.get("name") or user.full_name
-        user.picture_url = profile.get("picture") or user.picture_url
-        user.provider_user_id = user.provider_user_id or sub
-        user.last_login_at = now
-        user.updated_at = now
-
-    db.commit()
-    db.refresh(user)
-    return user
+    stmt = _google_upsert(async_engine.dialect.name, profile)
+    for attempt in range(2):
+        try:
+            async with async_engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                return (await conn.execute(stmt)).one()
+        except DBAPIError as e:
+            # No pre-ping on the async pool: a dead pooled connection is discarded, retry once
+            if attempt or not e.connection_invalidated:
+                raise
@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+from sqlalchemy import String, Integer, DateTime, Text, JSON, LargeBinary, ForeignKey, select, or_, and_
+from sqlalchemy.orm import Mapped, mapped_column, Session
+
+from app.db.base import Base
+
+
+class Job(Base):
+    """
+    Background OCR / transcription job (see app/services/jobs).
+    Workers on any node claim queued rows with SELECT ... FOR UPDATE SKIP LOCKED; a running
+    job whose heartbeat goes stale (worker died or restarted) is claimed again.
+    """
+    __tablename__ = "jobs"
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(32), nullable=False)
+    # queued | running | done | failed
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="queued", index=True)
+    filename: Mapped[str | None] = mapped_column(Text, nullable=True)
+    content_type: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    params: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
+
+    progress: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    result: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    worker_id: Mapped[str | None] = mapped_column(String(128), nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=datetime.utcnow, index=True)
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # A queued retry is not claimed before this (backoff / upstream Retry-After)
+    not_before: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class JobInput(Base):
+    """Uploaded bytes for a job, kept apart from Job so status polling never loads them."""
+    __tablename__ = "job_inputs"
+
+    job_id: Mapped[str] = mapped_column(String(36), ForeignKey("jobs.id", ondelete="CASCADE"), primary_key=True)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+
+def create_job(db: Session, job: Job, data: bytes) -> Job:
+    db.add(job)
+    db.flush()
+    db.add(JobInput(job_id=job.id, data=data))
+    db.commit()
+    return job
+
+
+def get_job(db: Session, job_id: str) -> Job | None:
+    return db.get(Job, job_id)
+
+
+def get_job_input(db: Session, job_id: str) -> bytes | None:
+    row = db.get(JobInput, job_id)
+    return row.data if row is not None else None
+
+
+def claim_job(db: Session, worker_id: str, kinds: list[str], stale_after: timedelta) -> Job | None:
+    """
+    Atomically take the oldest runnable job: queued (and past its not_before), or running
+    with a stale heartbeat.
+    SKIP LOCKED lets concurrent workers on other nodes pass over rows being claimed.
+    """
+    now = datetime.utcnow()
+    stmt = (
+        select(Job)
+        .where(
+            Job.kind.in_(kinds),
+            or_(
+                and_(Job.status == "queued", or_(Job.not_before.is_(None), Job.not_before <= now)),
+                and_(Job.status == "running", Job.heartbeat_at < now - stale_after),
+            ),
+        )
+        .order_by(Job.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    job = db.execute(stmt).scalar_one_or_none()
+    if job is None:
+        db.rollback()
+        return None
+    job.status = "running"
+    job.attempts += 1
+    job.worker_id = worker_id
+    job.heartbeat_at = now
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def update_job(db: Session, job_id: str, worker_id: str, **fields) -> bool:
+    """Update a job this worker still owns (False if another worker took it over)."""
+    fields.setdefault("heartbeat_at", datetime.utcnow())
+    updated = (
+        db.query(Job)
+        .filter(Job.id == job_id, Job.worker_id == worker_id, Job.status == "running")
+        .update(fields, synchronize_session=False)
+    )
+    db.commit()
+    return bool(updated)
+
+
+def finish_job(db: Session, job_id: str, worker_id: str, status: str, **fields) -> bool:
+    """Mark done/failed (or back to queued for a retry); the input is dropped once final."""
+    fields["finished_at"] = datetime.utcnow() if status in ("done", "failed") else None
+    updated = update_job(db, job_id, worker_id, status=status, **fields)
+    if updated and status in ("done", "failed"):
+        db.query(JobInput).filter(JobInput.job_id == job_id).delete()
+        db.commit()
+    return updated
+
+
+def delete_finished_jobs(db: Session, older_than: timedelta) -> int:
+    cutoff = datetime.utcnow() - older_than
+    old = select(Job.id).where(Job.status.in_(("done", "failed")), Job.finished_at < cutoff)
+    db.query(JobInput).filter(JobInput.job_id.in_(old)).delete(synchronize_session=False)
+    deleted = db.query(Job).filter(Job.id.in_(old)).delete(synchronize_session=False)
+    db.commit()
+    return deleted
@@ -0,0 +1,54 @@
+from datetime import datetime
+from sqlalchemy import String, Integer, Float, DateTime, Text
+from sqlalchemy.orm import Mapped, mapped_column, Session
+
+from app.db.base import Base
+
+
+class TranscriptSegment(Base):
+    """
+    One timestamped (optionally diarized) piece of a voice transcript, keyed by audio_id.
+    Times are seconds from the start of the original recording.
+    """
+    __tablename__ = "transcript_segments"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    audio_id: Mapped[str] = mapped_column(String(36), nullable=False, index=True)
+    ord: Mapped[int] = mapped_column(Integer, nullable=False)
+    speaker: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    start: Mapped[float] = mapped_column(Float, nullable=False)
+    end: Mapped[float] = mapped_column(Float, nullable=False)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
+
+
+def replace_segments(db: Session, audio_id: str, segments: list[TranscriptSegment]) -> None:
+    db.query(TranscriptSegment).filter(TranscriptSegment.audio_id == audio_id).delete()
+    db.add_all(segments)
+    db.commit()
+
+
+def get_segments(db: Session, audio_id: str) -> list[TranscriptSegment]:
+    return (
+        db.query(TranscriptSegment)
+        .filter(TranscriptSegment.audio_id == audio_id)
+        .order_by(TranscriptSegment.ord)
+        .all()
+    )
+
+
+def delete_segments(db: Session, audio_id: str) -> int:
+    deleted = db.query(TranscriptSegment).filter(TranscriptSegment.audio_id == audio_id).delete()
+    db.commit()
+    return deleted
+
+
+def get_segments_for(db: Session, audio_ids: list[str]) -> list[TranscriptSegment]:
+    """Segments of several transcripts in one query, grouped by audio_id in order."""
+    return (
+        db.query(TranscriptSegment)
+        .filter(TranscriptSegment.audio_id.in_(audio_ids))
+        .order_by(TranscriptSegment.audio_id, TranscriptSegment.ord)
+        .all()
+    )
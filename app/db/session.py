@@ -1,14 +1,40 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
 if not settings.DATABASE_URL:
     raise RuntimeError("DATABASE_URL is not set. Add it to .env.")
 
+
+def _pool_options(url: str) -> dict:
+    # SQLite uses its own pool classes, which take no sizing arguments
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+
+
+def _async_url() -> str | None:
+    """DATABASE_ASYNC_URL, else DATABASE_URL on psycopg 3 when it is Postgres, else None."""
+    if settings.DATABASE_ASYNC_URL:
+        return settings.DATABASE_ASYNC_URL
+    url = make_url(settings.DATABASE_URL)
+    if url.get_backend_name() != "postgresql":
+        return None
+    return url.set(drivername="postgresql+psycopg").render_as_string(hide_password=False)
+
+
 engine = create_engine(
     settings.DATABASE_URL,
-    pool_pre_ping=True,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
     future=True,
+    **_pool_options(settings.DATABASE_URL),
 )
 
 SessionLocal = sessionmaker(
@@ -17,3 +43,15 @@ SessionLocal = sessionmaker(
     bind=engine,
     future=True,
 )
+
+# Request-path queries that should not hold a threadpool thread (see upsert_google_user)
+ASYNC_DATABASE_URL = _async_url()
+async_engine: AsyncEngine | None = (
+    create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_pre_ping=settings.DB_ASYNC_POOL_PRE_PING,
+        **_pool_options(ASYNC_DATABASE_URL),
+    )
+    if ASYNC_DATABASE_URL
+    else None
+)
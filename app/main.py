@@ -5,27 +5,54 @@ from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
 
 from app.core.config import settings
-from app.api.auth_google import router as google_auth_router
+from app.api.auth_google import router as google_auth_router, prefetch_oauth_metadata
+from app.api.jobs import router as jobs_router
+from app.api.admission import router as admission_router
+from app.api.metrics import router as metrics_router
 from app.web.router import router as web_router
 from app.tools.docchat.router import router as docchat_router
 from app.tools.voicechat.router import router as voicechat_router
 from app.tools.bi.router import router as bi_router
 
-from app.db.session import engine
-from app.db.base import Base
-
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
-from app.db.session import engine
-from app.db.base import Base
+from app.db.session import async_engine
+from app.services.ocr.mistral import startup_mistral_client, shutdown_mistral_client
+from app.services.ocr.pool import preprocess_pool
+from app.services.rag.retrieval import index_maintenance_loop
+from app.services.jobs.queue import job_queue
+from app.core.metrics import MetricsMiddleware, stage, flush_loop as metrics_flush_loop, write_snapshot as write_metrics_snapshot
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    Base.metadata.create_all(bind=engine)
+    # Schema is managed by alembic (`alembic upgrade head` before workers start), not here
+    # OpenID discovery document + JWKS fetched off the request path
+    oauth_task = asyncio.create_task(prefetch_oauth_metadata())
+    # One pooled async Mistral client per worker (keep-alive connections reused across requests)
+    app.state.mistral = await startup_mistral_client()
+    # OpenCV preprocessing runs in a bounded process pool, off the event loop
+    preprocess_pool.start()
+    # Periodic compaction of tombstoned rows in the mmap vector index
+    index_task = asyncio.create_task(index_maintenance_loop())
+    # Background OCR / transcription workers (jobs persist in Postgres across restarts)
+    job_queue.start()
+    # Per-worker metrics snapshot for /metrics aggregation across workers (METRICS_DIR)
+    metrics_task = asyncio.create_task(metrics_flush_loop()) if settings.METRICS_DIR else None
     yield
-    # Shutdown (optional)
+    # Shutdown
+    await job_queue.shutdown()
+    oauth_task.cancel()
+    index_task.cancel()
+    if metrics_task is not None:
+        metrics_task.cancel()
+        write_metrics_snapshot()
+    preprocess_pool.shutdown()
+    await shutdown_mistral_client()
+    if async_engine is not None:
+        await async_engine.dispose()
     # engine.dispose()  # usually not necessary
 
 app = FastAPI(title=settings.APP_NAME, lifespan=lifespan)
@@ -41,6 +68,8 @@ app.add_middleware(
     same_site="lax",
     https_only=False,  # set True in prod with HTTPS
 )
+# Outermost: per-request flow context, latency and status metrics
+app.add_middleware(MetricsMiddleware)
 
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
@@ -49,14 +78,19 @@ app.state.templates = templates   # ✅ ADD THIS LINE
 
 # Routers
 app.include_router(google_auth_router)
+app.include_router(jobs_router)
+app.include_router(admission_router)
+app.include_router(metrics_router)
 app.include_router(web_router)
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
-    return templates.TemplateResponse(
-        "index.html",
-        {"request": request, "app_name": settings.APP_NAME},
-    )
+    with stage("template_render"):
+        response = templates.TemplateResponse(
+            "index.html",
+            {"request": request, "app_name": settings.APP_NAME},
+        )
+    return response
 
 app.include_router(docchat_router)
 app.include_router(voicechat_router)
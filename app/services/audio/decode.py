@@ -0,0 +1,105 @@
+# app/services/audio/decode.py
+"""
+Audio decoding to mono float32 samples in [-1, 1] and WAV re-encoding.
+
+- WAV (PCM 8/16/24/32-bit) is decoded in-process with the stdlib wave module + NumPy
+- Anything else (mp3, m4a, ogg, webm, flac, ...) goes through ffmpeg when it is on PATH
+
+All functions are blocking; run them off the event loop.
+"""
+
+import io
+import shutil
+import subprocess
+import wave
+from dataclasses import dataclass
+
+import numpy as np
+
+FFMPEG_SAMPLE_RATE = 16000
+
+
+class AudioDecodeError(ValueError):
+    """Raised when the audio cannot be decoded here (unknown format, no ffmpeg)."""
+
+
+@dataclass
+class DecodedAudio:
+    samples: np.ndarray  # float32, mono
+    sample_rate: int
+    channels: int  # channel count of the source (before downmix)
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / self.sample_rate if self.sample_rate else 0.0
+
+
+def _is_wav(data: bytes) -> bool:
+    return data[:4] == b"RIFF" and data[8:12] == b"WAVE"
+
+
+def _pcm_to_float(frames: bytes, sample_width: int) -> np.ndarray:
+    if sample_width == 1:
+        return (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    if sample_width == 2:
+        return np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    if sample_width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        ints = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8) | (raw[:, 2].astype(np.int32) << 16))
+        ints = np.where(ints >= 1 << 23, ints - (1 << 24), ints)
+        return ints.astype(np.float32) / float(1 << 23)
+    if sample_width == 4:
+        return np.frombuffer(frames, dtype="<i4").astype(np.float32) / float(1 << 31)
+    raise AudioDecodeError(f"Unsupported WAV sample width: {sample_width * 8} bit")
+
+
+def _decode_wav(data: bytes) -> DecodedAudio:
+    try:
+        with wave.open(io.BytesIO(data), "rb") as w:
+            channels = w.getnchannels()
+            rate = w.getframerate()
+            width = w.getsampwidth()
+            frames = w.readframes(w.getnframes())
+    except (wave.Error, EOFError) as e:
+        raise AudioDecodeError(f"Invalid WAV file: {e}") from e
+
+    samples = _pcm_to_float(frames, width)
+    if channels > 1:
+        samples = samples[: len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    return DecodedAudio(samples=samples.astype(np.float32, copy=False), sample_rate=rate, channels=channels)
+
+
+def _decode_ffmpeg(data: bytes) -> DecodedAudio:
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise AudioDecodeError("ffmpeg is not installed; only WAV audio can be decoded locally.")
+    proc = subprocess.run(
+        [ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+         "-f", "s16le", "-ac", "1", "-ar", str(FFMPEG_SAMPLE_RATE), "pipe:1"],
+        input=data,
+        capture_output=True,
+        check=False,
+    )
+    if proc.returncode != 0 or not proc.stdout:
+        raise AudioDecodeError(f"ffmpeg could not decode the audio: {proc.stderr.decode(errors='replace').strip()[:300]}")
+    samples = np.frombuffer(proc.stdout, dtype="<i2").astype(np.float32) / 32768.0
+    # ffmpeg already downmixed; the source channel count is not reported back
+    return DecodedAudio(samples=samples, sample_rate=FFMPEG_SAMPLE_RATE, channels=1)
+
+
+def decode_audio(data: bytes) -> DecodedAudio:
+    if _is_wav(data):
+        return _decode_wav(data)
+    return _decode_ffmpeg(data)
+
+
+def encode_wav(samples: np.ndarray, sample_rate: int) -> bytes:
+    """Mono 16-bit PCM WAV."""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2")
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm.tobytes())
+    return buf.getvalue()
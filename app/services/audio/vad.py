@@ -0,0 +1,99 @@
+# app/services/audio/vad.py
+"""
+Energy-based voice-activity detection and silence-aligned split planning (NumPy only).
+
+Frames are FRAME_MS long; a frame is speech when its RMS level (dBFS) is within
+SPEECH_MARGIN_DB of the loud end of the recording's level distribution, and never below
+ABS_FLOOR_DB. Relative thresholds keep it working on quiet phone recordings and loud
+studio files alike.
+"""
+
+import numpy as np
+
+FRAME_MS = 30
+ABS_FLOOR_DB = -55.0
+SPEECH_MARGIN_DB = 35.0
+
+
+def frame_levels_db(samples: np.ndarray, sample_rate: int, frame_ms: int = FRAME_MS) -> np.ndarray:
+    """RMS level per frame in dBFS (the last partial frame is dropped)."""
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    n = len(samples) // frame
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = samples[: n * frame].reshape(n, frame)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    return (20.0 * np.log10(np.maximum(rms, 1e-6))).astype(np.float32)
+
+
+def speech_mask(levels_db: np.ndarray) -> np.ndarray:
+    if not len(levels_db):
+        return np.zeros(0, dtype=bool)
+    loud = float(np.percentile(levels_db, 95))
+    threshold = max(ABS_FLOOR_DB, loud - SPEECH_MARGIN_DB)
+    return levels_db > threshold
+
+
+def silent_runs(mask: np.ndarray, min_frames: int) -> np.ndarray:
+    """[start_frame, end_frame) runs of non-speech at least min_frames long, shape (k, 2)."""
+    if not len(mask):
+        return np.zeros((0, 2), dtype=np.int64)
+    silent = np.concatenate(([False], ~mask, [False])).astype(np.int8)
+    edges = np.diff(silent)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    keep = (ends - starts) >= max(1, min_frames)
+    return np.stack([starts[keep], ends[keep]], axis=1)
+
+
+def find_silences(
+    samples: np.ndarray,
+    sample_rate: int,
+    min_silence_ms: int = 400,
+    frame_ms: int = FRAME_MS,
+) -> list[tuple[float, float]]:
+    """Silent stretches as (start_seconds, end_seconds)."""
+    levels = frame_levels_db(samples, sample_rate, frame_ms)
+    runs = silent_runs(speech_mask(levels), int(min_silence_ms / frame_ms))
+    sec = frame_ms / 1000
+    return [(float(a * sec), float(b * sec)) for a, b in runs]
+
+
+def plan_segments(
+    samples: np.ndarray,
+    sample_rate: int,
+    target_seconds: float,
+    max_seconds: float,
+    min_silence_ms: int = 400,
+    frame_ms: int = FRAME_MS,
+) -> list[tuple[float, float]]:
+    """
+    Split points for chunked transcription, as (start_seconds, end_seconds) covering the
+    whole recording. Each cut lands in the middle of the silence closest to target_seconds
+    into the current segment; with no silence before max_seconds it falls on the quietest
+    frame of the last few seconds instead, so words are rarely cut.
+    """
+    levels = frame_levels_db(samples, sample_rate, frame_ms)
+    total = len(samples) / sample_rate
+    sec = frame_ms / 1000
+    if total <= max_seconds or not len(levels):
+        return [(0.0, total)]
+
+    runs = silent_runs(speech_mask(levels), int(min_silence_ms / frame_ms))
+    mids = (runs.sum(axis=1) / 2.0) * sec if len(runs) else np.zeros(0)
+
+    segments = []
+    start = 0.0
+    while total - start > max_seconds:
+        lo, hi = start + 0.5 * target_seconds, start + max_seconds
+        candidates = mids[(mids > lo) & (mids < hi)]
+        if len(candidates):
+            cut = float(candidates[np.argmin(np.abs(candidates - (start + target_seconds)))])
+        else:
+            window = np.arange(int((hi - min(5.0, max_seconds / 4)) / sec), int(hi / sec))
+            window = window[window < len(levels)]
+            cut = float(window[np.argmin(levels[window])] * sec) if len(window) else hi
+        segments.append((start, cut))
+        start = cut
+    segments.append((start, total))
+    return segments
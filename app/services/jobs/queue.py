@@ -0,0 +1,307 @@
+# app/services/jobs/queue.py
+"""
+Postgres-backed background job queue for long OCR / transcription runs.
+
+Uploads with ?mode=async store the file in job_inputs, insert a queued Job and return its id
+immediately. Every app process runs JOB_WORKERS worker tasks that claim jobs with
+SELECT ... FOR UPDATE SKIP LOCKED, so several gunicorn workers (or nodes) share one queue
+without double-processing.
+
+- Handlers are registered per job kind by the tools (docchat "ocr", voicechat "transcribe")
+- Running jobs heartbeat; a job whose worker died is re-claimed after JOB_STALE_SECONDS,
+  and a worker shut down cleanly puts its job straight back in the queue
+- Failures are retried up to JOB_MAX_ATTEMPTS with exponential backoff (ValueError = bad
+  input, never retried); MistralUnavailable (rate limit / open breaker) is requeued after
+  its Retry-After without using up an attempt
+- Progress and the final result (same JSON the synchronous endpoint returns) live on the
+  row, so status polling works from any node
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import counter, current_flow, gauge, histogram
+from app.db.models.job import (
+    Job,
+    claim_job,
+    create_job,
+    delete_finished_jobs,
+    finish_job,
+    get_job,
+    get_job_input,
+    update_job,
+)
+from app.db.session import SessionLocal
+from app.services.ocr.admission import MistralUnavailable
+
+logger = logging.getLogger(__name__)
+
+CLEANUP_INTERVAL_SECONDS = 3600
+
+_JOBS = counter("jobs_total", "Job runs by kind and outcome (done | retry | deferred | failed | abandoned).", ("kind", "outcome"))
+_JOB_SECONDS = histogram("job_duration_seconds", "Job handler run time.", ("kind",))
+_JOBS_RUNNING = gauge("jobs_running", "Jobs running on this worker.", ("kind",))
+
+
+@dataclass
+class JobContext:
+    id: str
+    kind: str
+    worker_id: str
+    attempts: int
+    filename: str | None = None
+    content_type: str | None = None
+    params: dict = field(default_factory=dict)
+
+    async def progress(self, evt: dict) -> None:
+        """Publish a progress event (also serves as a heartbeat)."""
+        def _update():
+            with SessionLocal() as db:
+                update_job(db, self.id, self.worker_id, progress=evt)
+
+        await run_in_threadpool(_update)
+
+
+# handler(ctx, input_bytes) -> result dict
+JobHandler = Callable[[JobContext, bytes], Awaitable[dict]]
+
+
+def retry_delay(attempts: int) -> float:
+    """Backoff before the next attempt after `attempts` failed ones."""
+    return min(settings.JOB_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), settings.JOB_RETRY_MAX_SECONDS)
+
+
+def job_status(job: Job) -> dict:
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "result": job.result,
+        "error": job.error,
+        "attempts": job.attempts,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+class JobQueue:
+    def __init__(self, workers: int, poll_seconds: float):
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self._handlers: dict[str, JobHandler] = {}
+        self._flows: dict[str, str] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._wake: asyncio.Event | None = None
+        self._node = f"{socket.gethostname()}:{os.getpid()}"
+
+    def register(self, kind: str, handler: JobHandler, flow: str | None = None) -> None:
+        """flow labels the job's stage metrics (docchat, voicechat, ...); defaults to kind."""
+        self._handlers[kind] = handler
+        self._flows[kind] = flow or kind
+
+    async def submit(
+        self,
+        kind: str,
+        data: bytes,
+        filename: str | None = None,
+        content_type: str | None = None,
+        params: dict | None = None,
+    ) -> str:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = str(uuid.uuid4())
+        job = Job(
+            id=job_id,
+            kind=kind,
+            status="queued",
+            filename=filename,
+            content_type=content_type,
+            params=params or {},
+        )
+
+        def _create():
+            with SessionLocal() as db:
+                create_job(db, job, data)
+
+        await run_in_threadpool(_create)
+        if self._wake is not None:
+            self._wake.set()
+        return job_id
+
+    async def status(self, job_id: str) -> dict | None:
+        def _get():
+            with SessionLocal() as db:
+                job = get_job(db, job_id)
+                return job_status(job) if job is not None else None
+
+        return await run_in_threadpool(_get)
+
+    # ----------------------------
+    # Workers
+    # ----------------------------
+    def start(self) -> None:
+        if self.workers <= 0 or self._tasks:
+            return
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(f"{self._node}:{n}")) for n in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._cleanup_loop()))
+
+    async def shutdown(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _claim(self, worker_id: str) -> JobContext | None:
+        def _claim_sync():
+            with SessionLocal() as db:
+                job = claim_job(
+                    db,
+                    worker_id,
+                    list(self._handlers),
+                    stale_after=timedelta(seconds=settings.JOB_STALE_SECONDS),
+                )
+                if job is None:
+                    return None
+                return JobContext(
+                    id=job.id,
+                    kind=job.kind,
+                    worker_id=worker_id,
+                    attempts=job.attempts,
+                    filename=job.filename,
+                    content_type=job.content_type,
+                    params=job.params or {},
+                )
+
+        return await run_in_threadpool(_claim_sync)
+
+    async def _worker(self, worker_id: str) -> None:
+        while True:
+            try:
+                ctx = await self._claim(worker_id) if self._handlers else None
+            except Exception:
+                logger.exception("Job claim failed")
+                ctx = None
+
+            if ctx is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run(ctx)
+
+    async def _finish(self, ctx: JobContext, status: str, **fields) -> None:
+        def _update():
+            with SessionLocal() as db:
+                finish_job(db, ctx.id, ctx.worker_id, status, **fields)
+
+        await run_in_threadpool(_update)
+
+    async def _heartbeat(self, ctx: JobContext, run_task: asyncio.Task) -> None:
+        def _beat():
+            with SessionLocal() as db:
+                return update_job(db, ctx.id, ctx.worker_id)
+
+        while True:
+            await asyncio.sleep(settings.JOB_HEARTBEAT_SECONDS)
+            if not await run_in_threadpool(_beat):
+                logger.warning("Job %s was taken over by another worker; abandoning it", ctx.id)
+                run_task.cancel()
+                return
+
+    async def _run(self, ctx: JobContext) -> None:
+        if ctx.attempts > settings.JOB_MAX_ATTEMPTS:
+            # Re-claimed after its worker kept dying mid-run
+            await self._finish(ctx, "failed", error=f"Gave up after {ctx.attempts - 1} attempts.")
+            return
+
+        def _load():
+            with SessionLocal() as db:
+                return get_job_input(db, ctx.id)
+
+        data = await run_in_threadpool(_load)
+        if data is None:
+            await self._finish(ctx, "failed", error="Job input is missing.")
+            return
+
+        token = current_flow.set(self._flows.get(ctx.kind, ctx.kind))
+        try:
+            run_task = asyncio.create_task(self._handlers[ctx.kind](ctx, data))
+        finally:
+            current_flow.reset(token)
+        beat_task = asyncio.create_task(self._heartbeat(ctx, run_task))
+        started = time.perf_counter()
+        _JOBS_RUNNING.inc(ctx.kind)
+        try:
+            result = await run_task
+        except asyncio.CancelledError:
+            beat_task.cancel()
+            _JOBS.inc(ctx.kind, "abandoned")
+            if asyncio.current_task().cancelling():
+                # Shutting down: hand the job straight back to the queue
+                await self._finish(ctx, "queued", attempts=max(ctx.attempts - 1, 0), not_before=None)
+                raise
+            # Cancelled by the heartbeat: another worker owns the job now
+            return
+        except MistralUnavailable as e:
+            # Upstream outage, not a fault of this job: wait it out, keep the attempt
+            beat_task.cancel()
+            logger.warning("Job %s (%s) deferred %.0fs: %s", ctx.id, ctx.kind, e.retry_after, e)
+            _JOBS.inc(ctx.kind, "deferred")
+            await self._finish(
+                ctx,
+                "queued",
+                error=str(e),
+                attempts=max(ctx.attempts - 1, 0),
+                not_before=datetime.utcnow() + timedelta(seconds=max(e.retry_after, 1.0)),
+            )
+            return
+        except Exception as e:
+            beat_task.cancel()
+            retry = not isinstance(e, ValueError) and ctx.attempts < settings.JOB_MAX_ATTEMPTS
+            logger.warning("Job %s (%s) failed on attempt %d: %s", ctx.id, ctx.kind, ctx.attempts, e)
+            _JOBS.inc(ctx.kind, "retry" if retry else "failed")
+            if retry:
+                not_before = datetime.utcnow() + timedelta(seconds=retry_delay(ctx.attempts))
+                await self._finish(ctx, "queued", error=str(e), not_before=not_before)
+            else:
+                await self._finish(ctx, "failed", error=str(e))
+            return
+        finally:
+            _JOBS_RUNNING.dec(ctx.kind)
+            _JOB_SECONDS.observe(ctx.kind, value=time.perf_counter() - started)
+
+        beat_task.cancel()
+        _JOBS.inc(ctx.kind, "done")
+        await self._finish(ctx, "done", result=result, error=None)
+
+    async def _cleanup_loop(self) -> None:
+        def _cleanup():
+            with SessionLocal() as db:
+                return delete_finished_jobs(db, timedelta(seconds=settings.JOB_RETENTION_SECONDS))
+
+        while True:
+            try:
+                deleted = await run_in_threadpool(_cleanup)
+                if deleted:
+                    logger.info("Deleted %d finished jobs", deleted)
+            except Exception:
+                logger.exception("Job cleanup failed")
+            await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)
+
+
+job_queue = JobQueue(workers=settings.JOB_WORKERS, poll_seconds=settings.JOB_POLL_SECONDS)
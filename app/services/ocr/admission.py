@@ -0,0 +1,346 @@
+# app/services/ocr/admission.py
+"""
+Admission control for Mistral API calls (every MistralClient request goes through it).
+
+Per endpoint (chat / ocr / transcribe / embed / files):
+- concurrency semaphore (MISTRAL_CONCURRENCY_<ENDPOINT>); callers beyond it queue
+- token-bucket rate limiter shared by all endpoints (MISTRAL_RATE_LIMIT_RPS, burst
+  MISTRAL_RATE_LIMIT_BURST; 0 disables). Limits are per worker process: divide the account
+  quota by the number of gunicorn workers.
+- retry with full-jitter exponential backoff on 429 / 5xx / timeouts / connection errors,
+  waiting at least the Retry-After the API sent (MISTRAL_RETRIES, MISTRAL_RETRY_MAX_WAIT)
+- circuit breaker: MISTRAL_BREAKER_FAILURES consecutive failed attempts open it for
+  MISTRAL_BREAKER_RESET_SECONDS (or the Retry-After, if longer); while open, calls fail fast
+  with MistralUnavailable, then one probe call is let through (half-open)
+
+MistralUnavailable (a RuntimeError) means "try again later": routers answer 503 with
+Retry-After, background jobs requeue. admission.stats() exposes queue depth, in-flight
+calls, limiter and breaker state per endpoint.
+"""
+
+import asyncio
+import email.utils
+import logging
+import random
+import time
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import add_collector, gauge
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+
+
+class MistralUnavailable(RuntimeError):
+    """Upstream rate-limited or degraded (after retries), or the circuit breaker is open."""
+
+    def __init__(self, message: str, retry_after: float = 5.0, status_code: int | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, int(round(self.retry_after))))
+
+
+class RetryableResponse(Exception):
+    """Raised inside an attempt for a retryable status; carries the response."""
+
+    def __init__(self, response: httpx.Response):
+        self.response = response
+
+
+def retry_after_seconds(response: httpx.Response | None) -> float | None:
+    """Retry-After (delta seconds or HTTP date) from a response, if any."""
+    if response is None:
+        return None
+    value = response.headers.get("retry-after") or response.headers.get("x-ratelimit-reset-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def _detail(response: httpx.Response) -> str:
+    try:
+        return str(response.json())[:300]
+    except Exception:
+        return response.text[:300]
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waiting = 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        self.waiting += 1
+        try:
+            async with self._lock:  # FIFO: one waiter at a time takes the next token
+                self._refill()
+                if self._tokens < 1:
+                    await asyncio.sleep((1 - self._tokens) / self.rate)
+                    self._refill()
+                self._tokens -= 1
+        finally:
+            self.waiting -= 1
+
+    def stats(self) -> dict:
+        if self.rate > 0:
+            self._refill()
+        return {
+            "rate_per_second": self.rate,
+            "burst": self.capacity,
+            "tokens": round(self._tokens, 2),
+            "waiting": self.waiting,
+        }
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"  # closed | open | half_open
+        self.failures = 0
+        self.opened_at = 0.0
+        self.open_for = reset_seconds
+        self.opens = 0
+        self._probe_in_flight = False
+
+    def remaining(self) -> float:
+        return max(0.0, self.opened_at + self.open_for - time.monotonic())
+
+    def before_call(self) -> bool:
+        """Raises while open. Returns True if this call is the half-open probe."""
+        if self.failure_threshold <= 0 or self.state == "closed":
+            return False
+        if self.state == "open" and self.remaining() > 0:
+            raise MistralUnavailable(
+                f"Mistral {self.name} is unavailable (circuit open); retry later.",
+                retry_after=self.remaining(),
+            )
+        # Open period elapsed: let exactly one probe through
+        if self._probe_in_flight:
+            raise MistralUnavailable(
+                f"Mistral {self.name} is recovering; retry shortly.",
+                retry_after=min(5.0, self.reset_seconds),
+            )
+        self.state = "half_open"
+        self._probe_in_flight = True
+        return True
+
+    def abandon(self, probe: bool) -> None:
+        """The call ended without telling us anything about upstream health (cancelled, bad input)."""
+        if probe:
+            self._probe_in_flight = False
+            if self.state == "half_open":
+                self.state = "open"
+                self.open_for = 0.0  # next call probes again
+
+    def record_success(self, probe: bool) -> None:
+        if probe:
+            self._probe_in_flight = False
+        if self.state != "closed":
+            logger.info("Mistral %s circuit closed", self.name)
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self, probe: bool, retry_after: float | None = None) -> None:
+        if probe:
+            self._probe_in_flight = False
+        self.failures += 1
+        if self.failure_threshold > 0 and (probe or self.failures >= self.failure_threshold):
+            if self.state != "open":
+                self.opens += 1
+                logger.warning("Mistral %s circuit opened after %d failures", self.name, self.failures)
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.open_for = max(self.reset_seconds, retry_after or 0.0)
+
+    def stats(self) -> dict:
+        return {
+            "state": "open" if self.state == "open" and self.remaining() > 0 else self.state,
+            "consecutive_failures": self.failures,
+            "opens": self.opens,
+            "retry_in_seconds": round(self.remaining(), 1) if self.state == "open" else 0.0,
+        }
+
+
+class EndpointGate:
+    def __init__(self, name: str, concurrency: int):
+        self.name = name
+        self.limit = max(1, concurrency)
+        self.sem = asyncio.Semaphore(self.limit)
+        self.breaker = CircuitBreaker(name, settings.MISTRAL_BREAKER_FAILURES, settings.MISTRAL_BREAKER_RESET_SECONDS)
+        self.queued = 0
+        self.in_flight = 0
+        self.counters = {"calls": 0, "retries": 0, "failures": 0, "rejected": 0}
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.limit,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            **self.counters,
+            "breaker": self.breaker.stats(),
+        }
+
+
+class Admission:
+    def __init__(self):
+        self.bucket = TokenBucket(settings.MISTRAL_RATE_LIMIT_RPS, settings.MISTRAL_RATE_LIMIT_BURST)
+        self.gates = {
+            "chat": EndpointGate("chat", settings.MISTRAL_CONCURRENCY_CHAT),
+            "ocr": EndpointGate("ocr", settings.MISTRAL_CONCURRENCY_OCR),
+            "transcribe": EndpointGate("transcribe", settings.MISTRAL_CONCURRENCY_TRANSCRIBE),
+            "embed": EndpointGate("embed", settings.MISTRAL_CONCURRENCY_EMBED),
+            "files": EndpointGate("files", settings.MISTRAL_CONCURRENCY_FILES),
+        }
+
+    def _backoff(self, attempt: int, retry_after: float | None) -> float:
+        delay = random.uniform(0, min(settings.MISTRAL_RETRY_MAX_WAIT, settings.MISTRAL_RETRY_BASE_SECONDS * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    async def _acquire(self, gate: EndpointGate) -> None:
+        gate.queued += 1
+        try:
+            await gate.sem.acquire()
+        finally:
+            gate.queued -= 1
+        try:
+            await self.bucket.acquire()
+        except BaseException:
+            gate.sem.release()
+            raise
+        gate.in_flight += 1
+
+    def release(self, endpoint: str) -> None:
+        """Frees a slot kept by call(..., keep_slot=True)."""
+        gate = self.gates[endpoint]
+        gate.in_flight -= 1
+        gate.sem.release()
+
+    async def call(
+        self,
+        endpoint: str,
+        attempt_fn: Callable[[], Awaitable[T]],
+        retries: int | None = None,
+        keep_slot: bool = False,
+    ) -> T:
+        """
+        Runs attempt_fn under the endpoint's limits, retrying retryable failures.
+        attempt_fn raises RetryableResponse (or a transport error) for those; any other
+        exception reaches the caller unchanged and does not count against the breaker.
+        keep_slot: on success the concurrency slot stays taken (a streamed response still
+        being read); the caller must release(endpoint) when done.
+        """
+        gate = self.gates[endpoint]
+        retries = settings.MISTRAL_RETRIES if retries is None else retries
+        gate.counters["calls"] += 1
+
+        for attempt in range(retries + 1):
+            try:
+                probe = gate.breaker.before_call()
+            except MistralUnavailable:
+                gate.counters["rejected"] += 1
+                raise
+
+            response, error = None, None
+            try:
+                await self._acquire(gate)
+            except BaseException:
+                gate.breaker.abandon(probe)
+                raise
+            try:
+                result = await attempt_fn()
+            except RetryableResponse as e:
+                response = e.response
+            except RETRYABLE_ERRORS as e:
+                error = e
+            except BaseException:
+                gate.breaker.abandon(probe)
+                self.release(endpoint)
+                raise
+            if response is None and error is None:
+                gate.breaker.record_success(probe)
+                if not keep_slot:
+                    self.release(endpoint)
+                return result
+            self.release(endpoint)
+
+            wait_hint = retry_after_seconds(response)
+            gate.breaker.record_failure(probe, wait_hint)
+            what = f"HTTP {response.status_code}: {_detail(response)}" if response is not None else type(error).__name__
+            if attempt >= retries or (wait_hint is not None and wait_hint > settings.MISTRAL_RETRY_MAX_WAIT):
+                gate.counters["failures"] += 1
+                retry_after = wait_hint if wait_hint is not None else (
+                    gate.breaker.remaining() or settings.MISTRAL_RETRY_BASE_SECONDS * 2
+                )
+                raise MistralUnavailable(
+                    f"Mistral {endpoint} API unavailable ({what}) after {attempt + 1} attempt(s); retry later.",
+                    retry_after=retry_after,
+                    status_code=response.status_code if response is not None else None,
+                ) from error
+
+            delay = self._backoff(attempt, wait_hint)
+            gate.counters["retries"] += 1
+            logger.info("Mistral %s %s; retry %d/%d in %.1fs", endpoint, what, attempt + 1, retries, delay)
+            await asyncio.sleep(delay)
+
+        raise AssertionError("unreachable")
+
+    def stats(self) -> dict:
+        return {
+            "rate_limiter": self.bucket.stats(),
+            "endpoints": {name: gate.stats() for name, gate in self.gates.items()},
+        }
+
+
+admission = Admission()
+
+_IN_FLIGHT = gauge("mistral_in_flight", "Mistral calls holding a concurrency slot.", ("endpoint",))
+_QUEUED = gauge("mistral_queued", "Mistral calls waiting for a concurrency slot.", ("endpoint",))
+_BREAKER = gauge("mistral_breaker_open", "Circuit breaker state: 0 closed, 0.5 half-open, 1 open.", ("endpoint",))
+_LIMITER_WAITING = gauge("mistral_rate_limiter_waiting", "Calls waiting for a rate-limiter token.")
+
+
+def _collect() -> None:
+    for name, gate in admission.gates.items():
+        _IN_FLIGHT.set(name, value=gate.in_flight)
+        _QUEUED.set(name, value=gate.queued)
+        state = gate.breaker.stats()["state"]
+        _BREAKER.set(name, value={"closed": 0.0, "half_open": 0.5}.get(state, 1.0))
+    _LIMITER_WAITING.set(value=admission.bucket.waiting)
+
+
+add_collector(_collect)
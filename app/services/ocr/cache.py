@@ -0,0 +1,148 @@
+# app/services/ocr/cache.py
+"""
+Content-addressed OCR result cache.
+
+Key = SHA-256(raw upload bytes) + OCR model + preprocessing version, so a re-upload of the
+same PDF/screenshot skips preprocessing and the Mistral OCR call entirely.
+
+Two tiers:
+- in-process LRU (OrderedDict), bounded by item count and approximate bytes
+- shared disk tier (LocalStore) so all workers on the node reuse each other's results
+
+Both tiers honour OCR_CACHE_TTL_SECONDS. Hit/miss counters are kept per tier and exported
+on /metrics, labelled by cache name (the map-reduce note cache reuses this class):
+cache_events_total{cache,event}, cache_memory_items{cache}, cache_memory_bytes{cache}.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+from app.core.config import settings
+from app.core.metrics import add_collector, counter, gauge
+from app.services.storage.local import LocalStore
+
+_EVENTS = counter(
+    "cache_events_total",
+    "Result cache lookups and writes by event (memory_hits, disk_hits, misses, stores, evictions).",
+    ("cache", "event"),
+)
+_MEMORY_ITEMS = gauge("cache_memory_items", "Entries in a result cache's in-process tier.", ("cache",))
+_MEMORY_BYTES = gauge("cache_memory_bytes", "Approximate bytes held by a result cache's in-process tier.", ("cache",))
+_CACHES: list["OcrCache"] = []
+
+# Bump whenever the preprocessing output can change (used to key cached OCR results)
+PREPROCESS_VERSION = "2"
+
+
+def ocr_cache_key(sha256_hex: str, model: str, preprocess_version: str) -> str:
+    return hashlib.sha256(f"{sha256_hex}:{model}:{preprocess_version}".encode("utf-8")).hexdigest()
+
+
+class OcrCache:
+    def __init__(
+        self,
+        max_items: int,
+        max_bytes: int,
+        ttl_seconds: float,
+        disk: LocalStore | None = None,
+        name: str = "ocr",
+    ):
+        self.name = name
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.disk = disk
+        self._mem: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._mem_bytes = 0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        _CACHES.append(self)
+
+    def _count(self, event: str) -> None:
+        self.counters[event] += 1
+        _EVENTS.inc(self.name, event)
+
+    # ---- memory tier ----
+    def _mem_get(self, key: str) -> bytes | None:
+        item = self._mem.get(key)
+        if item is None:
+            return None
+        stored_at, blob = item
+        if self.ttl_seconds and time.time() - stored_at > self.ttl_seconds:
+            self._mem_drop(key)
+            return None
+        self._mem.move_to_end(key)
+        return blob
+
+    def _mem_drop(self, key: str) -> None:
+        item = self._mem.pop(key, None)
+        if item is not None:
+            self._mem_bytes -= len(item[1])
+
+    def _mem_put(self, key: str, blob: bytes) -> None:
+        self._mem_drop(key)
+        if len(blob) > self.max_bytes:
+            return
+        self._mem[key] = (time.time(), blob)
+        self._mem_bytes += len(blob)
+        while self._mem and (len(self._mem) > self.max_items or self._mem_bytes > self.max_bytes):
+            _, (_, old) = self._mem.popitem(last=False)
+            self._mem_bytes -= len(old)
+            self._count("evictions")
+
+    # ---- public API ----
+    async def get(self, key: str) -> dict | None:
+        blob = self._mem_get(key)
+        if blob is not None:
+            self._count("memory_hits")
+            return json.loads(blob)
+
+        if self.disk is not None:
+            blob = await asyncio.to_thread(self.disk.get, key)
+            if blob is not None:
+                self._count("disk_hits")
+                self._mem_put(key, blob)
+                return json.loads(blob)
+
+        self._count("misses")
+        return None
+
+    async def put(self, key: str, value: dict) -> None:
+        blob = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        self._mem_put(key, blob)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.put, key, blob)
+        self._count("stores")
+
+    def stats(self) -> dict:
+        lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+        hits = lookups - self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_items": len(self._mem),
+            "memory_bytes": self._mem_bytes,
+        }
+
+
+ocr_cache = OcrCache(
+    max_items=settings.OCR_CACHE_MEMORY_ITEMS,
+    max_bytes=settings.OCR_CACHE_MEMORY_MB * 1024 * 1024,
+    ttl_seconds=settings.OCR_CACHE_TTL_SECONDS,
+    disk=LocalStore(
+        settings.OCR_CACHE_DIR,
+        max_bytes=settings.OCR_CACHE_DISK_MB * 1024 * 1024,
+        ttl_seconds=settings.OCR_CACHE_TTL_SECONDS,
+    ) if settings.OCR_CACHE_DIR else None,
+)
+
+
+def _collect() -> None:
+    for cache in _CACHES:
+        _MEMORY_ITEMS.set(cache.name, value=len(cache._mem))
+        _MEMORY_BYTES.set(cache.name, value=cache._mem_bytes)
+
+
+add_collector(_collect)
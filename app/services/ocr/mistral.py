@@ -0,0 +1,373 @@
+# app/services/ocr/mistral.py
+"""
+Shared async Mistral client.
+
+One httpx.AsyncClient per worker process, created in the FastAPI lifespan hook
+and reused by every tool (docchat OCR + chat, voicechat transcription + chat).
+
+- Keep-alive connection pool (sizes from Settings)
+- Per-endpoint timeouts (chat / OCR / audio transcription)
+- Every request goes through admission control (admission.py): per-endpoint concurrency,
+  rate limiting, retries with backoff and a circuit breaker. Retryable failures that
+  persist raise MistralUnavailable; other non-OK responses raise MistralAPIError (a
+  RuntimeError with the status code) with the same message format the tools used before
+"""
+
+import json
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import UPSTREAM_RESPONSES, observe_stage, stage
+from app.services.ocr.admission import RETRYABLE_STATUS, RetryableResponse, admission
+
+MISTRAL_CHAT_PATH = "/v1/chat/completions"
+MISTRAL_OCR_PATH = "/v1/ocr"
+MISTRAL_AUDIO_TRANSCRIBE_PATH = "/v1/audio/transcriptions"
+MISTRAL_EMBEDDINGS_PATH = "/v1/embeddings"
+MISTRAL_FILES_PATH = "/v1/files"
+
+
+class MistralAPIError(RuntimeError):
+    """Non-OK response that admission control does not retry."""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Transport errors and 5xx responses; worth a caller-level retry, unlike 4xx or bugs."""
+    if isinstance(exc, httpx.TransportError):
+        return True
+    return isinstance(exc, MistralAPIError) and exc.status_code >= 500
+
+
+def _timeout(total: float) -> httpx.Timeout:
+    # Connect fast, but allow the endpoint's full budget for the response.
+    return httpx.Timeout(total, connect=min(10.0, total))
+
+
+class MistralClient:
+    """
+    Thin async wrapper around the Mistral REST API.
+
+    Usage:
+        client = MistralClient()
+        answer = await client.chat(messages)
+        await client.aclose()
+    """
+
+    def __init__(self, base_url: str | None = None, api_key: str | None = None):
+        self.api_key = api_key if api_key is not None else settings.MISTRAL_API_KEY
+        self.timeouts = {
+            "chat": _timeout(settings.MISTRAL_CHAT_TIMEOUT),
+            "ocr": _timeout(settings.MISTRAL_OCR_TIMEOUT),
+            "transcribe": _timeout(settings.MISTRAL_TRANSCRIBE_TIMEOUT),
+            "embed": _timeout(settings.MISTRAL_EMBED_TIMEOUT),
+        }
+        self._http = httpx.AsyncClient(
+            base_url=base_url or settings.MISTRAL_BASE_URL,
+            limits=httpx.Limits(
+                max_connections=settings.MISTRAL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.MISTRAL_MAX_KEEPALIVE,
+                keepalive_expiry=settings.MISTRAL_KEEPALIVE_EXPIRY,
+            ),
+            timeout=self.timeouts["chat"],
+        )
+
+    def _headers(self, json_body: bool = True) -> dict:
+        if not self.api_key:
+            raise ValueError("MISTRAL_API_KEY is not set")
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Accept": "application/json",
+        }
+        # IMPORTANT: do NOT set Content-Type manually for multipart; httpx sets the boundary.
+        if json_body:
+            headers["Content-Type"] = "application/json"
+        return headers
+
+    @staticmethod
+    def _raise_for_status(r: httpx.Response, label: str) -> None:
+        if r.is_success:
+            return
+        try:
+            detail = r.json()
+        except Exception:
+            detail = r.text
+        raise MistralAPIError(f"Mistral {label} API error ({r.status_code}): {detail}", r.status_code)
+
+    @classmethod
+    def _check(cls, r: httpx.Response, label: str) -> None:
+        """Retryable statuses go back to admission control; other errors raise MistralAPIError."""
+        if r.status_code in RETRYABLE_STATUS:
+            raise RetryableResponse(r)
+        cls._raise_for_status(r, label)
+
+    @staticmethod
+    async def _send(endpoint: str, request: Awaitable[httpx.Response]) -> httpx.Response:
+        """Awaits one HTTP attempt, timed as stage upstream_<endpoint> and counted by status."""
+        start = time.perf_counter()
+        try:
+            r = await request
+        except httpx.HTTPError as e:
+            UPSTREAM_RESPONSES.inc(endpoint, type(e).__name__)
+            raise
+        finally:
+            observe_stage(f"upstream_{endpoint}", time.perf_counter() - start)
+        UPSTREAM_RESPONSES.inc(endpoint, r.status_code)
+        return r
+
+    @staticmethod
+    def _json(r: httpx.Response):
+        with stage("json_parse"):
+            return r.json()
+
+    async def post_json(self, path: str, payload: dict, endpoint: str, label: str) -> dict:
+        async def attempt():
+            r = await self._send(endpoint, self._http.post(
+                path,
+                json=payload,
+                headers=self._headers(),
+                timeout=self.timeouts[endpoint],
+            ))
+            self._check(r, label)
+            return self._json(r)
+
+        return await admission.call(endpoint, attempt)
+
+    async def chat(self, messages, model=None, temperature=0.2, max_tokens=800) -> str:
+        """
+        messages format:
+        [
+          {"role": "system", "content": "..."},
+          {"role": "user", "content": "..."}
+        ]
+        """
+        payload = {
+            "model": model or settings.MISTRAL_CHAT_MODEL,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        data = await self.post_json(MISTRAL_CHAT_PATH, payload, "chat", "Chat")
+        return data["choices"][0]["message"]["content"]
+
+    async def chat_stream(self, messages, model=None, temperature=0.2, max_tokens=800) -> AsyncIterator[str]:
+        """
+        Streams completion text deltas. Closing the generator (e.g. the browser went away)
+        closes the upstream response, so Mistral stops generating tokens nobody reads.
+        """
+        payload = {
+            "model": model or settings.MISTRAL_CHAT_MODEL,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+        }
+        headers = {**self._headers(), "Accept": "text/event-stream"}
+
+        async def attempt() -> httpx.Response:
+            request = self._http.build_request(
+                "POST", MISTRAL_CHAT_PATH, json=payload, headers=headers, timeout=self.timeouts["chat"]
+            )
+            r = await self._send("chat", self._http.send(request, stream=True))
+            if not r.is_success:
+                await r.aread()
+                await r.aclose()
+                self._check(r, "Chat")
+            return r
+
+        # Retries cover opening the stream; the concurrency slot is held until it ends
+        r = await admission.call("chat", attempt, keep_slot=True)
+        try:
+            async for line in r.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                choices = chunk.get("choices") or []
+                delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                if delta:
+                    yield delta
+        finally:
+            await r.aclose()
+            admission.release("chat")
+
+    async def ocr(self, document: dict, model: str | None = None, **options) -> dict:
+        """
+        document: {"type": "document_url", ...} or {"type": "image_url", ...}
+        Returns the raw OCR response JSON.
+        """
+        payload = {
+            "model": model or settings.MISTRAL_OCR_MODEL,
+            "document": document,
+            **options,
+        }
+        return await self.post_json(MISTRAL_OCR_PATH, payload, "ocr", "OCR")
+
+    async def ocr_streamed(
+        self,
+        doc_type: str,
+        mime: str,
+        b64_chunks: Callable[[], AsyncIterator[bytes]],
+        b64_length: int,
+        model: str | None = None,
+        **options,
+    ) -> dict:
+        """
+        Same request as ocr(), but the base64 data URL is streamed into the JSON body from
+        b64_chunks() instead of being built as one string. doc_type: document_url | image_url.
+        b64_chunks is called once per attempt, so a retry re-reads the source from the start.
+        """
+        marker = "__CPCG_B64__"
+        template = json.dumps({
+            "model": model or settings.MISTRAL_OCR_MODEL,
+            **options,
+            "document": {"type": doc_type, doc_type: marker},
+        })
+        before, after = template.split(f'"{marker}"')
+        prefix = f'{before}"data:{mime};base64,'.encode("utf-8")
+        suffix = f'"{after}'.encode("utf-8")
+
+        async def body():
+            yield prefix
+            async for chunk in b64_chunks():
+                yield chunk
+            yield suffix
+
+        headers = {**self._headers(), "Content-Length": str(len(prefix) + b64_length + len(suffix))}
+
+        async def attempt():
+            r = await self._send("ocr", self._http.post(
+                MISTRAL_OCR_PATH,
+                content=body(),
+                headers=headers,
+                timeout=self.timeouts["ocr"],
+            ))
+            self._check(r, "OCR")
+            return self._json(r)
+
+        return await admission.call("ocr", attempt)
+
+    async def transcribe(self, data: dict, files: dict) -> dict:
+        """
+        Multipart upload to the audio transcriptions endpoint.
+        Returns the raw transcription response JSON.
+        """
+        async def attempt():
+            r = await self._send("transcribe", self._http.post(
+                MISTRAL_AUDIO_TRANSCRIBE_PATH,
+                headers=self._headers(json_body=False),
+                data=data,
+                files=files,
+                timeout=self.timeouts["transcribe"],
+            ))
+            self._check(r, "Audio Transcription")
+            return self._json(r)
+
+        return await admission.call("transcribe", attempt)
+
+    async def embed(self, texts: list[str], model: str | None = None) -> list[list[float]]:
+        """Returns one embedding vector per input text (same order)."""
+        payload = {
+            "model": model or settings.MISTRAL_EMBED_MODEL,
+            "input": texts,
+        }
+        data = await self.post_json(MISTRAL_EMBEDDINGS_PATH, payload, "embed", "Embeddings")
+        rows = sorted(data["data"], key=lambda d: d.get("index", 0))
+        return [row["embedding"] for row in rows]
+
+    async def upload_file(self, filename: str, fileobj, mime: str, purpose: str = "ocr") -> str:
+        """Multipart upload to the Files API (streamed from fileobj). Returns the file id."""
+        async def attempt():
+            fileobj.seek(0)
+            r = await self._send("files", self._http.post(
+                MISTRAL_FILES_PATH,
+                headers=self._headers(json_body=False),
+                data={"purpose": purpose},
+                files={"file": (filename, fileobj, mime)},
+                timeout=self.timeouts["ocr"],
+            ))
+            self._check(r, "Files")
+            return self._json(r)["id"]
+
+        return await admission.call("files", attempt)
+
+    async def signed_file_url(self, file_id: str, expiry_hours: int = 1) -> str:
+        async def attempt():
+            r = await self._send("files", self._http.get(
+                f"{MISTRAL_FILES_PATH}/{file_id}/url",
+                params={"expiry": expiry_hours},
+                headers=self._headers(json_body=False),
+                timeout=self.timeouts["chat"],
+            ))
+            self._check(r, "Files")
+            return self._json(r)["url"]
+
+        return await admission.call("files", attempt)
+
+    async def delete_file(self, file_id: str) -> None:
+        async def attempt():
+            r = await self._send("files", self._http.delete(
+                f"{MISTRAL_FILES_PATH}/{file_id}",
+                headers=self._headers(json_body=False),
+                timeout=self.timeouts["chat"],
+            ))
+            self._check(r, "Files")
+
+        await admission.call("files", attempt)
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+# ----------------------------
+# Process-wide client lifecycle
+# ----------------------------
+_client: MistralClient | None = None
+
+
+async def startup_mistral_client() -> MistralClient:
+    """Called from the FastAPI lifespan hook."""
+    global _client
+    if _client is None:
+        _client = MistralClient()
+    return _client
+
+
+async def shutdown_mistral_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_mistral_client() -> MistralClient:
+    """
+    Returns the shared client. Created lazily if the lifespan hook did not run
+    (scripts, one-off shells).
+    """
+    global _client
+    if _client is None:
+        _client = MistralClient()
+    return _client
+
+
+async def mistral_chat(messages, model=None, temperature=0.2, max_tokens=800) -> str:
+    """Shared chat helper used by docchat and voicechat."""
+    return await get_mistral_client().chat(
+        messages, model=model, temperature=temperature, max_tokens=max_tokens
+    )
+
+
+def mistral_chat_stream(messages, model=None, temperature=0.2, max_tokens=800) -> AsyncIterator[str]:
+    """Streaming counterpart of mistral_chat (yields text deltas)."""
+    return get_mistral_client().chat_stream(
+        messages, model=model, temperature=temperature, max_tokens=max_tokens
+    )
@@ -0,0 +1,116 @@
+# app/services/ocr/pdf.py
+"""
+Dependency-free PDF page count, used to plan page-batched OCR before anything is sent.
+
+Reads the file in chunks and takes the largest /Count of any /Type /Pages dictionary
+(the root page tree node). PDFs 1.5+ may keep that dictionary inside a compressed object
+stream (/Type /ObjStm); those streams are inflated one at a time and searched the same way.
+
+Returns None when the count cannot be determined (encrypted or malformed files); callers
+then fall back to a single OCR request.
+"""
+
+import re
+import zlib
+from typing import BinaryIO
+
+READ_CHUNK = 4 * 1024 * 1024
+OVERLAP = 16 * 1024
+MAX_OBJSTM_BYTES = 64 * 1024 * 1024
+# How far from "/Type /Pages" to look for the enclosing dictionary's brackets
+MAX_DICT_SCAN = 256 * 1024
+
+_PAGES_RE = re.compile(rb"/Type\s*/Pages(?![A-Za-z])")
+_COUNT_RE = re.compile(rb"/Count\s+(\d+)")
+_OBJSTM_RE = re.compile(rb"/Type\s*/ObjStm(?![A-Za-z])")
+_STREAM_RE = re.compile(rb"stream\r?\n")
+
+
+def _dict_around(buf: bytes, pos: int) -> bytes:
+    """The innermost << ... >> dictionary containing pos (best effort)."""
+    depth = 0
+    start = max(0, pos - MAX_DICT_SCAN)
+    i = pos
+    while i > start:
+        if buf[i - 1:i + 1] == b">>":
+            depth += 1
+            i -= 2
+            continue
+        if buf[i - 1:i + 1] == b"<<":
+            if depth == 0:
+                start = i - 1
+                break
+            depth -= 1
+            i -= 2
+            continue
+        i -= 1
+
+    depth = 0
+    end = min(len(buf), pos + MAX_DICT_SCAN)
+    i = pos
+    while i < end - 1:
+        two = buf[i:i + 2]
+        if two == b"<<":
+            depth += 1
+            i += 2
+        elif two == b">>":
+            if depth == 0:
+                end = i + 2
+                break
+            depth -= 1
+            i += 2
+        else:
+            i += 1
+    return buf[start:end]
+
+
+def _max_pages_count(buf: bytes) -> int:
+    best = 0
+    for m in _PAGES_RE.finditer(buf):
+        for c in _COUNT_RE.finditer(_dict_around(buf, m.start())):
+            best = max(best, int(c.group(1)))
+    return best
+
+
+def _inflate_from(f: BinaryIO, offset: int) -> bytes:
+    f.seek(offset)
+    inflater = zlib.decompressobj()
+    out = bytearray()
+    while not inflater.eof and len(out) < MAX_OBJSTM_BYTES:
+        chunk = f.read(256 * 1024)
+        if not chunk:
+            break
+        out += inflater.decompress(chunk)
+    return bytes(out)
+
+
+def pdf_page_count(f: BinaryIO) -> int | None:
+    """Blocking; run it in a thread. Leaves the file position at 0."""
+    best = 0
+    objstm_offsets: list[int] = []
+    tail = b""
+    tail_offset = 0
+
+    f.seek(0)
+    while True:
+        chunk = f.read(READ_CHUNK)
+        if not chunk:
+            break
+        buf = tail + chunk
+        best = max(best, _max_pages_count(buf))
+        for m in _OBJSTM_RE.finditer(buf):
+            s = _STREAM_RE.search(buf, m.end())
+            if s is not None:
+                objstm_offsets.append(tail_offset + s.end())
+        tail_offset += len(buf) - min(OVERLAP, len(buf))
+        tail = buf[-OVERLAP:]
+
+    if not best:
+        for offset in sorted(set(objstm_offsets)):
+            try:
+                best = max(best, _max_pages_count(_inflate_from(f, offset)))
+            except zlib.error:
+                continue
+
+    f.seek(0)
+    return best or None
@@ -0,0 +1,192 @@
+# app/services/ocr/pool.py
+"""
+Bounded process pool for CPU-heavy image preprocessing.
+
+preprocess_for_ocr (app/services/ocr/preprocess.py; OpenCV: CLAHE, denoise, sharpen, PNG
+encode) is pure CPU and can take seconds on a 12 MP photo. Running it inline blocks the
+event loop for every request on the worker, so it runs here instead (and only the pool
+processes ever import OpenCV):
+
+- ProcessPoolExecutor sized to cores (OCR_PREPROCESS_WORKERS, 0 = os.cpu_count())
+- Image buffers cross the process boundary through multiprocessing.shared_memory
+  (no pickling of multi-MB byte strings in either direction)
+- Queue depth is capped (OCR_PREPROCESS_MAX_QUEUE); when saturated we raise
+  PreprocessPoolSaturated immediately so the router can answer 503 instead of piling up work
+- A pool process that dies (OOM, OpenCV segfault) breaks the executor; it is replaced at
+  once, so only the requests it was running fail
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker, shared_memory
+
+from app.core.config import settings
+from app.core.metrics import add_collector, counter, gauge
+
+_IN_FLIGHT = gauge("preprocess_pool_in_flight", "Images being preprocessed or queued for the pool.")
+_CAPACITY = gauge("preprocess_pool_capacity", "Pool processes plus allowed queued images.")
+_REJECTED = counter("preprocess_pool_rejected_total", "Images refused because the pool was saturated.")
+_RESTARTS = counter("preprocess_pool_restarts_total", "Pools replaced after a worker process died.")
+
+logger = logging.getLogger(__name__)
+
+
+class PreprocessPoolSaturated(RuntimeError):
+    """Raised when the preprocessing pool already has its maximum queued work."""
+
+
+def _worker_preprocess(in_name: str, in_size: int) -> tuple[str, int, dict]:
+    """
+    Runs inside a pool process.
+    Reads the input image from shared memory, writes the PNG result into a new block
+    and returns (block_name, size, stage_report). The parent owns unlinking both blocks.
+    """
+    from app.services.ocr.preprocess import preprocess_for_ocr_full, preprocess_for_ocr_staged
+
+    shm_in = shared_memory.SharedMemory(name=in_name)
+    try:
+        image_bytes = bytes(shm_in.buf[:in_size])
+    finally:
+        shm_in.close()
+
+    if settings.OCR_PREPROCESS_MODE == "full":
+        out, report = preprocess_for_ocr_full(image_bytes), {"stages": ["full"], "metrics": {}}
+    else:
+        out, report = preprocess_for_ocr_staged(image_bytes)
+
+    shm_out = shared_memory.SharedMemory(create=True, size=max(len(out), 1))
+    shm_out.buf[: len(out)] = out
+    shm_out.close()
+    return shm_out.name, len(out), report
+
+
+class PreprocessPool:
+    def __init__(self, workers: int | None = None, max_queue: int | None = None):
+        self.workers = workers or settings.OCR_PREPROCESS_WORKERS or os.cpu_count() or 1
+        self.max_queue = settings.OCR_PREPROCESS_MAX_QUEUE if max_queue is None else max_queue
+        self.in_flight = 0
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        # Running jobs + jobs allowed to wait for a free process
+        return self.workers + self.max_queue
+
+    def start(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Start the shared-memory resource tracker before spawning children so they
+                # all report to the same tracker (avoids leaked-segment warnings at exit).
+                resource_tracker.ensure_running()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _replace(self, broken: ProcessPoolExecutor) -> None:
+        """Swap out a broken executor (unless another request already did)."""
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+        _RESTARTS.inc()
+        logger.warning("Preprocess pool process died; starting a new pool")
+        self.start()
+
+    async def run(self, image_bytes: bytes) -> tuple[bytes, dict]:
+        """Preprocess image bytes in a pool process. Returns (PNG bytes, stage report)."""
+        if self.in_flight >= self.capacity:
+            _REJECTED.inc()
+            raise PreprocessPoolSaturated("Image preprocessing is busy. Please retry shortly.")
+
+        executor = self.start()
+        self.in_flight += 1
+        shm_in = shared_memory.SharedMemory(create=True, size=max(len(image_bytes), 1))
+        try:
+            shm_in.buf[: len(image_bytes)] = image_bytes
+            try:
+                future = executor.submit(_worker_preprocess, shm_in.name, len(image_bytes))
+            except BrokenProcessPool:
+                # Broke while idle: this image never reached it, so it goes to a fresh pool
+                self._replace(executor)
+                executor = self.start()
+                future = executor.submit(_worker_preprocess, shm_in.name, len(image_bytes))
+        except BaseException:
+            self._release(shm_in)
+            raise
+
+        loop = asyncio.get_running_loop()
+        try:
+            out_name, out_size, report = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Caller gone (disconnect / timeout). A queued image is dropped; a running one
+            # keeps its slot until the process finishes, then its output block is unlinked.
+            future.add_done_callback(lambda f: _call_soon(loop, self._discard, f, shm_in))
+            raise
+        except BrokenProcessPool:
+            # A worker died under this image (or a neighbour's); fail it, keep the pool usable
+            self._release(shm_in)
+            self._replace(executor)
+            raise
+        except BaseException:
+            self._release(shm_in)
+            raise
+        self._release(shm_in)
+
+        shm_out = shared_memory.SharedMemory(name=out_name)
+        try:
+            return bytes(shm_out.buf[:out_size]), report
+        finally:
+            shm_out.close()
+            shm_out.unlink()
+
+    def _release(self, shm_in: shared_memory.SharedMemory) -> None:
+        self.in_flight -= 1
+        shm_in.close()
+        shm_in.unlink()
+
+    def _discard(self, future: Future, shm_in: shared_memory.SharedMemory) -> None:
+        """Done-callback for an abandoned run: free the slot and the orphaned output block."""
+        self._release(shm_in)
+        if future.cancelled() or future.exception() is not None:
+            return
+        out_name = future.result()[0]
+        try:
+            shm_out = shared_memory.SharedMemory(name=out_name)
+        except FileNotFoundError:
+            return
+        shm_out.close()
+        shm_out.unlink()
+
+
+def _call_soon(loop: asyncio.AbstractEventLoop, fn, *args) -> None:
+    # Executor callbacks run on its management thread; pool state belongs to the loop
+    try:
+        loop.call_soon_threadsafe(fn, *args)
+    except RuntimeError:
+        pass  # loop already closed (process exiting)
+
+
+preprocess_pool = PreprocessPool()
+
+
+def _collect() -> None:
+    _IN_FLIGHT.set(value=preprocess_pool.in_flight)
+    _CAPACITY.set(value=preprocess_pool.capacity)
+
+
+add_collector(_collect)
@@ -0,0 +1,152 @@
+# app/services/ocr/preprocess.py
+"""
+OpenCV image preprocessing for OCR uploads (screenshots, phone photos, scans).
+
+Only the preprocess pool processes import this module (see pool._worker_preprocess), so
+API workers never load OpenCV: importing cv2 costs ~50 ms and tens of MB of RSS per
+process, and nothing on the request path needs it.
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.services.ocr.cache import PREPROCESS_VERSION
+
+
+def _encode_png(gray: np.ndarray) -> bytes:
+    # Encode as PNG (best for OCR, lossless)
+    ok, out = cv2.imencode(".png", gray)
+    if not ok:
+        raise RuntimeError("Failed to encode processed image")
+    return out.tobytes()
+
+
+def _unsharp(gray: np.ndarray) -> np.ndarray:
+    blur = cv2.GaussianBlur(gray, (0, 0), sigmaX=1.0)
+    return cv2.addWeighted(gray, 1.5, blur, -0.5, 0)
+
+
+def measure_image_quality(gray: np.ndarray) -> dict:
+    """
+    Cheap NumPy quality metrics on a grayscale uint8 image:
+    - noise_sigma: robust (median-based) Immerkaer noise estimate; ~0 for clean renders
+    - contrast_spread: 98th - 2nd percentile of intensities
+    - blur_var: variance of the 4-neighbour Laplacian (low = blurry)
+    """
+    g = gray.astype(np.float32)
+
+    # Immerkaer kernel [[1,-2,1],[-2,4,-2],[1,-2,1]] as shifted slices (no extra OpenCV pass)
+    c = g[1:-1, 1:-1]
+    n, s, w, e = g[:-2, 1:-1], g[2:, 1:-1], g[1:-1, :-2], g[1:-1, 2:]
+    nw, ne, sw, se = g[:-2, :-2], g[:-2, 2:], g[2:, :-2], g[2:, 2:]
+    resp = (nw + ne + sw + se) - 2.0 * (n + s + w + e) + 4.0 * c
+    # Kernel gain is 6 (sqrt of sum of squares); 0.6745 maps median(|x|) to sigma
+    noise_sigma = float(np.median(np.abs(resp)) / (0.6745 * 6.0))
+
+    lo, hi = np.percentile(gray, (2, 98))
+    lap = (n + s + w + e) - 4.0 * c
+
+    return {
+        "noise_sigma": round(noise_sigma, 3),
+        "contrast_spread": float(hi - lo),
+        "blur_var": round(float(lap.var()), 3),
+    }
+
+
+def preprocess_for_ocr_full(image_bytes: bytes) -> bytes:
+    """
+    Original fixed pipeline (every stage on every image, at full resolution):
+    - grayscale
+    - CLAHE contrast
+    - light denoise
+    - light sharpen (unsharp mask)
+    Returns PNG bytes. Kept for OCR_PREPROCESS_MODE=full and for benchmarking.
+    """
+    arr = np.frombuffer(image_bytes, np.uint8)
+    img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Invalid image bytes")
+
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    gray = clahe.apply(gray)
+    gray = cv2.fastNlMeansDenoising(gray, h=10)
+    return _encode_png(_unsharp(gray))
+
+
+def preprocess_for_ocr_staged(image_bytes: bytes) -> tuple[bytes, dict]:
+    """
+    Resolution-aware adaptive pipeline:
+    1) decode straight to grayscale
+    2) downscale so the long side is at most OCR_TARGET_MAX_SIDE (INTER_AREA)
+    3) measure noise / contrast / blur on the downscaled image
+    4) run CLAHE, denoise and sharpen only when the metrics call for them
+    5) PNG encode
+
+    Returns (png_bytes, report) where report lists the stages that ran, the metrics and
+    per-stage timings in ms.
+    """
+    t0 = time.perf_counter()
+    timings: dict[str, float] = {}
+
+    def mark(stage: str):
+        nonlocal t0
+        now = time.perf_counter()
+        timings[stage] = round((now - t0) * 1000, 2)
+        t0 = now
+
+    arr = np.frombuffer(image_bytes, np.uint8)
+    gray = cv2.imdecode(arr, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ValueError("Invalid image bytes")
+    original_shape = gray.shape
+    mark("decode")
+
+    target = settings.OCR_TARGET_MAX_SIDE
+    long_side = max(gray.shape)
+    if target and long_side > target:
+        scale = target / long_side
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        mark("downscale")
+
+    metrics = measure_image_quality(gray)
+    mark("measure")
+
+    if metrics["contrast_spread"] < settings.OCR_MIN_CONTRAST_SPREAD:
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        gray = clahe.apply(gray)
+        mark("clahe")
+
+    if metrics["noise_sigma"] > settings.OCR_NOISE_SIGMA_THRESHOLD:
+        gray = cv2.fastNlMeansDenoising(gray, h=10)
+        mark("denoise")
+
+    if metrics["blur_var"] < settings.OCR_BLUR_VAR_THRESHOLD:
+        gray = _unsharp(gray)
+        mark("sharpen")
+
+    out = _encode_png(gray)
+    mark("encode")
+
+    report = {
+        "version": PREPROCESS_VERSION,
+        "stages": list(timings),
+        "timings_ms": timings,
+        "metrics": metrics,
+        "input_shape": list(original_shape),
+        "output_shape": list(gray.shape),
+    }
+    return out, report
+
+
+def preprocess_for_ocr(image_bytes: bytes) -> bytes:
+    """
+    Preprocessing to improve OCR on phone pics / scans / screenshots.
+    Returns PNG bytes (see preprocess_for_ocr_staged for the stage report).
+    """
+    if settings.OCR_PREPROCESS_MODE == "full":
+        return preprocess_for_ocr_full(image_bytes)
+    return preprocess_for_ocr_staged(image_bytes)[0]
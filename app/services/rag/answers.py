@@ -0,0 +1,225 @@
+# app/services/rag/answers.py
+"""
+Answer cache for docchat questions.
+
+Key = (document content SHA-256, normalized question, chat model + answer mode), so the
+same question about the same document, from anyone who uploaded it, skips the LLM.
+With ANSWER_CACHE_SEMANTIC (off by default) a question that misses exactly is embedded and
+matched against the document's cached questions by cosine similarity; paraphrases at or
+above ANSWER_CACHE_SIMILARITY ("what's the total due?" / "how much is due in total") reuse
+the answer too. The threshold is specific to the embedding model (0.92 is tuned for
+mistral-embed), and vectors from another model are never compared.
+
+Postgres (CachedAnswer) is shared by every worker; each worker keeps an LRU of
+per-document buckets (ANSWER_CACHE_DOCS), reloaded after DOC_STORE_CACHE_TTL_SECONDS so a
+clear on another worker is honoured within that window. Answers expire after
+ANSWER_CACHE_TTL_SECONDS; at most ANSWER_CACHE_PER_DOC are kept per document.
+"""
+
+import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.models.answer import CachedAnswer, add_answer, count_hit, delete_answers, get_answers
+from app.db.session import SessionLocal
+from app.services.rag.embeddings import get_embedding_backend
+
+logger = logging.getLogger(__name__)
+
+_FILLER_RE = re.compile(
+    r"^(?:(?:please|hey|hi|ok|okay|so)\s+)*"
+    r"(?:(?:can|could|would|will)\s+you\s+(?:please\s+)?(?:tell|show|give)\s+me\s+)?"
+    r"|\s+please$"
+)
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, punctuation and polite filler stripped, whitespace collapsed."""
+    q = " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+    return _FILLER_RE.sub("", q).strip()
+
+
+@dataclass
+class _Entry:
+    id: int
+    variant: str
+    question: str
+    answer: str
+    vector: np.ndarray | None
+    embedding_model: str | None
+    created: float  # epoch seconds
+
+
+@dataclass
+class CacheHit:
+    answer: str
+    match: str  # exact | semantic
+    similarity: float
+    question: str
+    age_seconds: float
+
+    def meta(self) -> dict:
+        return {
+            "match": self.match,
+            "similarity": round(self.similarity, 4),
+            "question": self.question,
+            "age_seconds": round(self.age_seconds, 1),
+        }
+
+
+def _epoch(dt: datetime) -> float:
+    # created_at is written with utcnow(); drivers without timezone support return it naive
+    return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def _to_entry(row: CachedAnswer) -> _Entry:
+    return _Entry(
+        id=row.id,
+        variant=row.variant,
+        question=row.question,
+        answer=row.answer,
+        vector=np.frombuffer(row.embedding, dtype=np.float32) if row.embedding else None,
+        embedding_model=row.embedding_model,
+        created=_epoch(row.created_at),
+    )
+
+
+class AnswerCache:
+    def __init__(self, max_docs: int, ttl_seconds: float, refresh_seconds: float):
+        self.max_docs = max_docs
+        self.ttl_seconds = ttl_seconds
+        self.refresh_seconds = refresh_seconds
+        self._buckets: OrderedDict[str, tuple[float, list[_Entry]]] = OrderedDict()
+        self.counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+    async def _bucket(self, sha: str) -> list[_Entry]:
+        item = self._buckets.get(sha)
+        if item is not None and time.monotonic() - item[0] <= self.refresh_seconds:
+            self._buckets.move_to_end(sha)
+            return item[1]
+
+        def _load():
+            with SessionLocal() as db:
+                return [_to_entry(r) for r in get_answers(db, sha, timedelta(seconds=self.ttl_seconds))]
+
+        entries = await run_in_threadpool(_load)
+        self._buckets[sha] = (time.monotonic(), entries)
+        self._buckets.move_to_end(sha)
+        while len(self._buckets) > self.max_docs:
+            self._buckets.popitem(last=False)
+        return entries
+
+    async def _embed(self, text: str) -> tuple[np.ndarray | None, str | None]:
+        backend = get_embedding_backend()
+        try:
+            return (await backend.embed([text]))[0], backend.name
+        except Exception as e:
+            logger.warning("Answer cache: question embedding failed, exact matches only: %s", e)
+            return None, None
+
+    async def lookup(self, sha: str, question: str, variant: str) -> tuple[CacheHit | None, np.ndarray | None]:
+        """
+        (hit, question_vector). On a miss the question's embedding (if one was computed) is
+        returned so put() does not embed it again.
+        """
+        norm = normalize_question(question)
+        now = time.time()
+        entries = [
+            e for e in await self._bucket(sha)
+            if e.variant == variant and now - e.created <= self.ttl_seconds
+        ]
+
+        match, kind, similarity = next((e for e in entries if e.question == norm), None), "exact", 1.0
+        vector = None
+        if match is None and settings.ANSWER_CACHE_SEMANTIC:
+            vector, model = await self._embed(norm)
+            candidates = [e for e in entries if e.vector is not None and e.embedding_model == model]
+            if vector is not None and candidates:
+                sims = np.stack([e.vector for e in candidates]) @ vector
+                best = int(np.argmax(sims))
+                if sims[best] >= settings.ANSWER_CACHE_SIMILARITY:
+                    match, kind, similarity = candidates[best], "semantic", float(sims[best])
+
+        if match is None:
+            self.counters["misses"] += 1
+            return None, vector
+        self.counters[f"{kind}_hits"] += 1
+
+        def _hit():
+            with SessionLocal() as db:
+                count_hit(db, match.id)
+
+        await run_in_threadpool(_hit)
+        return CacheHit(match.answer, kind, similarity, match.question, now - match.created), None
+
+    async def put(
+        self,
+        sha: str,
+        question: str,
+        variant: str,
+        answer: str,
+        vector: np.ndarray | None = None,
+    ) -> None:
+        if not answer.strip():
+            return
+        norm = normalize_question(question)
+        model = None
+        if settings.ANSWER_CACHE_SEMANTIC:
+            if vector is None:
+                vector, model = await self._embed(norm)
+            else:
+                model = get_embedding_backend().name
+
+        def _store():
+            with SessionLocal() as db:
+                add_answer(
+                    db,
+                    CachedAnswer(
+                        content_sha256=sha,
+                        variant=variant,
+                        question=norm,
+                        answer=answer,
+                        embedding=np.asarray(vector, dtype=np.float32).tobytes() if vector is not None else None,
+                        embedding_model=model if vector is not None else None,
+                    ),
+                    max_per_document=settings.ANSWER_CACHE_PER_DOC,
+                    max_age=timedelta(seconds=self.ttl_seconds),
+                )
+
+        await run_in_threadpool(_store)
+        self._buckets.pop(sha, None)  # reloaded (with the new row) on next lookup
+        self.counters["stores"] += 1
+
+    async def invalidate(self, sha: str) -> int:
+        """Drop every cached answer for a document's content."""
+        self._buckets.pop(sha, None)
+
+        def _delete():
+            with SessionLocal() as db:
+                return delete_answers(db, sha)
+
+        self.counters["invalidations"] += 1
+        return await run_in_threadpool(_delete)
+
+    def stats(self) -> dict:
+        lookups = self.counters["exact_hits"] + self.counters["semantic_hits"] + self.counters["misses"]
+        hits = lookups - self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "documents": len(self._buckets),
+        }
+
+
+answer_cache = AnswerCache(
+    max_docs=settings.ANSWER_CACHE_DOCS,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+    refresh_seconds=settings.DOC_STORE_CACHE_TTL_SECONDS,
+)
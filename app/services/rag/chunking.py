@@ -0,0 +1,131 @@
+# app/services/rag/chunking.py
+"""
+Markdown chunking for retrieval.
+
+OCR output is markdown, so headings are the natural chunk boundaries:
+- split into sections at #..###### headings (heading path kept as chunk context)
+- sections over the token budget are split on paragraphs, then lines
+- small neighbouring sections are merged so we don't embed dozens of 5-token chunks
+
+Token counts are a local approximation (words + punctuation), no API call.
+"""
+
+import re
+from dataclasses import dataclass
+
+from app.core.config import settings
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*\S)\s*$")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def count_tokens(text: str) -> int:
+    """Cheap local token estimate (close to BPE counts for English/OCR text)."""
+    return len(_TOKEN_RE.findall(text))
+
+
+@dataclass
+class Chunk:
+    ord: int
+    heading: str
+    text: str
+    tokens: int
+
+
+def _sections(markdown: str) -> list[tuple[str, str]]:
+    """Returns [(heading_path, body)] in document order."""
+    sections: list[tuple[str, str]] = []
+    path: list[tuple[int, str]] = []
+    body: list[str] = []
+
+    def flush():
+        text = "\n".join(body).strip()
+        if text:
+            sections.append((" > ".join(h for _, h in path), text))
+        body.clear()
+
+    for line in markdown.splitlines():
+        m = _HEADING_RE.match(line)
+        if m:
+            flush()
+            level = len(m.group(1))
+            path[:] = [(lvl, h) for lvl, h in path if lvl < level]
+            path.append((level, m.group(2)))
+        else:
+            body.append(line)
+    flush()
+    return sections
+
+
+def _pack(pieces: list[str], max_tokens: int, sep: str) -> list[str]:
+    """Greedily pack pieces into groups of at most max_tokens (a single oversized piece stands alone)."""
+    groups: list[str] = []
+    cur: list[str] = []
+    cur_tokens = 0
+    for piece in pieces:
+        n = count_tokens(piece)
+        if cur and cur_tokens + n > max_tokens:
+            groups.append(sep.join(cur))
+            cur, cur_tokens = [], 0
+        cur.append(piece)
+        cur_tokens += n
+    if cur:
+        groups.append(sep.join(cur))
+    return groups
+
+
+def _split_body(body: str, max_tokens: int) -> list[str]:
+    if count_tokens(body) <= max_tokens:
+        return [body]
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", body) if p.strip()]
+    pieces: list[str] = []
+    for para in paragraphs:
+        if count_tokens(para) <= max_tokens:
+            pieces.append(para)
+        else:
+            # Tables / long OCR blocks: fall back to line packing
+            pieces.extend(_pack(_lines(para, max_tokens), max_tokens, "\n"))
+    return _pack(pieces, max_tokens, "\n\n")
+
+
+def _lines(text: str, max_tokens: int) -> list[str]:
+    """Lines of text; run-on lines (e.g. a transcript with no line breaks) become sentence groups."""
+    out: list[str] = []
+    for line in text.splitlines():
+        if count_tokens(line) > max_tokens:
+            out.extend(_pack(_SENTENCE_END_RE.split(line), max_tokens, " "))
+        else:
+            out.append(line)
+    return out
+
+
+def split_markdown(
+    markdown: str,
+    max_tokens: int | None = None,
+    min_tokens: int | None = None,
+) -> list[Chunk]:
+    max_tokens = max_tokens or settings.RAG_CHUNK_TOKENS
+    min_tokens = settings.RAG_CHUNK_MIN_TOKENS if min_tokens is None else min_tokens
+
+    raw: list[tuple[str, str]] = []
+    for heading, body in _sections(markdown):
+        for part in _split_body(body, max_tokens):
+            raw.append((heading, part))
+
+    # Merge small neighbours (keeps the first heading as the chunk label)
+    merged: list[tuple[str, str]] = []
+    for heading, text in raw:
+        if merged:
+            prev_heading, prev_text = merged[-1]
+            prev_tokens = count_tokens(prev_text)
+            if prev_tokens < min_tokens and prev_tokens + count_tokens(text) <= max_tokens:
+                label = f"{heading}\n" if heading and heading != prev_heading else ""
+                merged[-1] = (prev_heading, f"{prev_text}\n\n{label}{text}")
+                continue
+        merged.append((heading, text))
+
+    return [
+        Chunk(ord=i, heading=heading, text=text, tokens=count_tokens(text))
+        for i, (heading, text) in enumerate(merged)
+    ]
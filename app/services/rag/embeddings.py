@@ -0,0 +1,99 @@
+# app/services/rag/embeddings.py
+"""
+Pluggable embedding backends.
+
+Every backend returns L2-normalised float32 vectors, shape (n, dim), so cosine similarity
+is a plain dot product.
+
+- MistralEmbedding: mistral-embed through the shared client, batched (RAG_EMBED_BATCH)
+- HashingEmbedding: deterministic local feature hashing (unigrams + bigrams); no network,
+  same output on every machine, used for offline runs and tests
+"""
+
+import hashlib
+import re
+from typing import Protocol
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.ocr.mistral import get_mistral_client
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _normalize_rows(mat: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (mat / norms).astype(np.float32, copy=False)
+
+
+class EmbeddingBackend(Protocol):
+    name: str
+    dim: int
+
+    async def embed(self, texts: list[str]) -> np.ndarray: ...
+
+
+class HashingEmbedding:
+    def __init__(self, dim: int | None = None):
+        self.dim = dim or settings.RAG_EMBEDDING_DIM
+        self.name = f"hashing-{self.dim}"
+
+    def _features(self, text: str) -> list[str]:
+        words = [w.lower() for w in _WORD_RE.findall(text)]
+        return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+    def embed_sync(self, texts: list[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feat in self._features(text):
+                h = int.from_bytes(hashlib.blake2b(feat.encode("utf-8"), digest_size=8).digest(), "little")
+                sign = 1.0 if (h >> 63) & 1 else -1.0
+                out[row, h % self.dim] += sign
+        # Sub-linear term frequency, then unit length
+        out = np.sign(out) * np.log1p(np.abs(out))
+        return _normalize_rows(out)
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        return self.embed_sync(texts)
+
+
+class MistralEmbedding:
+    def __init__(self, model: str | None = None, batch_size: int | None = None):
+        self.model = model or settings.MISTRAL_EMBED_MODEL
+        self.batch_size = batch_size or settings.RAG_EMBED_BATCH
+        self.name = self.model
+        self.dim = 1024
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        client = get_mistral_client()
+        rows: list[list[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            rows.extend(await client.embed(texts[start:start + self.batch_size], model=self.model))
+        mat = np.asarray(rows, dtype=np.float32)
+        self.dim = mat.shape[1]
+        return _normalize_rows(mat)
+
+
+_backend: EmbeddingBackend | None = None
+
+
+def get_embedding_backend() -> EmbeddingBackend:
+    global _backend
+    if _backend is None:
+        if settings.RAG_EMBEDDING_BACKEND == "hashing":
+            _backend = HashingEmbedding()
+        elif settings.RAG_EMBEDDING_BACKEND == "mistral":
+            _backend = MistralEmbedding()
+        else:
+            raise ValueError(f"Unknown RAG_EMBEDDING_BACKEND: {settings.RAG_EMBEDDING_BACKEND}")
+    return _backend
+
+
+def set_embedding_backend(backend: EmbeddingBackend | None) -> None:
+    """Swap the process-wide backend (offline runs / tests)."""
+    global _backend
+    _backend = backend
@@ -0,0 +1,239 @@
+# app/services/rag/lexical.py
+"""
+BM25 lexical index over document chunks.
+
+OCR'd invoices, prescriptions and claims are full of IDs, codes and amounts
+("INV-10023", "J3490", "$1,240.50") that dense embeddings blur together, so retrieval
+fuses this index with the vector index (see retrieval.py).
+
+One index per document, built once at upload and saved next to the vector index as a
+compact .npz (CSR-style posting lists):
+    term_bytes  uint8 [B]     sorted vocabulary, UTF-8, concatenated
+    term_offs   int32 [V+1]   term i is term_bytes[term_offs[i]:term_offs[i+1]]
+    offsets     int32 [V+1]   postings for term i are rows offsets[i]:offsets[i+1]
+    post_chunk  int32 [P]     chunk ord
+    post_tf     uint16 [P]    term frequency in that chunk
+    chunk_len   int32 [N]     tokens per chunk
+
+Queries only tokenize the question; the corpus is never re-tokenized. Terms are found by
+binary search over the byte-sorted vocabulary, so a loaded index holds no per-term Python
+strings, and one long token (a URL, a base64 run) does not widen every other slot as a
+fixed-width string array would.
+"""
+
+import math
+import os
+import re
+import tempfile
+from collections import Counter, OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from app.core.config import settings
+
+# Compound tokens keep separators between alphanumerics: INV-10023, 1,240.50, 8841/22
+_TOKEN_RE = re.compile(r"[0-9a-z]+(?:[-./,:][0-9a-z]+)*")
+_PART_RE = re.compile(r"[0-9a-z]+")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Longer tokens are URLs, hashes or base64 runs: nobody searches for them verbatim
+MAX_TOKEN_CHARS = 64
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased tokens; compound IDs are emitted whole and as their parts (each at most MAX_TOKEN_CHARS)."""
+    out: list[str] = []
+    for tok in _TOKEN_RE.findall(text.lower()):
+        if len(tok) <= MAX_TOKEN_CHARS:
+            out.append(tok)
+        parts = _PART_RE.findall(tok)
+        if len(parts) > 1:
+            out.extend(p for p in parts if len(p) <= MAX_TOKEN_CHARS)
+    return out
+
+
+class Bm25Index:
+    def __init__(
+        self,
+        term_bytes: np.ndarray,
+        term_offs: np.ndarray,
+        offsets: np.ndarray,
+        post_chunk: np.ndarray,
+        post_tf: np.ndarray,
+        chunk_len: np.ndarray,
+    ):
+        self.term_bytes = term_bytes
+        self.term_offs = term_offs
+        self.offsets = offsets
+        self.post_chunk = post_chunk
+        self.post_tf = post_tf
+        self.chunk_len = chunk_len
+        self.avg_len = float(chunk_len.mean()) if len(chunk_len) else 0.0
+
+    @staticmethod
+    def _pack_terms(terms: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        encoded = sorted(t.encode("utf-8") for t in terms)
+        offs = np.zeros(len(encoded) + 1, dtype=np.int32)
+        offs[1:] = np.cumsum([len(b) for b in encoded])
+        return np.frombuffer(b"".join(encoded), dtype=np.uint8).copy(), offs
+
+    def _term(self, i: int) -> bytes:
+        return self.term_bytes[self.term_offs[i]:self.term_offs[i + 1]].tobytes()
+
+    def _term_id(self, term: str) -> int | None:
+        key = term.encode("utf-8")
+        lo, hi = 0, len(self.term_offs) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.term_offs) - 1 and self._term(lo) == key:
+            return lo
+        return None
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.term_bytes, self.term_offs, self.offsets, self.post_chunk, self.post_tf, self.chunk_len)
+        return sum(a.nbytes for a in arrays)
+
+    @classmethod
+    def build(cls, texts: list[str]) -> "Bm25Index":
+        postings: dict[str, list[tuple[int, int]]] = {}
+        lengths = []
+        for ord_, text in enumerate(texts):
+            toks = tokenize(text)
+            lengths.append(len(toks))
+            for term, tf in Counter(toks).items():
+                postings.setdefault(term, []).append((ord_, tf))
+
+        # UTF-8 byte order (= code point order) so _term_id can binary-search the packed bytes
+        terms = sorted(postings, key=lambda t: t.encode("utf-8"))
+        term_bytes, term_offs = cls._pack_terms(terms)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int32)
+        chunks, tfs = [], []
+        for i, term in enumerate(terms):
+            plist = postings[term]
+            offsets[i + 1] = offsets[i] + len(plist)
+            chunks.extend(c for c, _ in plist)
+            tfs.extend(min(tf, 65535) for _, tf in plist)
+
+        return cls(
+            term_bytes=term_bytes,
+            term_offs=term_offs,
+            offsets=offsets,
+            post_chunk=np.array(chunks, dtype=np.int32),
+            post_tf=np.array(tfs, dtype=np.uint16),
+            chunk_len=np.array(lengths, dtype=np.int32),
+        )
+
+    def search(self, query: str, k: int, min_ratio: float = 0.0) -> list[tuple[int, float]]:
+        """
+        Returns [(chunk_ord, bm25_score)] best first.
+        min_ratio drops hits scoring below that fraction of the best hit (stop-word noise).
+        """
+        n = len(self.chunk_len)
+        if not n:
+            return []
+        scores = np.zeros(n, dtype=np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.chunk_len / max(self.avg_len, 1e-9))
+
+        for term in set(tokenize(query)):
+            tid = self._term_id(term)
+            if tid is None:
+                continue
+            lo, hi = self.offsets[tid], self.offsets[tid + 1]
+            df = hi - lo
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            chunks = self.post_chunk[lo:hi]
+            tf = self.post_tf[lo:hi].astype(np.float32)
+            scores[chunks] += idf * tf * (BM25_K1 + 1) / (tf + norm[chunks])
+
+        hits = np.flatnonzero(scores)
+        if not len(hits):
+            return []
+        if min_ratio:
+            hits = hits[scores[hits] >= min_ratio * scores[hits].max()]
+        top = hits[np.argsort(-scores[hits])[:k]]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-", suffix=".npz")
+        os.close(fd)
+        np.savez(
+            tmp,
+            term_bytes=self.term_bytes,
+            term_offs=self.term_offs,
+            offsets=self.offsets,
+            post_chunk=self.post_chunk,
+            post_tf=self.post_tf,
+            chunk_len=self.chunk_len,
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "Bm25Index":
+        with np.load(path) as data:
+            if "term_bytes" in data:
+                term_bytes, term_offs = data["term_bytes"], data["term_offs"]
+            else:
+                # Written before the packed vocabulary (str order == UTF-8 byte order, so rows line up)
+                term_bytes, term_offs = cls._pack_terms(data["terms"].tolist())
+            return cls(
+                term_bytes=term_bytes,
+                term_offs=term_offs,
+                offsets=data["offsets"],
+                post_chunk=data["post_chunk"],
+                post_tf=data["post_tf"],
+                chunk_len=data["chunk_len"],
+            )
+
+
+class LexicalIndex:
+    """Per-document BM25 indexes on disk, with a small in-process LRU of loaded ones."""
+
+    def __init__(self, root: str, max_loaded: int):
+        self.root = Path(root)
+        self.max_loaded = max_loaded
+        self._loaded: OrderedDict[str, Bm25Index] = OrderedDict()
+
+    def _path(self, doc_id: str) -> Path:
+        return self.root / f"{doc_id}.npz"
+
+    def add(self, doc_id: str, texts: list[str]) -> Bm25Index:
+        index = Bm25Index.build(texts)
+        index.save(self._path(doc_id))
+        self._remember(doc_id, index)
+        return index
+
+    def get(self, doc_id: str) -> Bm25Index | None:
+        index = self._loaded.get(doc_id)
+        if index is not None:
+            self._loaded.move_to_end(doc_id)
+            return index
+        try:
+            index = Bm25Index.load(self._path(doc_id))
+        except FileNotFoundError:
+            return None
+        self._remember(doc_id, index)
+        return index
+
+    def delete(self, doc_id: str) -> None:
+        self._loaded.pop(doc_id, None)
+        self._path(doc_id).unlink(missing_ok=True)
+
+    def _remember(self, doc_id: str, index: Bm25Index) -> None:
+        self._loaded[doc_id] = index
+        self._loaded.move_to_end(doc_id)
+        while len(self._loaded) > self.max_loaded:
+            self._loaded.popitem(last=False)
+
+
+lexical_index = LexicalIndex(
+    os.path.join(settings.RAG_INDEX_DIR, "lexical"),
+    max_loaded=settings.RAG_LEXICAL_CACHE_ITEMS,
+)
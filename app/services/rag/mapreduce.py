@@ -0,0 +1,220 @@
+# app/services/rag/mapreduce.py
+"""
+Hierarchical (map-reduce) answering for content larger than one prompt.
+
+    content -> split_markdown into ~MAPREDUCE_SECTION_TOKENS sections
+            -> map: one digest per section (dense notes: facts, figures, names, dates,
+               timestamps), at most MAPREDUCE_CONCURRENCY calls in flight
+            -> reduce: digests packed into MAPREDUCE_REDUCE_TOKENS groups; each group gives
+               a partial answer (concurrently), and the partial answers are combined into the
+               final answer. Content whose digests fit one group is answered in one step.
+
+Digests do not depend on the question, so they are cached by section content (same
+two-tier cache as OCR results: memory LRU + shared disk, with TTL). Follow-up questions and
+other users asking about the same document only pay for the reduce step.
+
+Used for questions that need the whole document ("summarize", "list all ...") where top-k
+retrieval would only see a few chunks, and for transcripts too large to send whole.
+Token counts are local estimates (chunking.count_tokens), no API call.
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+from dataclasses import dataclass
+
+from app.core.config import settings
+from app.services.ocr.cache import OcrCache
+from app.services.ocr.mistral import mistral_chat
+from app.services.rag.chunking import count_tokens, split_markdown
+from app.services.storage.local import LocalStore
+
+logger = logging.getLogger(__name__)
+
+MAP_PROMPT_VERSION = "1"
+
+_GLOBAL_QUESTION_RE = re.compile(
+    r"\b(?:summar\w*|overview|overall|outline|tl;?dr|gist|recap|main\s+(?:points?|ideas?|topics?|themes?)"
+    r"|key\s+(?:points?|takeaways?|findings?|themes?|topics?|facts?)"
+    # Enumerations only: "are all fees refundable?" / "what is paid every month?" are lookups
+    r"|(?:list|name|show|give|enumerate|extract)\s+(?:me\s+)?(?:of\s+)?(?:all|every|each)"
+    r"|all\s+(?:of\s+)?the\s+\w+s\s+(?:in|on|from|across|mentioned|listed|named|discussed|raised)"
+    r"|(?:each|every)\s+(?:section|chapter|page|speaker|part|topic|line\s+item)|throughout"
+    r"|entire|whole\s+(?:document|call|transcript|thing)|how\s+many\s+times|across\s+the)\b",
+    re.I,
+)
+
+MAP_PROMPT = (
+    "Condense this part of a longer {kind} into dense notes that later questions can be "
+    "answered from. Keep every fact, number, amount, name, date, identifier, decision, "
+    "commitment and notable quote; keep section headings and [timestamps] next to what they "
+    "label. Drop filler and repetition. Plain bullet points, no preamble."
+)
+
+_SYSTEM = {
+    "document": (
+        "You are a document intelligence assistant. "
+        "Answer using only the document notes. "
+        "If the answer is not in the notes, say you cannot find it."
+    ),
+    "transcript": (
+        "You are a voice intelligence assistant. "
+        "Answer using only the transcript notes, citing [timestamps] where the notes give them. "
+        "If the answer is not in the notes, say you cannot find it."
+    ),
+}
+
+map_cache = OcrCache(
+    max_items=settings.MAPREDUCE_CACHE_ITEMS,
+    max_bytes=settings.MAPREDUCE_CACHE_MEMORY_MB * 1024 * 1024,
+    ttl_seconds=settings.MAPREDUCE_CACHE_TTL_SECONDS,
+    disk=LocalStore(
+        settings.MAPREDUCE_CACHE_DIR,
+        max_bytes=settings.MAPREDUCE_CACHE_DISK_MB * 1024 * 1024,
+        ttl_seconds=settings.MAPREDUCE_CACHE_TTL_SECONDS,
+    ) if settings.MAPREDUCE_CACHE_DIR else None,
+    name="mapreduce",
+)
+
+
+@dataclass
+class MapReduceStats:
+    sections: int = 0
+    cached: int = 0
+    mapped: int = 0
+    partials: int = 0
+
+
+def is_global_question(question: str) -> bool:
+    """Questions that need the whole content rather than the few best-matching chunks."""
+    return bool(_GLOBAL_QUESTION_RE.search(question))
+
+
+def needs_map_reduce(content: str, budget_tokens: int | None = None) -> bool:
+    return count_tokens(content) > (budget_tokens or settings.MAPREDUCE_CONTEXT_TOKENS)
+
+
+def _section_key(kind: str, text: str) -> str:
+    raw = f"{MAP_PROMPT_VERSION}:{settings.MISTRAL_CHAT_MODEL}:{kind}:{text}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _sections(content: str) -> list[str]:
+    chunks = split_markdown(
+        content,
+        max_tokens=settings.MAPREDUCE_SECTION_TOKENS,
+        min_tokens=settings.MAPREDUCE_SECTION_TOKENS // 2,
+    )
+    return [f"[Section: {c.heading}]\n{c.text}" if c.heading else c.text for c in chunks]
+
+
+async def _map_section(kind: str, text: str, sem: asyncio.Semaphore, stats: MapReduceStats) -> str:
+    key = _section_key(kind, text)
+    cached = await map_cache.get(key)
+    if cached is not None:
+        stats.cached += 1
+        return cached["digest"]
+
+    async with sem:
+        digest = await mistral_chat(
+            messages=[
+                {"role": "system", "content": "You take precise, complete notes. Never invent details."},
+                {"role": "user", "content": f"{MAP_PROMPT.format(kind=kind)}\n\nPART:\n\n{text}"},
+            ],
+            temperature=0.0,
+            max_tokens=settings.MAPREDUCE_MAP_MAX_TOKENS,
+        )
+    digest = (digest or "").strip()
+    await map_cache.put(key, {"digest": digest})
+    stats.mapped += 1
+    return digest
+
+
+def _pack_notes(notes: list[str], budget_tokens: int) -> list[list[str]]:
+    groups: list[list[str]] = []
+    used = 0
+    for note in notes:
+        n = count_tokens(note)
+        if groups and used + n <= budget_tokens:
+            groups[-1].append(note)
+            used += n
+        else:
+            groups.append([note])
+            used = n
+    return groups
+
+
+def _notes_block(notes: list[str], first: int) -> str:
+    return "\n\n".join(f"--- PART {first + i} ---\n{note}" for i, note in enumerate(notes))
+
+
+async def map_reduce_messages(
+    content: str,
+    question: str,
+    kind: str = "document",
+) -> tuple[list[dict], MapReduceStats]:
+    """
+    Runs the map (and any intermediate reduce) steps and returns the messages for the final
+    answer, so callers can send them with mistral_chat or stream them with mistral_chat_stream.
+    kind: "document" | "transcript".
+    """
+    stats = MapReduceStats()
+    sections = _sections(content)
+    stats.sections = len(sections)
+    sem = asyncio.Semaphore(max(1, settings.MAPREDUCE_CONCURRENCY))
+
+    digests = await asyncio.gather(*(_map_section(kind, s, sem, stats) for s in sections))
+    notes = [d for d in digests if d]
+    system = _SYSTEM.get(kind, _SYSTEM["document"])
+
+    groups = _pack_notes(notes, settings.MAPREDUCE_REDUCE_TOKENS)
+    while len(groups) > 1:
+        # Too many notes for one prompt: partial answers per group, then reduce those
+        async def _partial(group: list[str], first: int) -> str:
+            async with sem:
+                return await mistral_chat(
+                    messages=[
+                        {"role": "system", "content": system},
+                        {
+                            "role": "user",
+                            "content": (
+                                f"These are notes on parts {first}-{first + len(group) - 1} of a longer {kind}. "
+                                "Answer the question as far as these parts allow, keeping every relevant "
+                                "detail (another step will merge your answer with answers from other "
+                                "parts). If these parts have nothing relevant, reply exactly: NOTHING RELEVANT."
+                                f"\n\nNOTES:\n\n{_notes_block(group, first)}\n\nQUESTION:\n{question}"
+                            ),
+                        },
+                    ],
+                    temperature=0.0,
+                    max_tokens=settings.MAPREDUCE_MAP_MAX_TOKENS,
+                )
+
+        starts, at = [], 1
+        for g in groups:
+            starts.append(at)
+            at += len(g)
+        partials = await asyncio.gather(*(_partial(g, s) for g, s in zip(groups, starts)))
+        stats.partials += len(partials)
+        kept = [p.strip() for p in partials if p and "NOTHING RELEVANT" not in p.upper()]
+        packed = _pack_notes(kept or ["(No part of the content is relevant to the question.)"], settings.MAPREDUCE_REDUCE_TOKENS)
+        # Budget too small to make progress: send what we have in one prompt
+        groups = packed if len(packed) < len(groups) else [[p for g in packed for p in g]]
+
+    logger.info(
+        "Map-reduce %s: %d sections (%d cached, %d mapped), %d partial answers",
+        kind, stats.sections, stats.cached, stats.mapped, stats.partials,
+    )
+    body = _notes_block(groups[0] if groups else [], 1)
+    header = "PARTIAL ANSWERS" if stats.partials else "NOTES"
+    return [
+        {"role": "system", "content": system},
+        {
+            "role": "user",
+            "content": (
+                f"The {kind} was too long to send whole; below are {header.lower()} covering all of it, "
+                f"in order.\n\n{header}:\n\n{body}\n\nQUESTION:\n{question}"
+            ),
+        },
+    ], stats
@@ -0,0 +1,467 @@
+# app/services/rag/retrieval.py
+"""
+Retrieval for docchat.
+
+Ingest (once per document, at upload):
+    markdown -> split_markdown -> batch embed -> DocumentChunk rows (text) + VectorIndex (vectors)
+                                             -> BM25 posting lists (lexical.py)
+
+Query:
+    embed question -> VectorIndex top-k  \
+                                          reciprocal rank fusion -> context in document order
+    BM25 over the question's terms       /
+
+Small documents (<= RAG_FULL_DOC_MAX_TOKENS) skip all of this and are sent whole, so the
+prompt stays bounded either way.
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.models.chunk import DocumentChunk, delete_chunks, get_chunks, replace_chunks
+from app.db.session import SessionLocal
+from app.services.rag.chunking import count_tokens, split_markdown
+from app.services.rag.embeddings import get_embedding_backend
+from app.services.rag.lexical import lexical_index
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------
+# Vector index (NumPy + mmap)
+# ----------------------------
+class VectorIndex:
+    """
+    Append-only embedding index in contiguous NumPy arrays, persisted as memory-mapped files.
+
+    Layout under root/:
+        meta.json           dim, dtype, model, row count, generation, doc row ranges, dead rows
+        vectors-<gen>.bin   float32 (or int8) rows, row-major
+        scales-<gen>.bin    float32 per-row scale (int8 only)
+        lock                fcntl lock for writers
+
+    - Every gunicorn worker maps the same files read-only, so the page cache holds one copy.
+    - A document's chunks are appended as one contiguous row range; deleting the document
+      tombstones that range. compact() rewrites live rows into a new generation once the
+      dead fraction passes RAG_INDEX_COMPACT_RATIO.
+    - Readers notice writes from other workers by the meta.json inode/mtime and remap.
+    """
+
+    def __init__(self, root: str, dtype: str = "float32"):
+        if dtype not in ("float32", "int8"):
+            raise ValueError("RAG_INDEX_DTYPE must be float32 or int8")
+        self.root = Path(root)
+        self.dtype = dtype
+        self._meta: dict | None = None
+        self._meta_stamp: tuple[int, int] | None = None
+        self._vectors: np.ndarray | None = None
+        self._scales: np.ndarray | None = None
+
+    # ---- files / locking ----
+    @property
+    def _meta_path(self) -> Path:
+        return self.root / "meta.json"
+
+    def _data_paths(self, gen: int) -> tuple[Path, Path]:
+        return self.root / f"vectors-{gen}.bin", self.root / f"scales-{gen}.bin"
+
+    @contextmanager
+    def _locked(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / "lock", "a+") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _write_meta(self, meta: dict) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".meta-")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(meta, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self._meta_path)
+
+    def _read_meta(self) -> dict | None:
+        try:
+            return json.loads(self._meta_path.read_text())
+        except FileNotFoundError:
+            return None
+
+    def _new_meta(self, dim: int, model: str) -> dict:
+        return {
+            "dim": dim,
+            "dtype": self.dtype,
+            "model": model,
+            "count": 0,
+            "generation": 0,
+            "docs": {},   # doc_id -> [start_row, end_row)
+            "dead": 0,    # tombstoned rows awaiting compaction
+        }
+
+    # ---- reader side ----
+    def _refresh(self) -> dict | None:
+        """Reload meta + remap vectors if another process changed them."""
+        try:
+            st = self._meta_path.stat()
+        except FileNotFoundError:
+            self._meta = self._vectors = self._scales = None
+            self._meta_stamp = None
+            return None
+        # meta.json is always replaced atomically, so a new inode means a new version
+        stamp = (st.st_ino, st.st_mtime_ns)
+        if stamp == self._meta_stamp and self._meta is not None:
+            return self._meta
+
+        meta = self._read_meta()
+        if meta is None:
+            return None
+        vec_path, scale_path = self._data_paths(meta["generation"])
+        count, dim = meta["count"], meta["dim"]
+        if count:
+            self._vectors = np.memmap(
+                vec_path, dtype=np.dtype(meta["dtype"]), mode="r", shape=(count, dim)
+            )
+            self._scales = (
+                np.memmap(scale_path, dtype=np.float32, mode="r", shape=(count,))
+                if meta["dtype"] == "int8" else None
+            )
+        else:
+            self._vectors = self._scales = None
+        self._meta, self._meta_stamp = meta, stamp
+        return meta
+
+    def has_doc(self, doc_id: str, model: str) -> bool:
+        meta = self._refresh()
+        return bool(meta) and meta["model"] == model and doc_id in meta["docs"]
+
+    def _score_rows(self, start: int, end: int, queries: np.ndarray) -> np.ndarray:
+        block = self._vectors[start:end]
+        if self._scales is not None:
+            return (queries @ block.T.astype(np.float32)) * self._scales[start:end]
+        return queries @ block.T
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        doc_id: str | None = None,
+        batch_rows: int = 65536,
+    ) -> list[list[tuple[str, int, float]]]:
+        """
+        Batched top-k by dot product (vectors are unit length, so cosine).
+        queries: (q, dim) float32. Returns per query [(doc_id, chunk_ord, score)] best first.
+        doc_id restricts the search to that document's row range.
+        """
+        meta = self._refresh()
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        empty = [[] for _ in range(len(queries))]
+        if not meta or self._vectors is None:
+            return empty
+
+        if doc_id is not None:
+            if doc_id not in meta["docs"]:
+                return empty
+            owners = [(*meta["docs"][doc_id], doc_id)]
+        else:
+            owners = sorted((s, e, d) for d, (s, e) in meta["docs"].items())
+        if not owners:
+            return empty
+
+        # Only live rows are scanned: scan [first, last) in blocks, mask tombstoned gaps
+        first, last = owners[0][0], max(e for _, e, _ in owners)
+        alive = np.zeros(last - first, dtype=bool)
+        for s, e, _ in owners:
+            alive[s - first:e - first] = True
+
+        k = max(1, k)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for lo in range(first, last, batch_rows):
+            hi = min(last, lo + batch_rows)
+            scores = self._score_rows(lo, hi, queries).astype(np.float32, copy=False)
+            scores = np.where(alive[lo - first:hi - first], scores, -np.inf)
+            rows = np.broadcast_to(np.arange(lo, hi), scores.shape)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, rows], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        starts = np.array([s for s, _, _ in owners], dtype=np.int64)
+        results = []
+        for qi in range(len(queries)):
+            hits = []
+            for j in np.argsort(-best_scores[qi]):
+                score = float(best_scores[qi, j])
+                if score == -np.inf:
+                    continue
+                row = int(best_rows[qi, j])
+                o_start, _, o_doc = owners[int(np.searchsorted(starts, row, side="right")) - 1]
+                hits.append((o_doc, row - o_start, score))
+            results.append(hits)
+        return results
+
+    # ---- writer side ----
+    def add(self, doc_id: str, vectors: np.ndarray, model: str) -> None:
+        """Append a document's chunk vectors (tombstoning any previous copy of doc_id)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._locked():
+            meta = self._read_meta()
+            if (
+                meta is None
+                or meta["dim"] != vectors.shape[1]
+                or meta["model"] != model
+                or meta.get("dtype") != self.dtype
+            ):
+                # First write, the embedding backend changed, or RAG_INDEX_DTYPE did (rows of
+                # the old dtype cannot share a file with new ones): start a fresh index
+                self._reset_files(meta)
+                meta = self._new_meta(vectors.shape[1], model)
+
+            if doc_id in meta["docs"]:
+                old_start, old_end = meta["docs"].pop(doc_id)
+                meta["dead"] += old_end - old_start
+
+            vec_path, scale_path = self._data_paths(meta["generation"])
+            if self.dtype == "int8":
+                scales = np.abs(vectors).max(axis=1) / 127.0
+                scales[scales == 0] = 1.0
+                data = np.round(vectors / scales[:, None]).astype(np.int8)
+                # Scale i must stay aligned with row i, so it gets the same torn-tail handling
+                _append(scale_path, meta["count"] * 4, scales.astype(np.float32).tobytes())
+            else:
+                data = vectors
+            _append(vec_path, meta["count"] * meta["dim"] * data.itemsize, data.tobytes())
+
+            start = meta["count"]
+            meta["count"] += len(vectors)
+            meta["docs"][doc_id] = [start, meta["count"]]
+            self._write_meta(meta)
+
+    def delete(self, doc_id: str) -> bool:
+        """Tombstone a document's rows (space is reclaimed by compact())."""
+        with self._locked():
+            meta = self._read_meta()
+            if not meta or doc_id not in meta["docs"]:
+                return False
+            start, end = meta["docs"].pop(doc_id)
+            meta["dead"] += end - start
+            self._write_meta(meta)
+            return True
+
+    def compact(self, min_dead_ratio: float | None = None) -> bool:
+        """Rewrite live rows into a new generation if enough rows are dead. Returns True if compacted."""
+        min_dead_ratio = settings.RAG_INDEX_COMPACT_RATIO if min_dead_ratio is None else min_dead_ratio
+        with self._locked():
+            meta = self._read_meta()
+            if not meta or not meta["count"] or meta["dead"] / meta["count"] < min_dead_ratio:
+                return False
+
+            old_gen = meta["generation"]
+            old_vec, old_scale = self._data_paths(old_gen)
+            dtype = np.dtype(meta["dtype"])
+            vectors = np.memmap(old_vec, dtype=dtype, mode="r", shape=(meta["count"], meta["dim"]))
+            scales = (
+                np.memmap(old_scale, dtype=np.float32, mode="r", shape=(meta["count"],))
+                if meta["dtype"] == "int8" else None
+            )
+
+            new_gen = old_gen + 1
+            new_vec, new_scale = self._data_paths(new_gen)
+            new_docs, row = {}, 0
+            with open(new_vec, "wb") as vf, open(new_scale, "wb") if scales is not None else _null() as sf:
+                for d, (s, e) in sorted(meta["docs"].items(), key=lambda kv: kv[1][0]):
+                    vf.write(np.ascontiguousarray(vectors[s:e]).tobytes())
+                    if scales is not None:
+                        sf.write(np.ascontiguousarray(scales[s:e]).tobytes())
+                    new_docs[d] = [row, row + (e - s)]
+                    row += e - s
+                for fh in (vf, sf) if sf is not None else (vf,):
+                    fh.flush()
+                    os.fsync(fh.fileno())
+            del vectors, scales
+
+            meta.update(generation=new_gen, count=row, docs=new_docs, dead=0)
+            self._write_meta(meta)
+            # Readers that still map the old generation keep their inode alive until they remap
+            old_vec.unlink(missing_ok=True)
+            old_scale.unlink(missing_ok=True)
+            return True
+
+    def _reset_files(self, meta: dict | None) -> None:
+        if meta is not None:
+            for path in self._data_paths(meta["generation"]):
+                path.unlink(missing_ok=True)
+        self._meta_path.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        meta = self._refresh() or {}
+        return {
+            "rows": meta.get("count", 0),
+            "dead_rows": meta.get("dead", 0),
+            "documents": len(meta.get("docs", {})),
+            "generation": meta.get("generation", 0),
+            "dtype": meta.get("dtype", self.dtype),
+        }
+
+
+@contextmanager
+def _null():
+    yield None
+
+
+def _append(path: Path, committed: int, data: bytes) -> None:
+    """Append after the committed prefix, dropping any torn tail from a crashed writer."""
+    with open(path, "ab") as fh:
+        fh.truncate(committed)
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+
+
+vector_index = VectorIndex(settings.RAG_INDEX_DIR, dtype=settings.RAG_INDEX_DTYPE)
+
+
+@dataclass
+class RetrievedChunk:
+    ord: int
+    heading: str
+    text: str
+    score: float
+
+
+def needs_retrieval(markdown: str) -> bool:
+    return count_tokens(markdown) > settings.RAG_FULL_DOC_MAX_TOKENS
+
+
+async def ingest_document(doc_id: str, markdown: str) -> int:
+    """Chunk + embed + store (text in Postgres, vectors in the mmap index). Returns chunk count."""
+    chunks = split_markdown(markdown)
+    if not chunks:
+        return 0
+
+    backend = get_embedding_backend()
+    vectors = await backend.embed([c.text for c in chunks])
+
+    rows = [
+        DocumentChunk(doc_id=doc_id, ord=c.ord, heading=c.heading, text=c.text, tokens=c.tokens)
+        for c in chunks
+    ]
+
+    def _write():
+        with SessionLocal() as db:
+            replace_chunks(db, doc_id, rows)
+        vector_index.add(doc_id, vectors, backend.name)
+        lexical_index.add(doc_id, [c.text for c in chunks])
+
+    await run_in_threadpool(_write)
+    return len(rows)
+
+
+async def _load_chunks(doc_id: str, ords: list[int] | None = None) -> list[DocumentChunk]:
+    def _read():
+        with SessionLocal() as db:
+            rows = get_chunks(db, doc_id, ords)
+            db.expunge_all()
+            return rows
+
+    return await run_in_threadpool(_read)
+
+
+async def retrieve(
+    doc_id: str,
+    question: str,
+    k: int | None = None,
+    markdown: str | None = None,
+) -> list[RetrievedChunk]:
+    """
+    Top-k chunks for question. If the document is not in the index (never ingested, or
+    embedded by a different backend) and markdown is given, it is ingested first.
+    """
+    k = k or settings.RAG_TOP_K
+    backend = get_embedding_backend()
+
+    if not vector_index.has_doc(doc_id, backend.name):
+        if not markdown:
+            return []
+        await ingest_document(doc_id, markdown)
+
+    # Over-fetch from each retriever, then fuse
+    depth = k * 3 if settings.RAG_HYBRID else k
+    q = await backend.embed([question])
+    vector_hits = [(ord_, score) for _, ord_, score in vector_index.search(q, depth, doc_id=doc_id)[0]]
+
+    lexical_hits: list[tuple[int, float]] = []
+    if settings.RAG_HYBRID:
+        bm25 = lexical_index.get(doc_id)
+        if bm25 is None:
+            # Ingested before the lexical index existed: build it once from stored chunks
+            stored = await _load_chunks(doc_id)
+            bm25 = await run_in_threadpool(lexical_index.add, doc_id, [r.text for r in stored])
+        lexical_hits = bm25.search(question, depth, min_ratio=settings.RAG_BM25_MIN_RATIO)
+
+    scores = reciprocal_rank_fusion([vector_hits, lexical_hits])
+    top = sorted(scores, key=lambda o: -scores[o])[:k]
+    if not top:
+        return []
+
+    rows = await _load_chunks(doc_id, top)
+    return [
+        RetrievedChunk(ord=r.ord, heading=r.heading, text=r.text, score=scores[r.ord])
+        for r in sorted(rows, key=lambda r: -scores[r.ord])
+    ]
+
+
+def reciprocal_rank_fusion(rankings: list[list[tuple[int, float]]], k: int | None = None) -> dict[int, float]:
+    """RRF: score(d) = sum over rankings of 1 / (k + rank). Raw scores are ignored (different scales)."""
+    k = settings.RAG_RRF_K if k is None else k
+    fused: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (ord_, _) in enumerate(ranking, start=1):
+            fused[ord_] = fused.get(ord_, 0.0) + 1.0 / (k + rank)
+    return fused
+
+
+async def delete_document_index(doc_id: str) -> int:
+    """Drop a document's chunks and BM25 index, and tombstone its vectors."""
+    def _delete():
+        vector_index.delete(doc_id)
+        lexical_index.delete(doc_id)
+        with SessionLocal() as db:
+            return delete_chunks(db, doc_id)
+
+    return await run_in_threadpool(_delete)
+
+
+async def index_maintenance_loop(interval_seconds: float | None = None) -> None:
+    """Background task (lifespan): periodically compact the vector index."""
+    interval = interval_seconds or settings.RAG_INDEX_COMPACT_INTERVAL_SECONDS
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await run_in_threadpool(vector_index.compact):
+                logger.info("Vector index compacted: %s", vector_index.stats())
+        except Exception:
+            logger.exception("Vector index compaction failed")
+
+
+def build_context(chunks: list[RetrievedChunk]) -> str:
+    """Retrieved chunks in document order, each labelled with its heading path."""
+    parts = []
+    for c in sorted(chunks, key=lambda c: c.ord):
+        label = f"[Section: {c.heading}]\n" if c.heading else ""
+        parts.append(f"{label}{c.text}")
+    return "\n\n---\n\n".join(parts)
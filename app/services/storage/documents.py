@@ -0,0 +1,120 @@
+# app/services/storage/documents.py
+"""
+Document store: OCR markdown by doc_id and voice transcripts by audio_id.
+
+Postgres (StoredDocument) is the source of truth so every worker can answer questions about
+a document uploaded on another worker. A small in-process LRU keeps recently used content
+hot so a conversation does not re-read multi-MB markdown on every turn; entries expire after
+DOC_STORE_CACHE_TTL_SECONDS so a clear on another worker is honoured within that window.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.models.document import StoredDocument, delete_document, get_document, save_document
+from app.db.session import SessionLocal
+
+
+@dataclass(frozen=True)
+class StoredContent:
+    id: str
+    kind: str
+    content: str
+    content_sha256: str
+    pages: int = 0
+    filename: str | None = None
+
+
+def _to_content(row: StoredDocument) -> StoredContent:
+    return StoredContent(
+        id=row.id,
+        kind=row.kind,
+        content=row.content,
+        content_sha256=row.content_sha256,
+        pages=row.pages,
+        filename=row.filename,
+    )
+
+
+class DocumentStore:
+    def __init__(self, max_items: int, ttl_seconds: float):
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._hot: OrderedDict[str, tuple[float, StoredContent]] = OrderedDict()
+
+    def _remember(self, item: StoredContent) -> None:
+        self._hot[item.id] = (time.monotonic(), item)
+        self._hot.move_to_end(item.id)
+        while len(self._hot) > self.max_items:
+            self._hot.popitem(last=False)
+
+    async def save(
+        self,
+        doc_id: str,
+        kind: str,
+        content: str,
+        pages: int = 0,
+        filename: str | None = None,
+    ) -> StoredContent:
+        item = StoredContent(
+            id=doc_id,
+            kind=kind,
+            content=content,
+            content_sha256=hashlib.sha256(content.encode("utf-8")).hexdigest(),
+            pages=pages,
+            filename=filename,
+        )
+
+        def _save():
+            with SessionLocal() as db:
+                save_document(db, StoredDocument(
+                    id=item.id,
+                    kind=item.kind,
+                    filename=item.filename,
+                    pages=item.pages,
+                    content=item.content,
+                    content_sha256=item.content_sha256,
+                ))
+
+        await run_in_threadpool(_save)
+        self._remember(item)
+        return item
+
+    async def load(self, doc_id: str, kind: str) -> StoredContent | None:
+        hot = self._hot.get(doc_id)
+        if hot is not None:
+            stored_at, item = hot
+            if time.monotonic() - stored_at <= self.ttl_seconds and item.kind == kind:
+                self._hot.move_to_end(doc_id)
+                return item
+            self._hot.pop(doc_id, None)
+
+        def _load():
+            with SessionLocal() as db:
+                row = get_document(db, doc_id, kind)
+                return _to_content(row) if row is not None else None
+
+        item = await run_in_threadpool(_load)
+        if item is not None:
+            self._remember(item)
+        return item
+
+    async def delete(self, doc_id: str) -> bool:
+        self._hot.pop(doc_id, None)
+
+        def _delete():
+            with SessionLocal() as db:
+                return delete_document(db, doc_id)
+
+        return await run_in_threadpool(_delete)
+
+
+document_store = DocumentStore(
+    max_items=settings.DOC_STORE_CACHE_ITEMS,
+    ttl_seconds=settings.DOC_STORE_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,109 @@
+# app/services/storage/local.py
+"""
+Local disk key/value store.
+
+Files are sharded by the first two characters of the key (keys are expected to be hex
+digests). Writes are atomic (temp file + os.replace) so several gunicorn workers can share
+one directory safely.
+
+- TTL: entries older than ttl_seconds (by mtime) are treated as missing and removed
+- Size eviction: when the store grows past max_bytes, least recently used entries
+  (reads refresh mtime) are deleted until it is back under ~90% of the cap
+"""
+
+import os
+import tempfile
+import time
+from pathlib import Path
+
+
+class LocalStore:
+    def __init__(self, root: str, max_bytes: int, ttl_seconds: float | None = None):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._approx_bytes: int | None = None
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def _expired(self, mtime: float) -> bool:
+        return bool(self.ttl_seconds) and (time.time() - mtime) > self.ttl_seconds
+
+    def get(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            st = path.stat()
+            if self._expired(st.st_mtime):
+                path.unlink(missing_ok=True)
+                return None
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        # Refresh mtime so size eviction is LRU rather than FIFO
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+        if self._approx_bytes is None:
+            self._approx_bytes = self.total_bytes()
+        else:
+            self._approx_bytes += len(data)
+        if self._approx_bytes > self.max_bytes:
+            self.evict()
+
+    def delete(self, key: str) -> bool:
+        try:
+            self._path(key).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        entries = []
+        if not self.root.exists():
+            return entries
+        for shard in self.root.iterdir():
+            if not shard.is_dir():
+                continue
+            for path in shard.iterdir():
+                if path.name.startswith(".tmp-"):
+                    continue
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def total_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> int:
+        """Drop expired entries, then oldest entries until under 90% of max_bytes. Returns count removed."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for mtime, size, path in entries:
+            if not self._expired(mtime) and total <= target:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        self._approx_bytes = total
+        return removed
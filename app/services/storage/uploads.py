@@ -0,0 +1,91 @@
+# app/services/storage/uploads.py
+"""
+Streaming, size-capped upload ingestion.
+
+Starlette already spools multipart file parts to a SpooledTemporaryFile (memory up to 1 MB,
+then disk). Instead of `await file.read()` pulling the whole upload into memory, we walk
+that file in fixed chunks - hashing and counting as we go, failing fast past the size cap -
+and keep it as the single copy of the upload.
+
+Outbound OCR bodies are then produced by streaming base64 from the file
+(see base64_chunks), so the encoded document is never held in memory as one string.
+"""
+
+import base64
+import hashlib
+import time
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from typing import BinaryIO
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.core.metrics import observe_stage, stage
+
+READ_CHUNK = 1024 * 1024
+# Multiple of 3 so every chunk base64-encodes without padding (except the last)
+B64_CHUNK = 3 * 256 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload exceeds the configured maximum size."""
+
+
+@dataclass
+class SpooledUpload:
+    file: BinaryIO
+    size: int
+    sha256: str
+    filename: str
+    content_type: str | None
+
+    async def read_all(self) -> bytes:
+        """Whole upload as bytes (only for inputs that must be decoded in memory, e.g. images)."""
+        def _read():
+            self.file.seek(0)
+            return self.file.read()
+
+        return await run_in_threadpool(_read)
+
+    def base64_length(self) -> int:
+        return 4 * ((self.size + 2) // 3)
+
+    async def base64_chunks(self) -> AsyncIterator[bytes]:
+        """Base64 of the upload, produced chunk by chunk from the spooled file."""
+        await run_in_threadpool(self.file.seek, 0)
+        encoding = 0.0  # encode time only; the chunks are interleaved with the upload itself
+        while True:
+            chunk = await run_in_threadpool(self.file.read, B64_CHUNK)
+            if not chunk:
+                break
+            start = time.perf_counter()
+            encoded = base64.b64encode(chunk)
+            encoding += time.perf_counter() - start
+            yield encoded
+        observe_stage("base64", encoding)
+
+
+async def spool_upload(file: UploadFile, max_bytes: int) -> SpooledUpload:
+    """Hash + size-check an UploadFile without loading it into memory."""
+    digest = hashlib.sha256()
+    size = 0
+    with stage("spool_upload"):
+        await file.seek(0)
+        while True:
+            chunk = await file.read(READ_CHUNK)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"File is larger than the {max_bytes // (1024 * 1024)} MB limit.")
+            digest.update(chunk)
+        await file.seek(0)
+
+    return SpooledUpload(
+        file=file.file,
+        size=size,
+        sha256=digest.hexdigest(),
+        filename=file.filename or "upload",
+        content_type=file.content_type,
+    )
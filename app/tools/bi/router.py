@@ -3,6 +3,8 @@
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse
 
+from app.core.metrics import stage
+
 from .service import get_bi_reports, get_categories
 
 router = APIRouter()
@@ -16,14 +18,16 @@ async def bi_portfolio(request: Request):
     # If your Document Intelligence uses request.state.user, keep it consistent:
     user = getattr(request.state, "user", None)
 
-    return request.app.state.templates.TemplateResponse(
-        "bi_portfolio.html",  # you said it lives in app/templates/bi_portfolio.html
-        {
-            "request": request,
-            "title": "Business Intelligence",
-            "active_page": "bi",   # your base.html uses this for active nav highlighting
-            "user": user,
-            "reports": reports,
-            "categories": categories,
-        },
-    )
+    with stage("template_render"):
+        response = request.app.state.templates.TemplateResponse(
+            "bi_portfolio.html",  # you said it lives in app/templates/bi_portfolio.html
+            {
+                "request": request,
+                "title": "Business Intelligence",
+                "active_page": "bi",   # your base.html uses this for active nav highlighting
+                "user": user,
+                "reports": reports,
+                "categories": categories,
+            },
+        )
+    return response
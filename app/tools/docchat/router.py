@@ -1,13 +1,39 @@
 # app/tools/docchat/router.py
 
+import asyncio
+import logging
 import uuid
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
 from typing import Optional
 
-from fastapi import APIRouter, Body, File, HTTPException, Request, UploadFile
-from fastapi.responses import HTMLResponse, JSONResponse
+import numpy as np
+
+from fastapi import APIRouter, Body, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 
-from app.tools.docchat.service import mistral_chat, mistral_ocr_to_markdown
+from app.core.config import settings
+from app.core.metrics import stage
+from app.core.sse import sse_event, sse_response
+from app.services.ocr.admission import MistralUnavailable
+from app.services.ocr.mistral import mistral_chat, mistral_chat_stream
+from app.services.jobs.queue import JobContext, job_queue
+from app.services.ocr.pool import PreprocessPoolSaturated
+from app.services.rag.answers import CacheHit, answer_cache
+from app.services.rag.mapreduce import is_global_question, map_reduce_messages
+from app.services.rag.retrieval import (
+    build_context,
+    delete_document_index,
+    ingest_document,
+    needs_retrieval,
+    retrieve,
+)
+from app.services.storage.documents import StoredContent, document_store
+from app.services.storage.uploads import SpooledUpload, UploadTooLarge, spool_upload
+from app.tools.docchat.service import mistral_ocr_to_markdown, mistral_ocr_upload
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -38,6 +64,21 @@ def _is_allowed_upload(file: UploadFile) -> bool:
     return False
 
 
+async def _index_document(doc_id: str, markdown: str) -> None:
+    """
+    Chunk + embed large documents once at upload. Failures are logged, not raised:
+    retrieval re-ingests lazily on the first question.
+    """
+    if not needs_retrieval(markdown):
+        return
+    try:
+        with stage("index"):
+            n = await ingest_document(doc_id, markdown)
+        logger.info("Indexed doc %s: %d chunks", doc_id, n)
+    except Exception:
+        logger.exception("Indexing failed for doc %s", doc_id)
+
+
 @router.get("/tools/docchat", response_class=HTMLResponse)
 async def doc_intelligence_page(request: Request):
     """
@@ -46,49 +87,150 @@ async def doc_intelligence_page(request: Request):
     """
     user = getattr(request.state, "user", None)
 
-    return templates.TemplateResponse(
-        "doc_intelligence.html",
-        {
-            "request": request,
-            "user": user,
-            "active_page": "docchat",
-            "page_title": "Document Intelligence",
-        },
+    with stage("template_render"):
+        response = templates.TemplateResponse(
+            "doc_intelligence.html",
+            {
+                "request": request,
+                "user": user,
+                "active_page": "docchat",
+                "page_title": "Document Intelligence",
+            },
+        )
+    return response
+
+
+async def _checked_upload(file: UploadFile) -> SpooledUpload:
+    if not _is_allowed_upload(file):
+        raise HTTPException(status_code=400, detail="Only PDF or image files are allowed.")
+
+    # Hash + size-check without reading the upload into memory
+    try:
+        return await spool_upload(file, settings.UPLOAD_MAX_MB * 1024 * 1024)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
+async def _ocr_job(ctx: JobContext, data: bytes) -> dict:
+    """Background OCR (?mode=async). The job id doubles as doc_id, so a retry overwrites."""
+    pages, markdown, _raw_json = await mistral_ocr_to_markdown(
+        file_bytes=data,
+        filename=ctx.filename or "upload",
+        content_type=ctx.content_type,
+        on_progress=ctx.progress,
     )
+    await document_store.save(ctx.id, "doc", markdown, pages=pages, filename=ctx.filename)
+    await _index_document(ctx.id, markdown)
+    return {"doc_id": ctx.id, "pages": pages, "markdown": markdown}
+
+
+job_queue.register("ocr", _ocr_job, flow="docchat")
 
 
 @router.post("/api/docchat/upload")
-async def docchat_upload(file: UploadFile = File(...)):
+async def docchat_upload(file: UploadFile = File(...), mode: str = Query("sync", pattern="^(sync|async)$")):
     """
     Upload endpoint for the modal.
     Returns: doc_id, pages, markdown (REAL OCR via Mistral OCR model)
+
+    mode=async: returns 202 {job_id, status_url, events_url} at once; OCR runs in the
+    background job queue and the job result carries the same fields.
     """
-    if not _is_allowed_upload(file):
-        raise HTTPException(status_code=400, detail="Only PDF or image files are allowed.")
+    upload = await _checked_upload(file)
+
+    if mode == "async":
+        job_id = await job_queue.submit(
+            "ocr",
+            await upload.read_all(),
+            filename=upload.filename,
+            content_type=upload.content_type,
+        )
+        return JSONResponse(
+            {
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"/api/jobs/{job_id}",
+                "events_url": f"/api/jobs/{job_id}/events",
+            },
+            status_code=202,
+        )
 
-    raw = await file.read()
     doc_id = str(uuid.uuid4())
 
     try:
         # Run Mistral OCR (mistral-ocr-2512) -> markdown
-        pages, markdown, _raw_json = mistral_ocr_to_markdown(
-            file_bytes=raw,
-            filename=file.filename or "upload",
-            content_type=file.content_type,
-        )
+        pages, markdown, _raw_json = await mistral_ocr_upload(upload)
+        # Keep the OCR output server-side; questions reference it by doc_id
+        await document_store.save(doc_id, "doc", markdown, pages=pages, filename=file.filename)
+        await _index_document(doc_id, markdown)
+    except PreprocessPoolSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except MistralUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": e.retry_after_header})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     return JSONResponse({"doc_id": doc_id, "pages": pages, "markdown": markdown})
 
 
+@router.post("/api/docchat/upload/stream")
+async def docchat_upload_stream(request: Request, file: UploadFile = File(...)):
+    """
+    Same upload as /api/docchat/upload, reported as Server-Sent Events while OCR runs:
+        event: pages     data: {"pages": N, "ranges": K}    (large PDFs, before any text)
+        event: progress  data: {"first_page", "last_page", "completed", "total"}
+        event: done      data: {"doc_id", "pages", "markdown"}
+        event: error     data: {"detail": "..."}
+    OCR is cancelled if the client disconnects.
+    """
+    upload = await _checked_upload(file)
+    doc_id = str(uuid.uuid4())
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def on_progress(evt: dict) -> None:
+        await events.put(evt)
+
+    async def work():
+        try:
+            pages, markdown, _raw_json = await mistral_ocr_upload(upload, on_progress=on_progress)
+            await document_store.save(doc_id, "doc", markdown, pages=pages, filename=file.filename)
+            await _index_document(doc_id, markdown)
+            return pages, markdown
+        finally:
+            await events.put(None)
+
+    async def gen():
+        task = asyncio.create_task(work())
+        try:
+            while (evt := await events.get()) is not None:
+                if await request.is_disconnected():
+                    return
+                data = {k: v for k, v in evt.items() if k != "stage"}
+                yield sse_event("pages" if evt["stage"] == "pages" else "progress", data)
+            try:
+                pages, markdown = await task
+            except Exception as e:
+                yield sse_event("error", {"detail": str(e)})
+                return
+            yield sse_event("done", {"doc_id": doc_id, "pages": pages, "markdown": markdown})
+        finally:
+            task.cancel()
+
+    return StreamingResponse(
+        gen(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 
 @router.post("/api/docchat/upload_clipboard")
 async def docchat_upload_clipboard(files: list[UploadFile] = File(...)):
     """
     Accepts multiple screenshot images from clipboard capture flow.
     Combines OCR markdown from all images into one document (in order sent).
-    Returns: doc_id, pages, markdown
+    Images are OCR'd concurrently (OCR_CLIPBOARD_CONCURRENCY at a time).
+    Returns: doc_id, pages, markdown, errors (per-image failures; partial results are kept)
     """
     if not files or len(files) == 0:
         raise HTTPException(status_code=400, detail="At least one image is required.")
@@ -100,27 +242,61 @@ async def docchat_upload_clipboard(files: list[UploadFile] = File(...)):
             raise HTTPException(status_code=400, detail="Only image files are allowed for on-screen capture.")
 
     doc_id = str(uuid.uuid4())
+    sem = asyncio.Semaphore(max(1, settings.OCR_CLIPBOARD_CONCURRENCY))
+
+    async def ocr_one(idx: int, f: UploadFile):
+        filename = f.filename or f"snip_{idx}.png"
+        async with sem:
+            try:
+                upload = await spool_upload(f, settings.UPLOAD_MAX_MB * 1024 * 1024)
+                pages, markdown, _raw_json = await mistral_ocr_to_markdown(
+                    file_bytes=await upload.read_all(),
+                    filename=filename,
+                    content_type=f.content_type,
+                    sha256=upload.sha256,
+                )
+                return idx, pages, markdown, None
+            except Exception as e:
+                return idx, 0, "", e
+
+    # Fan out (bounded), then merge in the original order
+    results = await asyncio.gather(*(ocr_one(idx, f) for idx, f in enumerate(files, start=1)))
 
     total_pages = 0
     md_parts: list[str] = []
+    errors: list[dict] = []
+
+    for idx, pages, markdown, err in results:
+        if err is not None:
+            errors.append({
+                "index": idx,
+                "filename": files[idx - 1].filename or f"snip_{idx}.png",
+                "error": str(err),
+            })
+            continue
+        total_pages += max(pages, 1)
+        if markdown:
+            md_parts.append(f"\n\n---\n\n# Screenshot {idx}\n\n{markdown.strip()}\n")
+
+    if len(errors) == len(files):
+        # Nothing succeeded: surface one error for the whole batch
+        detail = "; ".join(f"Screenshot {e['index']}: {e['error']}" for e in errors)
+        if all(isinstance(r[3], (MistralUnavailable, PreprocessPoolSaturated)) for r in results):
+            retry_after = max((r[3].retry_after for r in results if isinstance(r[3], MistralUnavailable)), default=5.0)
+            raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": str(max(1, round(retry_after)))})
+        raise HTTPException(status_code=500, detail=detail)
+
+    combined = "\n".join(md_parts).strip() or "(No text extracted.)"
 
     try:
-        for idx, f in enumerate(files, start=1):
-            raw = await f.read()
-            pages, markdown, _raw_json = mistral_ocr_to_markdown(
-                file_bytes=raw,
-                filename=f.filename or f"snip_{idx}.png",
-                content_type=f.content_type,
-            )
-            total_pages += max(pages, 1)
-            if markdown:
-                md_parts.append(f"\n\n---\n\n# Screenshot {idx}\n\n{markdown.strip()}\n")
+        await document_store.save(doc_id, "doc", combined, pages=total_pages, filename="clipboard")
+        await _index_document(doc_id, combined)
+    except MistralUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": e.retry_after_header})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    combined = "\n".join(md_parts).strip() or "(No text extracted.)"
-
-    return JSONResponse({"doc_id": doc_id, "pages": total_pages, "markdown": combined})
+    return JSONResponse({"doc_id": doc_id, "pages": total_pages, "markdown": combined, "errors": errors})
 
 
 
@@ -128,30 +304,89 @@ async def docchat_upload_clipboard(files: list[UploadFile] = File(...)):
 async def docchat_clear(doc_id: str):
     """
     Called when user clicks 'Close and clear document'.
-    Stub for now. Later: delete temp objects / cached OCR output keyed by doc_id.
+    Deletes the stored OCR output for doc_id, its retrieval index and its cached answers.
     """
-    return JSONResponse({"ok": True, "doc_id": doc_id})
+    doc = await document_store.load(doc_id, "doc")
+    deleted = await document_store.delete(doc_id)
+    await delete_document_index(doc_id)
+    if doc is not None:
+        await answer_cache.invalidate(doc.content_sha256)
+    return JSONResponse({"ok": True, "doc_id": doc_id, "deleted": deleted})
 
 
-@router.post("/api/docchat/query")
-async def docchat_query(payload: dict = Body(...)):
+@dataclass
+class _DocQuestion:
+    doc: StoredContent
+    question: str
+    mode: str
+
+    @property
+    def cache_variant(self) -> str:
+        # Answers depend on the chat model and on how the context was chosen
+        return f"{settings.MISTRAL_CHAT_MODEL}:{self.mode}"
+
+
+async def _doc_question(payload: dict) -> _DocQuestion:
     """
     payload:
     {
       "doc_id": "...",
       "question": "...",
-      "markdown": "..."   # MVP: markdown passed from client; later load by doc_id server-side
+      "mode": "auto"    # optional: auto | retrieval | mapreduce
     }
+    Document markdown is loaded server-side by doc_id.
     """
+    doc_id = (payload.get("doc_id") or "").strip()
     question = (payload.get("question") or "").strip()
-    markdown = (payload.get("markdown") or "").strip()
+    mode = (payload.get("mode") or "auto").strip().lower()
 
     if not question:
         raise HTTPException(status_code=400, detail="Question is required.")
-    if not markdown:
-        raise HTTPException(status_code=400, detail="Document content is missing.")
+    if not doc_id:
+        raise HTTPException(status_code=400, detail="doc_id is required.")
+    if mode not in ("auto", "retrieval", "mapreduce"):
+        raise HTTPException(status_code=400, detail="mode must be auto, retrieval or mapreduce.")
+
+    doc = await document_store.load(doc_id, "doc")
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Document not found. Please upload it again.")
+    return _DocQuestion(doc=doc, question=question, mode=mode)
 
-    messages = [
+
+async def _docchat_messages(q: _DocQuestion) -> list[dict]:
+    """
+    Large documents are answered from the top-k retrieved chunks, or map-reduced when the
+    question needs the whole document.
+    """
+    doc_id, question, mode = q.doc.id, q.question, q.mode
+    markdown = q.doc.content
+
+    # Large documents and whole-document questions ("summarize", "list all ..."): top-k
+    # chunks would miss most of it, so answer from per-section digests instead
+    if needs_retrieval(markdown) and (
+        mode == "mapreduce" or (mode == "auto" and is_global_question(question))
+    ):
+        try:
+            with stage("map_reduce"):
+                messages, _stats = await map_reduce_messages(markdown, question, kind="document")
+        except MistralUnavailable as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": e.retry_after_header})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        return messages
+
+    # Large documents: send only the top-k relevant chunks so the prompt stays bounded
+    if needs_retrieval(markdown):
+        try:
+            with stage("retrieval"):
+                chunks = await retrieve(doc_id, question, markdown=markdown)
+        except MistralUnavailable as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": e.retry_after_header})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        markdown = build_context(chunks)
+
+    return [
         {
             "role": "system",
             "content": (
@@ -163,9 +398,79 @@ async def docchat_query(payload: dict = Body(...)):
         {"role": "user", "content": f"DOCUMENT:\n\n{markdown}\n\nQUESTION:\n{question}"},
     ]
 
+
+async def _cached_answer(q: _DocQuestion) -> tuple[CacheHit | None, np.ndarray | None]:
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None, None
     try:
-        answer = mistral_chat(messages=messages)
+        with stage("answer_cache"):
+            return await answer_cache.lookup(q.doc.content_sha256, q.question, q.cache_variant)
+    except Exception as e:
+        logger.warning("Answer cache lookup failed: %s", e)
+        return None, None
+
+
+async def _remember_answer(q: _DocQuestion, answer: str, vector: np.ndarray | None) -> None:
+    if not settings.ANSWER_CACHE_ENABLED:
+        return
+    try:
+        await answer_cache.put(q.doc.content_sha256, q.question, q.cache_variant, answer, vector)
+    except Exception as e:
+        logger.warning("Answer cache store failed: %s", e)
+
+
+@router.post("/api/docchat/query")
+async def docchat_query(payload: dict = Body(...)):
+    """
+    payload: {"doc_id": "...", "question": "...", "mode": "auto|retrieval|mapreduce"}
+    Returns: {"answer": "...", "cached": bool, "cache": {match, similarity, question, age_seconds} | null}
+    """
+    q = await _doc_question(payload)
+    hit, vector = await _cached_answer(q)
+    if hit is not None:
+        return JSONResponse({"answer": hit.answer, "cached": True, "cache": hit.meta()})
+
+    messages = await _docchat_messages(q)
+
+    try:
+        answer = await mistral_chat(messages=messages)
+    except MistralUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": e.retry_after_header})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    return JSONResponse({"answer": answer})
+    await _remember_answer(q, answer, vector)
+    return JSONResponse({"answer": answer, "cached": False, "cache": None})
+
+
+async def _once(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+async def _recording(q: _DocQuestion, deltas: AsyncIterator[str], vector: np.ndarray | None) -> AsyncIterator[str]:
+    """Passes deltas through and caches the answer once the stream completes."""
+    parts: list[str] = []
+    try:
+        async for delta in deltas:
+            parts.append(delta)
+            yield delta
+    finally:
+        await deltas.aclose()
+    # Not reached when the client disconnected mid-answer (generator closed early)
+    await _remember_answer(q, "".join(parts), vector)
+
+
+@router.post("/api/docchat/query/stream")
+async def docchat_query_stream(request: Request, payload: dict = Body(...)):
+    """
+    Same payload as /api/docchat/query; streams the answer as Server-Sent Events
+    (token / done / error). Upstream generation stops when the client disconnects.
+    The done event carries {"cached": bool, "cache": ...}; a cached answer arrives as one token.
+    """
+    q = await _doc_question(payload)
+    hit, vector = await _cached_answer(q)
+    if hit is not None:
+        return sse_response(request, _once(hit.answer), {"cached": True, "cache": hit.meta()})
+
+    messages = await _docchat_messages(q)
+    return sse_response(request, _recording(q, mistral_chat_stream(messages=messages), vector), {"cached": False, "cache": None})
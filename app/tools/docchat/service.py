@@ -1,153 +1,281 @@
 # app/tools/docchat/service.py
 
+import asyncio
 import base64
+import hashlib
+import io
+import logging
 import mimetypes
+from collections.abc import Awaitable, Callable
+from typing import BinaryIO
+
+from starlette.concurrency import run_in_threadpool
 
-import requests
 from app.core.config import settings
+from app.core.metrics import observe_stage, stage
+from app.services.ocr.admission import MistralUnavailable
+from app.services.ocr.cache import PREPROCESS_VERSION, ocr_cache, ocr_cache_key
+from app.services.ocr.mistral import get_mistral_client, is_transient
+from app.services.ocr.pdf import pdf_page_count
+from app.services.ocr.pool import preprocess_pool
+from app.services.storage.uploads import SpooledUpload
 
-# --- OpenCV preprocessing deps ---
-import cv2
-import numpy as np
+logger = logging.getLogger(__name__)
 
-MISTRAL_CHAT_URL = "https://api.mistral.ai/v1/chat/completions"
-MISTRAL_OCR_URL = "https://api.mistral.ai/v1/ocr"
 
+def _classify_upload(filename: str, content_type: str | None) -> tuple[str, bool, bool]:
+    """Returns (mime, is_pdf, is_img); raises ValueError for anything else."""
+    ctype = (content_type or "").lower().strip()
+    if not ctype:
+        guessed, _ = mimetypes.guess_type(filename)
+        ctype = guessed or "application/octet-stream"
 
-def _auth_headers() -> dict:
-    api_key = settings.MISTRAL_API_KEY
-    if not api_key:
-        raise ValueError("MISTRAL_API_KEY is not set")
-    return {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-    }
+    is_pdf = ctype == "application/pdf" or filename.lower().endswith(".pdf")
+    is_img = ctype.startswith("image/") or filename.lower().endswith((".png", ".jpg", ".jpeg"))
 
+    if not (is_pdf or is_img):
+        raise ValueError("Only PDF or image files are allowed for OCR.")
+    return ctype, is_pdf, is_img
 
-# ----------------------------
-# Image Preprocessing (OpenCV)
-# ----------------------------
-def preprocess_for_ocr(image_bytes: bytes) -> bytes:
+
+def _combine_pages(data: dict) -> tuple[int, str]:
+    pages = data.get("pages") or []
+    pages_count = len(pages) if pages else 0
+    combined_md = "\n\n".join([(p.get("markdown") or "").strip() for p in pages]).strip()
+
+    if not combined_md:
+        combined_md = "(No text extracted.)"
+    return pages_count, combined_md
+
+
+async def _cached_ocr(digest: str, run_ocr):
     """
-    Gentle preprocessing to improve OCR on phone pics / scans:
-    - grayscale
-    - CLAHE contrast
-    - light denoise
-    - light sharpen (unsharp mask)
-    Returns PNG bytes.
+    Content-addressed cache around one OCR run.
+    run_ocr: coroutine function returning the raw OCR response JSON.
     """
-    arr = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-    if img is None:
-        raise ValueError("Invalid image bytes")
+    cache_key = None
+    if settings.OCR_CACHE_ENABLED:
+        cache_key = ocr_cache_key(digest, settings.MISTRAL_OCR_MODEL, PREPROCESS_VERSION)
+        cached = await ocr_cache.get(cache_key)
+        if cached is not None:
+            return cached["pages"], cached["markdown"], cached["raw"]
 
-    # 1) Grayscale
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    data = await run_ocr()
+    pages_count, combined_md = _combine_pages(data)
 
-    # 2) Contrast normalize (CLAHE)
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    gray = clahe.apply(gray)
+    if cache_key is not None:
+        await ocr_cache.put(cache_key, {"pages": pages_count, "markdown": combined_md, "raw": data})
 
-    # 3) Light denoise (keeps edges)
-    gray = cv2.fastNlMeansDenoising(gray, h=10)
+    return pages_count, combined_md, data
 
-    # 4) Light sharpen (unsharp mask)
-    blur = cv2.GaussianBlur(gray, (0, 0), sigmaX=1.0)
-    sharp = cv2.addWeighted(gray, 1.5, blur, -0.5, 0)
 
-    # Encode as PNG (best for OCR, lossless)
-    ok, out = cv2.imencode(".png", sharp)
-    if not ok:
-        raise RuntimeError("Failed to encode processed image")
-    return out.tobytes()
+# ----------------------------
+# Page-batched OCR (large PDFs)
+# ----------------------------
+# Progress events, in order:
+#   {"stage": "pages", "pages": N, "ranges": K}                         (page count known)
+#   {"stage": "range", "first_page": a, "last_page": b, "completed": i, "total": K}
+ProgressCallback = Callable[[dict], Awaitable[None]]
 
 
-def mistral_chat(messages, model=None, temperature=0.2, max_tokens=800):
-    """
-    messages format:
-    [
-      {"role": "system", "content": "..."},
-      {"role": "user", "content": "..."}
-    ]
+def _page_ranges(pages_total: int, size: int) -> list[tuple[int, int]]:
+    """[start, end) 0-based page ranges of at most size pages."""
+    size = max(1, size)
+    return [(start, min(start + size, pages_total)) for start in range(0, pages_total, size)]
+
+
+async def _ocr_page_range(client, url: str, start: int, end: int) -> dict:
+    """One page range; transport errors and 5xx are retried on their own (exponential backoff)."""
+    for attempt in range(settings.OCR_BATCH_RETRIES + 1):
+        try:
+            return await client.ocr(
+                {"type": "document_url", "document_url": url},
+                model=settings.MISTRAL_OCR_MODEL,
+                pages=list(range(start, end)),
+            )
+        except MistralUnavailable:
+            raise  # already retried by admission control
+        except Exception as e:
+            if not is_transient(e):
+                raise  # 4xx, bad input, bugs: retrying cannot help
+            if attempt == settings.OCR_BATCH_RETRIES:
+                raise RuntimeError(f"OCR failed for pages {start + 1}-{end}: {e}") from e
+            logger.warning("OCR pages %d-%d failed (attempt %d), retrying: %s", start + 1, end, attempt + 1, e)
+            await asyncio.sleep(2 ** attempt)
+
+
+async def ocr_pdf_batched(
+    fileobj: BinaryIO,
+    filename: str,
+    pages_total: int,
+    on_progress: ProgressCallback | None = None,
+) -> dict:
     """
-    payload = {
-        "model": model or settings.MISTRAL_CHAT_MODEL,
-        "messages": messages,
-        "temperature": temperature,
-        "max_tokens": max_tokens,
-    }
+    OCR a PDF as concurrent page ranges (OCR_BATCH_PAGES each, OCR_BATCH_CONCURRENCY at a time).
 
-    r = requests.post(MISTRAL_CHAT_URL, json=payload, headers=_auth_headers(), timeout=60)
-    if not r.ok:
+    The PDF is uploaded once to the Mistral Files API; every range is a separate OCR request
+    against its signed URL, so one slow or failing page only costs its own range. Pages are
+    reassembled in document order into one response shaped like a single OCR call.
+    """
+    client = get_mistral_client()
+    ranges = _page_ranges(pages_total, settings.OCR_BATCH_PAGES)
+    if on_progress:
+        await on_progress({"stage": "pages", "pages": pages_total, "ranges": len(ranges)})
+
+    file_id = await client.upload_file(filename, fileobj, "application/pdf")
+    try:
+        url = await client.signed_file_url(file_id)
+        sem = asyncio.Semaphore(max(1, settings.OCR_BATCH_CONCURRENCY))
+        completed = 0
+
+        async def run_range(start: int, end: int) -> dict:
+            nonlocal completed
+            async with sem:
+                data = await _ocr_page_range(client, url, start, end)
+            completed += 1
+            if on_progress:
+                await on_progress({
+                    "stage": "range",
+                    "first_page": start + 1,
+                    "last_page": end,
+                    "completed": completed,
+                    "total": len(ranges),
+                })
+            return data
+
+        tasks = [asyncio.create_task(run_range(start, end)) for start, end in ranges]
         try:
-            detail = r.json()
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+    finally:
+        try:
+            await client.delete_file(file_id)
         except Exception:
-            detail = r.text
-        raise RuntimeError(f"Mistral Chat API error ({r.status_code}): {detail}")
+            logger.warning("Could not delete uploaded OCR file %s", file_id, exc_info=True)
+
+    pages: list[dict] = []
+    pages_processed = 0
+    for data in results:
+        pages.extend(sorted(data.get("pages") or [], key=lambda p: p.get("index", 0)))
+        pages_processed += (data.get("usage_info") or {}).get("pages_processed", 0)
 
-    data = r.json()
-    return data["choices"][0]["message"]["content"]
+    return {
+        "pages": pages,
+        "model": results[0].get("model") if results else settings.MISTRAL_OCR_MODEL,
+        "usage_info": {"pages_processed": pages_processed or len(pages)},
+    }
 
 
-def mistral_ocr_to_markdown(file_bytes: bytes, filename: str, content_type: str | None = None):
+async def _batch_pages(fileobj: BinaryIO, batch: bool | None) -> int | None:
+    """Page count if this PDF should be OCR'd in page ranges, else None."""
+    if batch is False:
+        return None
+    pages_total = await run_in_threadpool(pdf_page_count, fileobj)
+    if pages_total is None:
+        return None
+    if batch or pages_total > settings.OCR_BATCH_MIN_PAGES:
+        return pages_total
+    return None
+
+
+async def mistral_ocr_to_markdown(
+    file_bytes: bytes,
+    filename: str,
+    content_type: str | None = None,
+    sha256: str | None = None,
+    batch: bool | None = None,
+    on_progress: ProgressCallback | None = None,
+):
     """
     Calls Mistral OCR model (mistral-ocr-2512) to extract Markdown.
     Returns: (pages_count, combined_markdown, raw_response_json)
 
+    Results are cached by SHA-256 of the raw bytes + OCR model + PREPROCESS_VERSION
+    (pass sha256 if the caller already hashed the upload).
+
     Behavior:
-    - PDFs: sent as-is
-    - Images: preprocessed via OpenCV, then sent as PNG for best OCR
+    - PDFs: sent as-is; PDFs over OCR_BATCH_MIN_PAGES pages (or any PDF with batch=True)
+      are OCR'd as concurrent page ranges (see ocr_pdf_batched). batch=False disables that.
+    - Images: preprocessed via OpenCV in the process pool, then sent as PNG for best OCR
+      (raises PreprocessPoolSaturated when the pool is full)
+    - on_progress receives page-count / per-range events for batched PDFs
 
     Expects OCR response: data["pages"][i]["markdown"]
     """
-    # Determine mime
-    ctype = (content_type or "").lower().strip()
-    if not ctype:
-        guessed, _ = mimetypes.guess_type(filename)
-        ctype = guessed or "application/octet-stream"
-
-    is_pdf = ctype == "application/pdf" or filename.lower().endswith(".pdf")
-    is_img = ctype.startswith("image/") or filename.lower().endswith((".png", ".jpg", ".jpeg"))
+    ctype, is_pdf, is_img = _classify_upload(filename, content_type)
+
+    async def run_ocr():
+        if is_pdf:
+            fileobj = io.BytesIO(file_bytes)
+            pages_total = await _batch_pages(fileobj, batch)
+            if pages_total:
+                return await ocr_pdf_batched(fileobj, filename, pages_total, on_progress)
+        return await run_single()
+
+    async def run_single():
+        nonlocal file_bytes, ctype
+        # Preprocess images (convert to clean PNG bytes)
+        if is_img:
+            with stage("preprocess"):
+                file_bytes, report = await preprocess_pool.run(file_bytes)
+            for name, ms in (report.get("timings_ms") or {}).items():
+                observe_stage(f"preprocess_{name}", ms / 1000)
+            logger.info("OCR preprocess %s: stages=%s metrics=%s", filename, report["stages"], report["metrics"])
+            ctype = "image/png"
+
+        # Build data URL
+        with stage("base64"):
+            b64 = base64.b64encode(file_bytes).decode("utf-8")
+            if is_pdf:
+                document = {"type": "document_url", "document_url": f"data:application/pdf;base64,{b64}"}
+            else:
+                document = {"type": "image_url", "image_url": f"data:{ctype};base64,{b64}"}
+
+        # optional OCR knobs can be passed as keyword options later
+        return await get_mistral_client().ocr(document, model=settings.MISTRAL_OCR_MODEL)
+
+    return await _cached_ocr(sha256 or hashlib.sha256(file_bytes).hexdigest(), run_ocr)
+
+
+async def mistral_ocr_upload(
+    upload: SpooledUpload,
+    batch: bool | None = None,
+    on_progress: ProgressCallback | None = None,
+):
+    """
+    OCR for a spooled upload (see app/services/storage/uploads.py).
+    Returns: (pages_count, combined_markdown, raw_response_json)
 
-    if not (is_pdf or is_img):
-        raise ValueError("Only PDF or image files are allowed for OCR.")
+    - PDFs: the request body streams base64 straight from the spooled file, so neither the
+      raw PDF nor its encoded form is ever held in memory as a whole. Large PDFs are
+      OCR'd in page ranges (batch / on_progress as in mistral_ocr_to_markdown)
+    - Images: need decoding for preprocessing anyway, so they are read and handed to
+      mistral_ocr_to_markdown
+    """
+    _ctype, _is_pdf, is_img = _classify_upload(upload.filename, upload.content_type)
 
-    # Preprocess images (convert to clean PNG bytes)
     if is_img:
-        file_bytes = preprocess_for_ocr(file_bytes)
-        ctype = "image/png"
-        filename = "preprocessed.png"
-
-    # Build data URL
-    b64 = base64.b64encode(file_bytes).decode("utf-8")
-
-    if is_pdf:
-        document = {"type": "document_url", "document_url": f"data:application/pdf;base64,{b64}"}
-    else:
-        document = {"type": "image_url", "image_url": f"data:{ctype};base64,{b64}"}
-
-    payload = {
-        "model": settings.MISTRAL_OCR_MODEL,  # should be mistral-ocr-2512
-        "document": document,
-        # optional OCR knobs can be added later here
-    }
-
-    r = requests.post(MISTRAL_OCR_URL, json=payload, headers=_auth_headers(), timeout=120)
-    if not r.ok:
-        try:
-            detail = r.json()
-        except Exception:
-            detail = r.text
-        raise RuntimeError(f"Mistral OCR API error ({r.status_code}): {detail}")
-
-    data = r.json()
-
-    pages = data.get("pages") or []
-    pages_count = len(pages) if pages else 0
-    combined_md = "\n\n".join([(p.get("markdown") or "").strip() for p in pages]).strip()
-
-    if not combined_md:
-        combined_md = "(No text extracted.)"
-
-    return pages_count, combined_md, data
+        return await mistral_ocr_to_markdown(
+            file_bytes=await upload.read_all(),
+            filename=upload.filename,
+            content_type=upload.content_type,
+            sha256=upload.sha256,
+        )
+
+    async def run_ocr():
+        pages_total = await _batch_pages(upload.file, batch)
+        if pages_total:
+            return await ocr_pdf_batched(upload.file, upload.filename, pages_total, on_progress)
+        return await get_mistral_client().ocr_streamed(
+            "document_url",
+            "application/pdf",
+            upload.base64_chunks,
+            upload.base64_length(),
+            model=settings.MISTRAL_OCR_MODEL,
+        )
+
+    return await _cached_ocr(upload.sha256, run_ocr)
@@ -0,0 +1,228 @@
+# app/tools/voicechat/live.py
+"""
+Live (in-call) transcription over WebSocket.
+
+The browser streams 16-bit mono PCM; audio is buffered into windows of about
+VOICE_LIVE_WINDOW_SECONDS, cut at a pause when one is near the end of the window, and each
+window is transcribed with Voxtral as soon as it closes ("final" segments, in order).
+While a window is still open its audio so far is transcribed every
+VOICE_LIVE_PARTIAL_SECONDS ("partial", replaced by the next partial or final).
+Sentiment flags are refreshed every VOICE_LIVE_SENTIMENT_SECONDS of new speech: the local
+tier (app/tools/voicechat/sentiment.py) scores the call so far, and the LLM is asked only
+when a window since the last check was flagged.
+
+Protocol (JSON text frames unless noted):
+    client -> {"type": "start", "sample_rate": 48000, "language": null}
+    client -> binary PCM s16le mono frames
+    client -> {"type": "stop"}
+    server -> {"type": "ready"}
+    server -> {"type": "partial", "text", "start"}
+    server -> {"type": "final", "index", "text", "start", "end"}
+    server -> {"type": "sentiment", "tier": "local|llm", "flags": {...}, "as_of": seconds}
+    server -> {"type": "done", "audio_id", "transcript", "segments"}
+    server -> {"type": "error", "detail"}
+"""
+
+import asyncio
+import json
+import logging
+import re
+import time
+from collections.abc import Awaitable, Callable
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.services.audio.decode import encode_wav
+from app.services.audio.vad import find_silences
+from app.services.ocr.mistral import mistral_chat
+from app.tools.voicechat.segments import normalize_segments
+from app.tools.voicechat.sentiment import local_report
+from app.tools.voicechat.service import resample_audio, voxtral_transcribe
+
+logger = logging.getLogger(__name__)
+
+_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+LIVE_SENTIMENT_PROMPT = (
+    "You monitor a live customer call. From the transcript excerpts below, return ONLY a JSON object: "
+    '{"sentiment": "positive|neutral|negative", "escalation": true|false, '
+    '"abusive_language": true|false, "risk_flags": ["..."], "summary": "one sentence"}. '
+    "Use only evidence from the transcript."
+)
+
+
+async def live_sentiment_flags(transcript: str) -> dict:
+    """Compact LLM sentiment check for a call in progress (tail of the text only)."""
+    tail = transcript[-settings.VOICE_LIVE_SENTIMENT_MAX_CHARS:]
+    text = await mistral_chat(
+        messages=[
+            {"role": "system", "content": "You are an expert conversation analyst."},
+            {"role": "user", "content": f"{LIVE_SENTIMENT_PROMPT}\n\nTRANSCRIPT:\n\n{tail}"},
+        ],
+        temperature=0.0,
+        max_tokens=200,
+    )
+    match = _JSON_RE.search(text or "")
+    try:
+        return json.loads(match.group(0)) if match else {"summary": (text or "").strip()}
+    except json.JSONDecodeError:
+        return {"summary": (text or "").strip()}
+
+
+class LiveSession:
+    def __init__(
+        self,
+        sample_rate: int,
+        send: Callable[[dict], Awaitable[None]],
+        language: str | None = None,
+    ):
+        self.sample_rate = sample_rate
+        self.language = language
+        self._send = send
+        self._buf = bytearray()
+        self._window_start = 0.0  # seconds since call start
+        self._windows: asyncio.Queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._transcribe_windows())
+        self._partial_task: asyncio.Task | None = None
+        self._last_partial = time.monotonic()
+        self._sentiment_task: asyncio.Task | None = None
+        self._sentiment_at = 0.0  # call seconds covered by the last sentiment check
+        self._sentiment_checked = 0.0  # call seconds the local tier has already scored
+        self.segments: list[dict] = []
+
+    @property
+    def _buffered_seconds(self) -> float:
+        return len(self._buf) / 2 / self.sample_rate
+
+    @property
+    def transcript(self) -> str:
+        return " ".join(s["text"] for s in self.segments if s["text"])
+
+    def _samples(self, pcm: bytes) -> np.ndarray:
+        return np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+
+    async def feed(self, pcm: bytes) -> None:
+        self._buf += pcm[: len(pcm) - len(pcm) % 2]
+        if self._buffered_seconds >= settings.VOICE_LIVE_WINDOW_SECONDS:
+            await self._close_window()
+        elif (
+            settings.VOICE_LIVE_PARTIAL_SECONDS > 0
+            and time.monotonic() - self._last_partial >= settings.VOICE_LIVE_PARTIAL_SECONDS
+            and (self._partial_task is None or self._partial_task.done())
+            and self._buffered_seconds >= 1.0
+        ):
+            self._last_partial = time.monotonic()
+            self._partial_task = asyncio.create_task(self._partial(bytes(self._buf), self._window_start))
+
+    async def _close_window(self, flush: bool = False) -> None:
+        samples = self._samples(bytes(self._buf))
+        cut = len(samples)
+        if not flush:
+            # Prefer ending the window in a pause within its last 30%
+            silences = await run_in_threadpool(find_silences, samples, self.sample_rate, 250)
+            tail_from = 0.7 * len(samples) / self.sample_rate
+            pauses = [(a + b) / 2 for a, b in silences if (a + b) / 2 >= tail_from]
+            if pauses:
+                cut = int(pauses[-1] * self.sample_rate)
+
+        start = self._window_start
+        end = start + cut / self.sample_rate
+        if cut:
+            await self._windows.put((samples[:cut], start, end))
+        self._buf = self._buf[cut * 2:]
+        self._window_start = end
+        self._last_partial = time.monotonic()
+
+    async def _transcribe(self, samples: np.ndarray, name: str) -> str:
+        def _encode():
+            return encode_wav(resample_audio(samples, self.sample_rate, settings.VOICE_SAMPLE_RATE), settings.VOICE_SAMPLE_RATE)
+
+        wav = await run_in_threadpool(_encode)
+        text, _raw = await voxtral_transcribe(wav, name, "audio/wav", language=self.language)
+        return "" if text == "(No transcript returned.)" else text
+
+    async def _partial(self, pcm: bytes, start: float) -> None:
+        try:
+            text = await self._transcribe(self._samples(pcm), "partial.wav")
+            if text and start == self._window_start:
+                await self._send({"type": "partial", "text": text, "start": round(start, 2)})
+        except Exception as e:
+            logger.warning("Live partial transcription failed: %s", e)
+
+    async def _transcribe_windows(self) -> None:
+        while True:
+            item = await self._windows.get()
+            if item is None:
+                return
+            samples, start, end = item
+            try:
+                text = await self._transcribe(samples, f"window_{len(self.segments):05d}.wav")
+            except Exception as e:
+                logger.warning("Live window %.1f-%.1fs failed: %s", start, end, e)
+                await self._send({"type": "error", "detail": f"Transcription failed for {start:.1f}s-{end:.1f}s: {e}"})
+                text = ""
+            segment = {"index": len(self.segments), "text": text, "start": round(start, 2), "end": round(end, 2)}
+            self.segments.append(segment)
+            await self._send({"type": "final", **segment})
+            self._maybe_sentiment(end)
+
+    def _maybe_sentiment(self, now: float) -> None:
+        if settings.VOICE_LIVE_SENTIMENT_SECONDS <= 0:
+            return
+        if now - self._sentiment_at < settings.VOICE_LIVE_SENTIMENT_SECONDS:
+            return
+        if self._sentiment_task is not None and not self._sentiment_task.done():
+            return
+        self._sentiment_at = now
+        self._sentiment_task = asyncio.create_task(self._sentiment(now))
+
+    async def _sentiment(self, as_of: float) -> None:
+        segments = normalize_segments(self.segments)
+        if not segments:
+            return
+        since, self._sentiment_checked = self._sentiment_checked, segments[-1].end
+        try:
+            report = await run_in_threadpool(local_report, segments)
+            summary = report.summary()
+            recent = [i for i in report.scores.flagged.nonzero()[0] if segments[i].end > since]
+            flags = report.scores.flags
+            await self._send({
+                "type": "sentiment",
+                "tier": "local",
+                "flags": {
+                    "sentiment": summary["overall"],
+                    "escalation": bool(flags["escalation"].any()),
+                    "abusive_language": bool(flags["abusive"].any()),
+                    "risk_flags": [k for k, v in summary["counts"].items() if v],
+                    "summary": f"{summary['flagged_segments']} of {summary['segments']} segments flagged locally.",
+                },
+                "as_of": round(as_of, 2),
+            })
+            if recent:
+                # Something new was flagged: let the LLM look at the flagged windows only
+                flags = await live_sentiment_flags(report.window_text(settings.VOICE_SENTIMENT_WINDOW_TOKENS))
+                await self._send({"type": "sentiment", "tier": "llm", "flags": flags, "as_of": round(as_of, 2)})
+        except Exception as e:
+            logger.warning("Live sentiment check failed: %s", e)
+
+    async def finish(self) -> str:
+        """Flush the open window, wait for every final segment and return the transcript."""
+        if self._buf:
+            await self._close_window(flush=True)
+        await self._windows.put(None)
+        await self._worker
+        if self._partial_task is not None:
+            self._partial_task.cancel()
+        if self._sentiment_task is not None:
+            await asyncio.gather(self._sentiment_task, return_exceptions=True)
+        # One last check covering the end of the call
+        if settings.VOICE_LIVE_SENTIMENT_SECONDS > 0 and self.segments and self._sentiment_at < self._window_start:
+            await self._sentiment(self._window_start)
+        return self.transcript
+
+    async def cancel(self) -> None:
+        for t in (self._worker, self._partial_task, self._sentiment_task):
+            if t is not None:
+                t.cancel()
@@ -1,13 +1,48 @@
 # app/tools/voicechat/router.py
 
+import asyncio
+import json
+import logging
 import uuid
+from collections.abc import AsyncIterator
+from dataclasses import asdict
 from typing import Optional
 
-from fastapi import APIRouter, Body, File, HTTPException, Request, UploadFile
+from fastapi import APIRouter, Body, File, HTTPException, Query, Request, UploadFile, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
-
-from app.tools.voicechat.service import mistral_chat, voxtral_transcribe
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import stage
+from app.core.sse import sse_response
+from app.services.jobs.queue import JobContext, job_queue
+from app.services.ocr.admission import MistralUnavailable
+from app.services.ocr.mistral import mistral_chat, mistral_chat_stream
+from app.services.rag.mapreduce import is_global_question, map_reduce_messages, needs_map_reduce
+from app.services.storage.documents import document_store
+from app.tools.voicechat.live import LiveSession
+from app.tools.voicechat.segments import (
+    Segment,
+    delete_segment_index,
+    fmt_ts,
+    format_segments,
+    load_segment_index,
+    load_segments_many,
+    normalize_segments,
+    save_segments,
+)
+from app.tools.voicechat.sentiment import (
+    SENTIMENT_SYSTEM,
+    LocalReport,
+    llm_window_findings,
+    local_report,
+    local_reports,
+    window_messages,
+)
+from app.tools.voicechat.service import voxtral_transcribe_long
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -43,73 +78,308 @@ async def voice_intelligence_page(request: Request):
     """
     user = getattr(request.state, "user", None)
 
-    return templates.TemplateResponse(
-        "voice_intelligence.html",
-        {
-            "request": request,
-            "user": user,
-            "active_page": "voice",
-            "page_title": "Voice Intelligence",
-        },
+    with stage("template_render"):
+        response = templates.TemplateResponse(
+            "voice_intelligence.html",
+            {
+                "request": request,
+                "user": user,
+                "active_page": "voice",
+                "page_title": "Voice Intelligence",
+            },
+        )
+    return response
+
+
+def _preprocess_report(filename: str | None, raw_json: dict) -> dict | None:
+    report = raw_json.get("preprocess")
+    if report:
+        logger.info(
+            "Audio preprocess %s: %.1fs removed, %d bytes saved (%d Hz x%d -> %d Hz mono)",
+            filename, report["seconds_removed"], report["bytes_saved"],
+            report["source_rate"], report["source_channels"], report["sample_rate"],
+        )
+    return report
+
+
+async def _store_transcript(audio_id: str, transcript: str, segments: list[Segment], filename: str | None) -> None:
+    """Transcript text + its timestamped segments, both keyed by audio_id."""
+    await document_store.save(audio_id, "audio", transcript, filename=filename)
+    await save_segments(audio_id, segments)
+
+
+async def _transcribe_job(ctx: JobContext, data: bytes) -> dict:
+    """Background transcription (?mode=async). The job id doubles as audio_id."""
+    transcript, raw_json = await voxtral_transcribe_long(
+        audio_bytes=data,
+        filename=ctx.filename or "audio",
+        content_type=ctx.content_type,
+        diarize=settings.VOICE_DIARIZE,
+        timestamps=["segment"],
+        on_progress=ctx.progress,
     )
+    await _store_transcript(ctx.id, transcript, normalize_segments(raw_json.get("segments") or []), ctx.filename)
+    return {
+        "audio_id": ctx.id,
+        "transcript": transcript,
+        "preprocess": _preprocess_report(ctx.filename, raw_json),
+        # False: chunked recording, per-chunk speaker labels were dropped (see voxtral_transcribe_long)
+        "speakers_reconciled": raw_json.get("speakers_reconciled"),
+    }
+
+
+job_queue.register("transcribe", _transcribe_job, flow="voicechat")
 
 
 @router.post("/api/voice/upload")
-async def voice_upload(file: UploadFile = File(...)):
+async def voice_upload(file: UploadFile = File(...), mode: str = Query("sync", pattern="^(sync|async)$")):
     """
     Upload endpoint for the Voice Intelligence modal.
-    Returns: audio_id, transcript (REAL STT via Voxtral)
+    Returns: audio_id, transcript (REAL STT via Voxtral), preprocess (normalization report,
+    null when the audio could not be decoded locally)
+
+    mode=async: returns 202 {job_id, status_url, events_url} at once; transcription runs in
+    the background job queue and the job result carries the same fields.
     """
     if not _is_allowed_upload(file):
         raise HTTPException(status_code=400, detail="Only audio files are allowed.")
 
     raw = await file.read()
+
+    if mode == "async":
+        job_id = await job_queue.submit("transcribe", raw, filename=file.filename, content_type=file.content_type)
+        return JSONResponse(
+            {
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"/api/jobs/{job_id}",
+                "events_url": f"/api/jobs/{job_id}/events",
+            },
+            status_code=202,
+        )
+
     audio_id = str(uuid.uuid4())
 
     try:
-        transcript, _raw_json = voxtral_transcribe(
+        # Long recordings are split at silences and transcribed concurrently
+        transcript, raw_json = await voxtral_transcribe_long(
             audio_bytes=raw,
             filename=file.filename or "audio",
             content_type=file.content_type,
             # Optional knobs you can enable later:
             # language="en",
-            diarize=False,
-            timestamps=None,
+            diarize=settings.VOICE_DIARIZE,
+            timestamps=["segment"],
         )
+        # Keep the transcript (and its timestamped segments) server-side; questions reference it by audio_id
+        await _store_transcript(audio_id, transcript, normalize_segments(raw_json.get("segments") or []), file.filename)
+    except MistralUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": e.retry_after_header})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    return JSONResponse({"audio_id": audio_id, "transcript": transcript})
+    return JSONResponse({
+        "audio_id": audio_id,
+        "transcript": transcript,
+        "preprocess": _preprocess_report(file.filename, raw_json),
+        "speakers_reconciled": raw_json.get("speakers_reconciled"),
+    })
+
+
+@router.websocket("/ws/voice/live")
+async def voice_live(websocket: WebSocket):
+    """
+    Live call transcription (protocol in app/tools/voicechat/live.py).
+    The first message must be {"type": "start", "sample_rate": ...}; binary frames are 16-bit
+    mono PCM. On {"type": "stop"} the transcript is stored and its audio_id returned, so the
+    usual Q&A / sentiment endpoints work on the finished call.
+    """
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+
+    async def send(msg: dict) -> None:
+        async with send_lock:
+            await websocket.send_json(msg)
+
+    try:
+        start = await websocket.receive_json()
+    except (WebSocketDisconnect, ValueError):
+        return
+    if not isinstance(start, dict):
+        start = {}  # valid JSON but not an object ([], "start", ...)
+    try:
+        sample_rate = int(start.get("sample_rate") or 0)
+    except (TypeError, ValueError):
+        sample_rate = 0
+    if start.get("type") != "start" or not 8000 <= sample_rate <= 192000:
+        await send({"type": "error", "detail": 'First message must be {"type": "start", "sample_rate": 8000-192000}.'})
+        await websocket.close(code=1008)
+        return
+
+    session = LiveSession(sample_rate, send, language=start.get("language"))
+    max_bytes = settings.VOICE_LIVE_MAX_SECONDS * sample_rate * 2
+    received = 0
+    await send({"type": "ready"})
+
+    try:
+        while True:
+            msg = await websocket.receive()
+            if msg["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(msg.get("code", 1000))
+            if msg.get("bytes"):
+                received += len(msg["bytes"])
+                if received > max_bytes:
+                    await send({"type": "error", "detail": "Maximum live session length reached."})
+                    break
+                await session.feed(msg["bytes"])
+            elif msg.get("text"):
+                try:
+                    ctrl = json.loads(msg["text"])
+                except ValueError:
+                    continue
+                if isinstance(ctrl, dict) and ctrl.get("type") == "stop":
+                    break
+
+        transcript = await session.finish()
+        audio_id = str(uuid.uuid4())
+        if transcript:
+            await _store_transcript(audio_id, transcript, normalize_segments(session.segments), "live-call")
+        await send({
+            "type": "done",
+            "audio_id": audio_id if transcript else None,
+            "transcript": transcript,
+            "segments": session.segments,
+        })
+        await websocket.close()
+    except WebSocketDisconnect:
+        await session.cancel()
+    except Exception as e:
+        logger.exception("Live transcription session failed")
+        await session.cancel()
+        try:
+            await send({"type": "error", "detail": str(e)})
+            await websocket.close(code=1011)
+        except Exception:
+            pass
 
 
 @router.post("/api/voice/clear/{audio_id}")
 async def voice_clear(audio_id: str):
     """
     Called when user clicks 'Close and clear audio'.
-    Stub for now. Later: delete temp objects / cached transcript keyed by audio_id.
+    Deletes the stored transcript for audio_id.
     """
-    return JSONResponse({"ok": True, "audio_id": audio_id})
+    deleted = await document_store.delete(audio_id)
+    await delete_segment_index(audio_id)
+    return JSONResponse({"ok": True, "audio_id": audio_id, "deleted": deleted})
+
+
+def _audio_id(payload: dict) -> str:
+    # Older clients sent the audio id as "doc_id"
+    audio_id = (payload.get("audio_id") or payload.get("doc_id") or "").strip()
+    if not audio_id:
+        raise HTTPException(status_code=400, detail="audio_id is required.")
+    return audio_id
+
+
+async def _load_transcript(payload: dict) -> str:
+    item = await document_store.load(_audio_id(payload), "audio")
+    if item is None:
+        raise HTTPException(status_code=404, detail="Transcript not found. Please upload the audio again.")
+    return item.content
+
+
+@router.get("/api/voice/segments/{audio_id}")
+async def voice_segments(
+    audio_id: str,
+    speaker: Optional[str] = None,
+    start: Optional[float] = Query(None, description="seconds"),
+    end: Optional[float] = Query(None, description="seconds"),
+    q: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=5000),
+):
+    """
+    Timestamped transcript segments, filtered by speaker / time range and ranked by keyword (q).
+    Returns: {"audio_id", "speakers", "segments": [{ord, speaker, start, end, text}]}
+    """
+    index = await load_segment_index(audio_id)
+    if index is None:
+        raise HTTPException(status_code=404, detail="No timestamped segments for this audio.")
+    segments = index.query(speaker=speaker, start=start, end=end, keywords=q, limit=limit)
+    return JSONResponse({
+        "audio_id": audio_id,
+        "speakers": index.speakers,
+        "segments": [asdict(s) for s in segments],
+    })
+
+
+async def _map_reduce(text: str, question: str) -> list[dict]:
+    try:
+        with stage("map_reduce"):
+            messages, _stats = await map_reduce_messages(text, question, kind="transcript")
+    except MistralUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": e.retry_after_header})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return messages
 
 
-@router.post("/api/voice/query")
-async def voice_query(payload: dict = Body(...)):
+async def _voice_query_messages(payload: dict) -> list[dict]:
     """
     payload:
     {
       "audio_id": "...",
-      "question": "...",
-      "transcript": "..."   # MVP: transcript passed from client; later load by audio_id server-side
+      "question": "..."
     }
+    Transcript is loaded server-side by audio_id.
     """
     question = (payload.get("question") or "").strip()
-    transcript = (payload.get("transcript") or "").strip()
 
     if not question:
         raise HTTPException(status_code=400, detail="Question is required.")
-    if not transcript:
-        raise HTTPException(status_code=400, detail="Transcript content is missing.")
-
-    messages = [
+    transcript = await _load_transcript(payload)
+
+    # Timestamped segments: send only those relevant to the question, and cite their times
+    index = await load_segment_index(_audio_id(payload))
+    if index is not None and is_global_question(question):
+        # "Summarize the call", "list every action item": the question needs all (filtered)
+        # segments; over the budget they are map-reduced rather than cut down
+        filters = index.parse_filters(question)
+        scoped = index.query(filters.speaker, filters.start, filters.end) or index.segments
+        text = format_segments(scoped)
+        if needs_map_reduce(text, settings.VOICE_QA_CONTEXT_TOKENS):
+            return await _map_reduce(text, question)
+
+    if index is not None:
+        with stage("segment_select"):
+            segments, filters = index.select_for_question(question, settings.VOICE_QA_CONTEXT_TOKENS)
+        scope = []
+        if filters.speaker:
+            scope.append(f"speaker {filters.speaker}")
+        if filters.start is not None:
+            scope.append(f"from {fmt_ts(filters.start)}")
+        if filters.end is not None:
+            scope.append(f"until {fmt_ts(filters.end)}")
+        header = f"TRANSCRIPT SEGMENTS ({', '.join(scope)}):" if scope else "TRANSCRIPT SEGMENTS:"
+        return [
+            {
+                "role": "system",
+                "content": (
+                    "You are a voice intelligence assistant. "
+                    "Answer using only the transcript segments. Each segment starts with its "
+                    "[start-end] timestamp and, when known, the speaker. "
+                    "Cite the timestamps of the segments you rely on, e.g. [12:05]. "
+                    "If the answer is not in the segments, say you cannot find it."
+                ),
+            },
+            {"role": "user", "content": f"{header}\n\n{format_segments(segments)}\n\nQUESTION:\n{question}"},
+        ]
+
+    if needs_map_reduce(transcript):
+        # Too large to send whole (and no segments to select from)
+        return await _map_reduce(transcript, question)
+
+    return [
         {
             "role": "system",
             "content": (
@@ -121,51 +391,205 @@ async def voice_query(payload: dict = Body(...)):
         {"role": "user", "content": f"TRANSCRIPT:\n\n{transcript}\n\nQUESTION:\n{question}"},
     ]
 
-    try:
-        answer = mistral_chat(messages=messages)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
 
-    return JSONResponse({"answer": answer})
-
-
-@router.post("/api/voice/sentiment")
-async def voice_sentiment(payload: dict = Body(...)):
+async def _sentiment_messages(payload: dict) -> list[dict]:
     """
     payload:
     {
       "audio_id": "...",
-      "transcript": "...",
       "prompt": "..."   # optional override; UI sends a robust default prompt
     }
+    Transcript is loaded server-side by audio_id.
     """
-    transcript = (payload.get("transcript") or "").strip()
-    prompt = (payload.get("prompt") or "").strip()
+    prompt = _sentiment_prompt(payload)
+    transcript = await _load_transcript(payload)
 
-    if not transcript:
-        raise HTTPException(status_code=400, detail="Transcript content is missing.")
-
-    if not prompt:
-        prompt = (
-            "Analyze the transcript for sentiment and safety signals. "
-            "Provide: overall sentiment, tone progression, emotions, escalation, abusive language, risk flags, "
-            "and an actionable summary. Use only evidence from the transcript."
-        )
-
-    messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are an expert conversation analyst. "
-                "Stay grounded in the transcript; do not invent details."
-            ),
-        },
+    return [
+        {"role": "system", "content": SENTIMENT_SYSTEM},
         {"role": "user", "content": f"{prompt}\n\nTRANSCRIPT:\n\n{transcript}"},
     ]
 
+
+def _sentiment_prompt(payload: dict) -> str:
+    return (payload.get("prompt") or "").strip() or (
+        "Analyze the transcript for sentiment and safety signals. "
+        "Provide: overall sentiment, tone progression, emotions, escalation, abusive language, risk flags, "
+        "and an actionable summary. Use only evidence from the transcript."
+    )
+
+
+def _sentiment_tier(payload: dict) -> str:
+    """auto (local pre-scan, LLM on flagged windows) | local (never the LLM) | full (LLM on everything)."""
+    tier = (payload.get("tier") or "auto").strip().lower()
+    if tier not in ("auto", "local", "full"):
+        raise HTTPException(status_code=400, detail="tier must be auto, local or full.")
+    return tier
+
+
+async def _local_sentiment(payload: dict) -> LocalReport:
+    transcript = await _load_transcript(payload)
+    index = await load_segment_index(_audio_id(payload))
+    with stage("sentiment_local"):
+        return await run_in_threadpool(local_report, index.segments if index is not None else [], transcript)
+
+
+async def _prefixed(prefix: str, deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+    try:
+        yield prefix
+        async for delta in deltas:
+            yield delta
+    finally:
+        await deltas.aclose()
+
+
+async def _once(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+@router.post("/api/voice/query")
+async def voice_query(payload: dict = Body(...)):
+    """
+    payload: {"audio_id": "...", "question": "..."}
+    Returns: {"answer": "..."}
+    """
+    messages = await _voice_query_messages(payload)
+
     try:
-        analysis = mistral_chat(messages=messages, temperature=0.2, max_tokens=900)
+        answer = await mistral_chat(messages=messages)
+    except MistralUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": e.retry_after_header})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    return JSONResponse({"analysis": analysis})
+    return JSONResponse({"answer": answer})
+
+
+@router.post("/api/voice/query/stream")
+async def voice_query_stream(request: Request, payload: dict = Body(...)):
+    """Streaming (SSE) variant of /api/voice/query."""
+    messages = await _voice_query_messages(payload)
+    return sse_response(request, mistral_chat_stream(messages=messages))
+
+
+@router.post("/api/voice/sentiment")
+async def voice_sentiment(payload: dict = Body(...)):
+    """
+    payload: {"audio_id": "...", "prompt": "...", "tier": "auto|local|full"}
+    Returns: {"analysis": "...", "tier", "local": {...}, "findings": [{"tier": "local|llm", ...}]}
+
+    The local tier scores every segment; only flagged windows go to the LLM (tier "llm"),
+    and a call with nothing flagged is answered locally. tier=full is the previous
+    whole-transcript LLM analysis.
+    """
+    tier = _sentiment_tier(payload)
+
+    if tier == "full":
+        messages = await _sentiment_messages(payload)
+        try:
+            analysis = await mistral_chat(messages=messages, temperature=0.2, max_tokens=settings.VOICE_SENTIMENT_LLM_MAX_TOKENS)
+        except MistralUnavailable as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": e.retry_after_header})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        return JSONResponse({"analysis": analysis, "tier": "full", "local": None, "findings": []})
+
+    report = await _local_sentiment(payload)
+    findings = report.findings()
+    llm_findings, llm_summary = [], ""
+    if tier == "auto" and report.windows:
+        try:
+            llm_findings, llm_summary = await llm_window_findings(report, (payload.get("prompt") or "").strip() or None)
+        except MistralUnavailable as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": e.retry_after_header})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    return JSONResponse({
+        "analysis": report.describe(llm_findings, llm_summary),
+        "tier": "llm" if llm_findings else "local",
+        "local": report.summary(),
+        "findings": findings + llm_findings,
+    })
+
+
+@router.post("/api/voice/sentiment/stream")
+async def voice_sentiment_stream(request: Request, payload: dict = Body(...)):
+    """
+    Streaming (SSE) variant of /api/voice/sentiment. The local result is streamed first; the
+    LLM then analyzes only the flagged windows. The done event carries {tier, local, findings}
+    (local-tier findings).
+    """
+    tier = _sentiment_tier(payload)
+    max_tokens = settings.VOICE_SENTIMENT_LLM_MAX_TOKENS
+
+    if tier == "full":
+        messages = await _sentiment_messages(payload)
+        return sse_response(request, mistral_chat_stream(messages=messages, temperature=0.2, max_tokens=max_tokens), {"tier": "full"})
+
+    report = await _local_sentiment(payload)
+    extra = {"local": report.summary(), "findings": report.findings()}
+    if tier == "local" or not report.windows:
+        return sse_response(request, _once(report.describe()), {"tier": "local", **extra})
+
+    messages = window_messages(report, _sentiment_prompt(payload))
+    deltas = _prefixed(
+        f"{report.describe()}\n\n[llm] Flagged windows:\n\n",
+        mistral_chat_stream(messages=messages, temperature=0.2, max_tokens=max_tokens),
+    )
+    return sse_response(request, deltas, {"tier": "llm", **extra})
+
+
+@router.post("/api/voice/sentiment/batch")
+async def voice_sentiment_batch(payload: dict = Body(...)):
+    """
+    Local-tier sentiment for many stored transcripts at once (one vectorized pass).
+    payload: {"audio_ids": ["...", ...], "findings": false}
+    Returns: {"results": [{"audio_id", "local", "needs_review", "windows", "findings"?}], "missing": [...]}
+
+    needs_review marks transcripts with flagged windows; send those to /api/voice/sentiment
+    for the LLM tier.
+    """
+    audio_ids = [str(a).strip() for a in payload.get("audio_ids") or [] if str(a).strip()]
+    if not audio_ids:
+        raise HTTPException(status_code=400, detail="audio_ids is required.")
+    if len(audio_ids) > settings.VOICE_SENTIMENT_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {settings.VOICE_SENTIMENT_BATCH_MAX} audio_ids per batch.")
+    audio_ids = list(dict.fromkeys(audio_ids))
+
+    by_id = await load_segments_many(audio_ids)
+    items, found, missing = [], [], []
+    for audio_id in audio_ids:
+        if audio_id in by_id:
+            items.append((by_id[audio_id], ""))
+            found.append(audio_id)
+            continue
+        # Transcripts stored without timestamps are scored per sentence
+        item = await document_store.load(audio_id, "audio")
+        if item is None:
+            missing.append(audio_id)
+        else:
+            items.append(([], item.content))
+            found.append(audio_id)
+
+    reports = await run_in_threadpool(local_reports, items)
+    results = []
+    for audio_id, report in zip(found, reports):
+        windows = report.windows
+        entry = {
+            "audio_id": audio_id,
+            "local": report.summary(),
+            "needs_review": bool(windows),
+            "windows": [
+                {
+                    "first": report.segments[a].ord,
+                    "last": report.segments[b].ord,
+                    "start": report.segments[a].start if report.timed else None,
+                    "end": report.segments[b].end if report.timed else None,
+                }
+                for a, b in windows
+            ],
+        }
+        if payload.get("findings"):
+            entry["findings"] = report.findings()
+        results.append(entry)
+    return JSONResponse({"results": results, "missing": missing})
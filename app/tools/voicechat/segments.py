@@ -0,0 +1,310 @@
+# app/tools/voicechat/segments.py
+"""
+Timestamped, diarized transcript segments and the index voice Q&A selects from.
+
+Segments (speaker, start, end, text) are stored per audio_id in Postgres
+(TranscriptSegment). A SegmentIndex filters them by speaker and time range and ranks them
+by keyword with BM25 (app/services/rag/lexical.py), so a question like
+"what did speaker 1 say about refunds after minute 10" sends only the matching segments,
+each prefixed with its timestamp for citation.
+
+Speaker labels are whatever Voxtral returned (e.g. "speaker_1"); questions match them by
+label or by "speaker N". A number is only read as a time with an explicit marker
+("minute 10", "10 min", "10m", "12:30"), so "charged from 2 cards" is not a time filter.
+"""
+
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.models.transcript_segment import (
+    TranscriptSegment,
+    delete_segments,
+    get_segments,
+    get_segments_for,
+    replace_segments,
+)
+from app.db.session import SessionLocal
+from app.services.rag.chunking import count_tokens
+from app.services.rag.lexical import Bm25Index
+
+_INDEX_CACHE_ITEMS = 32
+
+_NUM = r"(\d+(?::\d{1,2})?)"
+_UNIT = r"(?:\s*(?:minutes?|mins?|m)\b)?"
+_AFTER_RE = re.compile(rf"\b(?:after|since|from|past)\s+(?:the\s+)?(?:minute|min)?\s*{_NUM}{_UNIT}", re.I)
+_BEFORE_RE = re.compile(rf"\b(?:before|until|till|up to|by)\s+(?:the\s+)?(?:minute|min)?\s*{_NUM}{_UNIT}", re.I)
+_BETWEEN_RE = re.compile(rf"\bbetween\s+(?:minutes?|mins?)?\s*{_NUM}{_UNIT}\s+and\s+(?:minute|min)?\s*{_NUM}{_UNIT}", re.I)
+_AROUND_RE = re.compile(rf"\b(?:at|around|near)\s+(?:minute|min)\s*{_NUM}|\b(?:at|around|near)\s+(\d+:\d{{1,2}})", re.I)
+_FIRST_RE = re.compile(r"\bfirst\s+(\d+)\s*(?:minutes?|mins?)\b", re.I)
+_LAST_RE = re.compile(r"\blast\s+(\d+)\s*(?:minutes?|mins?)\b", re.I)
+_SPEAKER_NUM_RE = re.compile(r"\bspeaker\s*[_#-]?\s*(\d+)\b", re.I)
+# What makes a matched number a time rather than a count ("after 2 cards")
+_TIME_MARKER_RE = re.compile(r"\bmin|\dm\b|\d:\d", re.I)
+
+
+@dataclass(frozen=True)
+class Segment:
+    ord: int
+    start: float
+    end: float
+    text: str
+    speaker: str | None = None
+
+
+def fmt_ts(seconds: float) -> str:
+    seconds = int(seconds)
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m:02d}:{s:02d}"
+
+
+def _to_seconds(value: str) -> float:
+    """'10' -> 600 (minutes), '12:30' -> 750 (mm:ss)."""
+    if ":" in value:
+        m, s = value.split(":", 1)
+        return int(m) * 60 + int(s)
+    return int(value) * 60
+
+
+def _timed(pattern: re.Pattern, text: str) -> re.Match | None:
+    """First match of pattern that carries an explicit time marker."""
+    return next((m for m in pattern.finditer(text) if _TIME_MARKER_RE.search(m.group(0))), None)
+
+
+def _strip_timed(m: re.Match) -> str:
+    return " " if _TIME_MARKER_RE.search(m.group(0)) else m.group(0)
+
+
+def _keywords(question: str) -> str:
+    """
+    The question minus its time / speaker phrases (their numbers would match unrelated
+    segments), plus naive singulars ("refunds" -> "refund") so plurals hit BM25 terms.
+    """
+    text = question.lower()
+    for pattern in (_BETWEEN_RE, _AFTER_RE, _BEFORE_RE, _AROUND_RE, _FIRST_RE, _LAST_RE):
+        text = pattern.sub(_strip_timed, text)
+    text = _SPEAKER_NUM_RE.sub(" ", text)
+    extra = [w[:-1] for w in re.findall(r"[a-z]{4,}s\b", text) if not w.endswith("ss")]
+    return f"{text} {' '.join(extra)}" if extra else text
+
+
+def normalize_segments(raw_segments: list[dict]) -> list[Segment]:
+    """Voxtral / stitched segment dicts -> Segments (drops entries without times or text)."""
+    out: list[Segment] = []
+    for seg in raw_segments:
+        text = (seg.get("text") or "").strip()
+        start, end = seg.get("start"), seg.get("end")
+        if not text or not isinstance(start, (int, float)) or not isinstance(end, (int, float)):
+            continue
+        speaker = seg.get("speaker") or seg.get("speaker_id")
+        out.append(Segment(
+            ord=len(out),
+            start=float(start),
+            end=float(end),
+            text=text,
+            speaker=str(speaker) if speaker is not None else None,
+        ))
+    return out
+
+
+def format_segments(segments: list[Segment]) -> str:
+    lines = []
+    for s in segments:
+        who = f" {s.speaker}:" if s.speaker else ""
+        lines.append(f"[{fmt_ts(s.start)}-{fmt_ts(s.end)}]{who} {s.text}")
+    return "\n".join(lines)
+
+
+@dataclass
+class QuestionFilters:
+    speaker: str | None = None
+    start: float | None = None
+    end: float | None = None
+
+    @property
+    def active(self) -> bool:
+        return self.speaker is not None or self.start is not None or self.end is not None
+
+
+class SegmentIndex:
+    def __init__(self, segments: list[Segment]):
+        self.segments = segments
+        self.speakers = sorted({s.speaker for s in segments if s.speaker})
+        self.duration = max((s.end for s in segments), default=0.0)
+        self._bm25 = Bm25Index.build([s.text for s in segments])
+
+    def parse_filters(self, question: str) -> QuestionFilters:
+        f = QuestionFilters()
+        q = question.lower()
+
+        m = _timed(_BETWEEN_RE, q)
+        if m:
+            f.start, f.end = _to_seconds(m.group(1)), _to_seconds(m.group(2))
+        else:
+            if m := _timed(_AFTER_RE, q):
+                f.start = _to_seconds(m.group(1))
+            if m := _timed(_BEFORE_RE, q):
+                f.end = _to_seconds(m.group(1))
+            if m := _AROUND_RE.search(q):
+                at = _to_seconds(m.group(1) or m.group(2))
+                f.start, f.end = max(0.0, at - 60), at + 60
+            if m := _FIRST_RE.search(q):
+                f.end = int(m.group(1)) * 60
+            if m := _LAST_RE.search(q):
+                f.start = max(0.0, self.duration - int(m.group(1)) * 60)
+
+        for label in self.speakers:
+            names = {label.lower(), label.lower().replace("_", " ")}
+            # Whole label only: "speaker_1" must not match "speaker_10"
+            if any(re.search(rf"(?<!\w){re.escape(name)}(?!\w)", q) for name in names):
+                f.speaker = label
+                break
+        if f.speaker is None and (m := _SPEAKER_NUM_RE.search(q)):
+            num = m.group(1)
+            f.speaker = next((s for s in self.speakers if re.search(rf"(?<!\d){num}$", s)), None)
+        return f
+
+    def query(
+        self,
+        speaker: str | None = None,
+        start: float | None = None,
+        end: float | None = None,
+        keywords: str | None = None,
+        limit: int | None = None,
+    ) -> list[Segment]:
+        """Segments matching every given filter; keyword hits best first, else chronological."""
+        def keep(s: Segment) -> bool:
+            return (
+                (speaker is None or s.speaker == speaker)
+                and (start is None or s.end > start)
+                and (end is None or s.start < end)
+            )
+
+        if keywords:
+            hits = self._bm25.search(keywords, k=len(self.segments), min_ratio=settings.RAG_BM25_MIN_RATIO)
+            out = [self.segments[i] for i, _score in hits if keep(self.segments[i])]
+        else:
+            out = [s for s in self.segments if keep(s)]
+        return out[:limit] if limit else out
+
+    def select_for_question(self, question: str, budget_tokens: int) -> tuple[list[Segment], QuestionFilters]:
+        """
+        Segments to send for a question, in time order, within budget_tokens.
+        The whole transcript fits -> all of it, unfiltered (a misread filter must not hide the
+        answer; the model still sees the question and every timestamp). Otherwise the filtered
+        segments ranked by keyword relevance, plus neighbouring segments for context while
+        budget remains.
+        """
+        if sum(count_tokens(s.text) for s in self.segments) <= budget_tokens:
+            return list(self.segments), QuestionFilters()
+
+        filters = self.parse_filters(question)
+        candidates = self.query(filters.speaker, filters.start, filters.end)
+        if not candidates and filters.active:
+            candidates = self.segments  # the filter matched nothing; fall back to keywords only
+
+        if sum(count_tokens(s.text) for s in candidates) <= budget_tokens:
+            return candidates, filters
+
+        allowed = {s.ord for s in candidates}
+        ranked = [s for s in self.query(keywords=_keywords(question)) if s.ord in allowed] or candidates
+        chosen: set[int] = set()
+        used = 0
+
+        def take(o: int) -> None:
+            nonlocal used
+            if o in chosen or not 0 <= o < len(self.segments):
+                return
+            cost = count_tokens(self.segments[o].text)
+            if used + cost <= budget_tokens:
+                chosen.add(o)
+                used += cost
+
+        # Best matches first, then one neighbour on each side for context while budget remains
+        for seg in ranked:
+            take(seg.ord)
+        for seg in ranked:
+            take(seg.ord - 1)
+            take(seg.ord + 1)
+        return [self.segments[o] for o in sorted(chosen)], filters
+
+
+# ----------------------------
+# Storage (Postgres + small LRU of built indexes)
+# ----------------------------
+_indexes: OrderedDict[str, SegmentIndex] = OrderedDict()
+
+
+def _remember(audio_id: str, index: SegmentIndex) -> None:
+    _indexes[audio_id] = index
+    _indexes.move_to_end(audio_id)
+    while len(_indexes) > _INDEX_CACHE_ITEMS:
+        _indexes.popitem(last=False)
+
+
+async def save_segments(audio_id: str, segments: list[Segment]) -> None:
+    def _save():
+        with SessionLocal() as db:
+            replace_segments(db, audio_id, [
+                TranscriptSegment(
+                    audio_id=audio_id,
+                    ord=s.ord,
+                    speaker=s.speaker,
+                    start=s.start,
+                    end=s.end,
+                    text=s.text,
+                )
+                for s in segments
+            ])
+
+    await run_in_threadpool(_save)
+    _indexes.pop(audio_id, None)
+
+
+async def load_segment_index(audio_id: str) -> SegmentIndex | None:
+    index = _indexes.get(audio_id)
+    if index is not None:
+        _indexes.move_to_end(audio_id)
+        return index
+
+    def _load():
+        with SessionLocal() as db:
+            return [
+                Segment(ord=r.ord, start=r.start, end=r.end, text=r.text, speaker=r.speaker)
+                for r in get_segments(db, audio_id)
+            ]
+
+    segments = await run_in_threadpool(_load)
+    if not segments:
+        return None
+    index = await run_in_threadpool(SegmentIndex, segments)
+    _remember(audio_id, index)
+    return index
+
+
+async def load_segments_many(audio_ids: list[str]) -> dict[str, list[Segment]]:
+    """Segments of several transcripts in one query (ids without segments are absent)."""
+    def _load():
+        out: dict[str, list[Segment]] = {}
+        with SessionLocal() as db:
+            for r in get_segments_for(db, audio_ids):
+                out.setdefault(r.audio_id, []).append(
+                    Segment(ord=r.ord, start=r.start, end=r.end, text=r.text, speaker=r.speaker)
+                )
+        return out
+
+    return await run_in_threadpool(_load)
+
+
+async def delete_segment_index(audio_id: str) -> None:
+    _indexes.pop(audio_id, None)
+
+    def _delete():
+        with SessionLocal() as db:
+            delete_segments(db, audio_id)
+
+    await run_in_threadpool(_delete)
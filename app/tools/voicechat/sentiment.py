@@ -0,0 +1,407 @@
+# app/tools/voicechat/sentiment.py
+"""
+Two-tier sentiment analysis for voice transcripts.
+
+Tier 1 ("local") scores every transcript segment with lexicons and a few rules: polarity
+words (flipped by a preceding negator, boosted by an intensifier), escalation words and
+phrases ("speak to a manager", "cancel my account"), abusive language, shouting (ALL CAPS)
+and exclamation runs. Tokenization is a Python pass over the text; the scoring itself is
+one set of NumPy matrix products over all segments, so a batch of many transcripts costs
+the same few array operations as one.
+
+Tier 2 ("llm") only sees the windows tier 1 flagged (flagged segments plus
+VOICE_SENTIMENT_CONTEXT_SEGMENTS neighbours each side). A call with nothing flagged never
+reaches the LLM.
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.ocr.mistral import mistral_chat
+from app.services.rag.chunking import count_tokens
+from app.tools.voicechat.segments import Segment, fmt_ts, format_segments
+
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z']*")
+_SENTENCE_RE = re.compile(r"[^.!?\n]+[.!?]*")
+_CLAUSE_RE = re.compile(r"[,.;:!?\n]+")
+_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+# word -> weight (positive / negative polarity)
+_POSITIVE = {
+    "thanks": 1.0, "thank": 1.0, "great": 1.5, "good": 1.0, "excellent": 2.0, "perfect": 1.5,
+    "happy": 1.5, "glad": 1.2, "appreciate": 1.5, "appreciated": 1.5, "helpful": 1.5,
+    "wonderful": 2.0, "awesome": 1.8, "amazing": 1.8, "love": 1.5, "pleased": 1.5,
+    "resolved": 1.2, "fixed": 1.0, "works": 0.8, "working": 0.6, "nice": 1.0, "fine": 0.5,
+    "sure": 0.3, "fantastic": 2.0, "satisfied": 1.5, "easy": 0.8, "quick": 0.6, "sorted": 1.0,
+}
+_NEGATIVE = {
+    "bad": 1.2, "terrible": 2.0, "awful": 2.0, "horrible": 2.0, "worst": 2.2, "angry": 1.8,
+    "upset": 1.5, "frustrated": 1.8, "frustrating": 1.8, "annoyed": 1.5, "annoying": 1.5,
+    "disappointed": 1.8, "disappointing": 1.8, "problem": 0.8, "problems": 0.8, "issue": 0.5,
+    "broken": 1.2, "wrong": 1.0, "failed": 1.2, "fail": 1.0, "useless": 2.0, "ridiculous": 2.0,
+    "unacceptable": 2.2, "waste": 1.5, "wasted": 1.5, "waiting": 0.6, "delay": 0.8,
+    "late": 0.6, "unhappy": 1.8, "poor": 1.2, "hate": 2.0, "sucks": 1.8,
+    "confused": 0.8, "charged": 0.6, "overcharged": 1.8, "scam": 2.2, "rude": 1.8,
+    "incompetent": 2.2, "nonsense": 1.5, "sick": 0.8, "tired": 0.8, "complain": 1.2,
+}
+_ESCALATION = {
+    "manager": 1.0, "supervisor": 1.0, "lawyer": 1.5, "attorney": 1.5, "sue": 1.5,
+    "legal": 1.0, "complaint": 1.0, "ombudsman": 1.5, "regulator": 1.2, "chargeback": 1.2,
+    "unacceptable": 0.8, "cancel": 0.6, "escalate": 1.2, "refund": 0.4, "demand": 0.8,
+}
+_ESCALATION_PHRASES = re.compile(
+    r"\b(?:speak|talk)\s+(?:to|with)\s+(?:a|the|your|someone)\s*(?:manager|supervisor|boss|someone else)"
+    r"|\bcancel\s+(?:my|the|this)\s+(?:account|subscription|contract|order|service)"
+    r"|\b(?:file|make|lodge|raise)\s+a\s+(?:formal\s+)?complaint"
+    r"|\b(?:last|final)\s+time\b"
+    r"|\bfed\s+up\b"
+    r"|\bthis\s+is\s+(?:ridiculous|unacceptable|a\s+joke)"
+    r"|\bi(?:'m|\s+am)\s+(?:done|leaving|switching)"
+    r"|\b(?:social\s+media|the\s+press|my\s+bank)\b",
+    re.I,
+)
+_ABUSIVE = {
+    "idiot": 1.0, "idiots": 1.0, "stupid": 1.0, "moron": 1.0, "morons": 1.0, "dumb": 0.8,
+    "shut": 0.5, "damn": 0.5, "crap": 0.7, "hell": 0.4, "bullshit": 1.0, "shit": 1.0,
+    "fuck": 1.5, "fucking": 1.5, "fucked": 1.5, "bitch": 1.5, "bastard": 1.5,
+    "asshole": 1.5, "jerk": 0.8, "pathetic": 0.8, "clown": 0.6, "loser": 0.8,
+}
+_ABUSIVE_PHRASES = re.compile(r"\bshut\s+up\b|\bscrew\s+you\b|\bgo\s+to\s+hell\b", re.I)
+
+_NEGATORS = {
+    "not", "no", "never", "don't", "dont", "doesn't", "didn't", "isn't", "wasn't", "aren't",
+    "won't", "can't", "cannot", "couldn't", "wouldn't", "hardly", "nothing", "without",
+}
+_INTENSIFIERS = {"very", "really", "so", "extremely", "totally", "absolutely", "completely", "super"}
+_NEGATION_SPAN = 3  # a negator flips polarity words up to this many tokens after it
+
+_VOCAB = sorted(set(_POSITIVE) | set(_NEGATIVE) | set(_ESCALATION) | set(_ABUSIVE))
+_VOCAB_ID = {w: i for i, w in enumerate(_VOCAB)}
+_POLARITY_W = np.array([_POSITIVE.get(w, 0.0) - _NEGATIVE.get(w, 0.0) for w in _VOCAB], dtype=np.float32)
+_ESCALATION_W = np.array([_ESCALATION.get(w, 0.0) for w in _VOCAB], dtype=np.float32)
+_ABUSIVE_W = np.array([_ABUSIVE.get(w, 0.0) for w in _VOCAB], dtype=np.float32)
+
+FLAG_TYPES = ("negative", "escalation", "abusive")
+
+
+@dataclass
+class SegmentScores:
+    """Tier-1 scores, one entry per segment (arrays of length n)."""
+    sentiment: np.ndarray   # [-1, 1]
+    escalation: np.ndarray  # >= 0; >= 1 flags
+    abusive: np.ndarray     # >= 0; >= 1 flags
+    shouting: np.ndarray    # share of ALL CAPS words
+    tokens: np.ndarray
+    evidence: list[list[str]] = field(default_factory=list)
+
+    @property
+    def flags(self) -> dict[str, np.ndarray]:
+        shouting = (self.shouting >= 0.5) & (self.tokens >= 3)
+        return {
+            "negative": self.sentiment <= settings.VOICE_SENTIMENT_NEGATIVE_THRESHOLD,
+            "escalation": (self.escalation >= 1.0) | shouting,
+            "abusive": self.abusive >= 1.0,
+        }
+
+    @property
+    def flagged(self) -> np.ndarray:
+        f = self.flags
+        return f["negative"] | f["escalation"] | f["abusive"]
+
+    def slice(self, a: int, b: int) -> "SegmentScores":
+        return SegmentScores(
+            sentiment=self.sentiment[a:b],
+            escalation=self.escalation[a:b],
+            abusive=self.abusive[a:b],
+            shouting=self.shouting[a:b],
+            tokens=self.tokens[a:b],
+            evidence=self.evidence[a:b],
+        )
+
+
+def segments_from_text(transcript: str) -> list[Segment]:
+    """Sentence pseudo-segments for transcripts stored without timestamps (start = end = 0)."""
+    sentences = [s.strip() for s in _SENTENCE_RE.findall(transcript or "")]
+    return [Segment(ord=i, start=0.0, end=0.0, text=s) for i, s in enumerate(x for x in sentences if x)]
+
+
+def score_texts(texts: list[str]) -> SegmentScores:
+    """Tier-1 scores for many texts at once."""
+    n = len(texts)
+    rows: list[int] = []
+    cols: list[int] = []
+    signs: list[float] = []
+    n_tokens = np.zeros(n, dtype=np.float32)
+    caps = np.zeros(n, dtype=np.float32)
+    exclaims = np.zeros(n, dtype=np.float32)
+    esc_phrases = np.zeros(n, dtype=np.float32)
+    abuse_phrases = np.zeros(n, dtype=np.float32)
+    evidence: list[list[str]] = []
+
+    for i, text in enumerate(texts):
+        words = _WORD_RE.findall(text)
+        n_tokens[i] = len(words)
+        caps[i] = sum(1 for w in words if len(w) >= 3 and w.isupper())
+        exclaims[i] = text.count("!")
+        phrases = _ESCALATION_PHRASES.findall(text)
+        esc_phrases[i] = len(phrases)
+        abusive = _ABUSIVE_PHRASES.findall(text)
+        abuse_phrases[i] = len(abusive)
+        hits = [p.lower() for p in phrases + abusive]
+
+        for clause in _CLAUSE_RE.split(text):  # negation never crosses a comma / full stop
+            negated_until = -1
+            boost = 1.0
+            for j, w in enumerate(_WORD_RE.findall(clause)):
+                lw = w.lower()
+                if lw in _NEGATORS:
+                    negated_until = j + _NEGATION_SPAN
+                    continue
+                if lw in _INTENSIFIERS:
+                    boost = 1.5
+                    continue
+                col = _VOCAB_ID.get(lw)
+                if col is not None:
+                    negated = j <= negated_until
+                    rows.append(i)
+                    cols.append(col)
+                    signs.append((-1.0 if negated else 1.0) * boost)
+                    hits.append(f"not {lw}" if negated else lw)
+                boost = 1.0
+        evidence.append(hits)
+
+    counts = np.zeros((n, len(_VOCAB)), dtype=np.float32)  # unsigned term counts
+    signed = np.zeros((n, len(_VOCAB)), dtype=np.float32)  # negation/intensity applied
+    if rows:
+        r, c, s = np.array(rows), np.array(cols), np.array(signs, dtype=np.float32)
+        np.add.at(counts, (r, c), 1.0)
+        np.add.at(signed, (r, c), s)
+
+    length = np.sqrt(np.maximum(n_tokens, 1.0))
+    sentiment = np.tanh(signed @ _POLARITY_W / length)
+    # Exclamation runs sharpen whichever way the segment already leans
+    sentiment = np.clip(sentiment * (1.0 + 0.15 * np.minimum(exclaims, 3)), -1.0, 1.0)
+    shouting = caps / np.maximum(n_tokens, 1.0)
+    escalation = counts @ _ESCALATION_W + esc_phrases + 0.25 * np.maximum(exclaims - 1, 0)
+    abusive = counts @ _ABUSIVE_W + abuse_phrases
+    return SegmentScores(
+        sentiment=sentiment.astype(np.float32),
+        escalation=escalation.astype(np.float32),
+        abusive=abusive.astype(np.float32),
+        shouting=shouting.astype(np.float32),
+        tokens=n_tokens,
+        evidence=evidence,
+    )
+
+
+def _label(value: float) -> str:
+    if value >= 0.2:
+        return "positive"
+    if value <= -0.2:
+        return "negative"
+    return "neutral"
+
+
+def flagged_windows(flagged: np.ndarray, context: int) -> list[tuple[int, int]]:
+    """[first, last] segment ranges around flagged segments, merged when they touch."""
+    if not flagged.any():
+        return []
+    kernel = np.ones(2 * context + 1, dtype=np.int8)
+    wide = np.convolve(flagged.astype(np.int8), kernel, mode="same") > 0
+    edges = np.diff(np.concatenate(([0], wide.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    return [(int(a), int(b)) for a, b in zip(starts, ends)]
+
+
+@dataclass
+class LocalReport:
+    segments: list[Segment]
+    scores: SegmentScores
+    timed: bool = True
+
+    @property
+    def windows(self) -> list[tuple[int, int]]:
+        return flagged_windows(self.scores.flagged, settings.VOICE_SENTIMENT_CONTEXT_SEGMENTS)
+
+    def summary(self) -> dict:
+        s = self.scores
+        n = len(self.segments)
+        weights = np.maximum(s.tokens, 1.0)
+        overall = float(np.average(s.sentiment, weights=weights)) if n else 0.0
+        third = max(1, n // 3)
+        early = float(np.average(s.sentiment[:third], weights=weights[:third])) if n else 0.0
+        late = float(np.average(s.sentiment[-third:], weights=weights[-third:])) if n else 0.0
+        flags = s.flags
+        label = _label(overall)
+        if label == "neutral" and (s.sentiment >= 0.2).any() and (s.sentiment <= -0.2).any():
+            label = "mixed"
+        return {
+            "overall": label,
+            "score": round(overall, 3),
+            "trajectory": {"early": round(early, 3), "late": round(late, 3), "delta": round(late - early, 3)},
+            "segments": n,
+            "flagged_segments": int(self.scores.flagged.sum()),
+            "counts": {k: int(flags[k].sum()) for k in FLAG_TYPES},
+            "windows": len(self.windows),
+        }
+
+    def findings(self) -> list[dict]:
+        flags = self.scores.flags
+        out = []
+        for i in np.flatnonzero(self.scores.flagged):
+            seg = self.segments[i]
+            out.append({
+                "tier": "local",
+                "types": [k for k in FLAG_TYPES if flags[k][i]],
+                "ord": seg.ord,
+                "start": seg.start if self.timed else None,
+                "end": seg.end if self.timed else None,
+                "speaker": seg.speaker,
+                "text": seg.text,
+                "sentiment": round(float(self.scores.sentiment[i]), 3),
+                "evidence": self.scores.evidence[i],
+            })
+        return out
+
+    def window_text(self, budget_tokens: int) -> str:
+        """Flagged windows for the LLM, most severe first until budget_tokens, in time order."""
+        windows = self.windows
+        s = self.scores
+        severity = [
+            float(-s.sentiment[a:b + 1].min() + s.escalation[a:b + 1].sum() + 2 * s.abusive[a:b + 1].sum())
+            for a, b in windows
+        ]
+        chosen, used = [], 0
+        for k in np.argsort(severity)[::-1]:
+            a, b = windows[k]
+            cost = sum(count_tokens(seg.text) for seg in self.segments[a:b + 1])
+            if used + cost > budget_tokens and chosen:
+                continue
+            chosen.append((a, b))
+            used += cost
+        blocks = []
+        for n, (a, b) in enumerate(sorted(chosen), 1):
+            segs = self.segments[a:b + 1]
+            if self.timed:
+                body = format_segments(segs)
+                where = f"{fmt_ts(segs[0].start)}-{fmt_ts(segs[-1].end)}"
+            else:
+                body = "\n".join(seg.text for seg in segs)
+                where = f"sentences {a + 1}-{b + 1}"
+            blocks.append(f"--- WINDOW {n} ({where}) ---\n{body}")
+        return "\n\n".join(blocks)
+
+    def describe(self, llm_findings: list[dict] | None = None, llm_summary: str = "") -> str:
+        """Plain-text rendering of both tiers, each finding tagged with the tier that produced it."""
+        summ = self.summary()
+        traj = summ["trajectory"]
+        lines = [
+            f"Overall sentiment (local): {summ['overall']} ({summ['score']:+.2f})",
+            f"Tone progression: {_label(traj['early'])} early -> {_label(traj['late'])} late",
+            f"Flagged segments: {summ['flagged_segments']} of {summ['segments']} "
+            f"(negative {summ['counts']['negative']}, escalation {summ['counts']['escalation']}, "
+            f"abusive {summ['counts']['abusive']})",
+        ]
+        for f in self.findings()[:20]:
+            where = f"[{fmt_ts(f['start'])}] " if f["start"] is not None else ""
+            lines.append(f"- [local] {where}{', '.join(f['types'])}: {f['text'][:160]}")
+        for f in llm_findings or []:
+            where = f"[{f['timestamp']}] " if f.get("timestamp") else ""
+            severity = f" ({f['severity']})" if f.get("severity") else ""
+            evidence = f' "{f["evidence"]}"' if f.get("evidence") else ""
+            lines.append(f"- [llm] {where}{f.get('type', 'finding')}{severity}: {f.get('explanation', '')}{evidence}")
+        if llm_summary:
+            lines.append(f"Summary (llm): {llm_summary}")
+        return "\n".join(lines)
+
+
+def local_report(segments: list[Segment], transcript: str = "") -> LocalReport:
+    if segments:
+        return LocalReport(segments, score_texts([s.text for s in segments]), timed=True)
+    pseudo = segments_from_text(transcript)
+    return LocalReport(pseudo, score_texts([s.text for s in pseudo]), timed=False)
+
+
+def local_reports(items: list[tuple[list[Segment], str]]) -> list[LocalReport]:
+    """Batch scoring: all segments of all transcripts go through one score_texts call."""
+    prepared = [(segs, True) if segs else (segments_from_text(text), False) for segs, text in items]
+    scores = score_texts([s.text for segs, _ in prepared for s in segs])
+    out, at = [], 0
+    for segs, timed in prepared:
+        out.append(LocalReport(segs, scores.slice(at, at + len(segs)), timed=timed))
+        at += len(segs)
+    return out
+
+
+# ----------------------------
+# Tier 2 (LLM on flagged windows)
+# ----------------------------
+SENTIMENT_SYSTEM = (
+    "You are an expert conversation analyst. "
+    "Stay grounded in the transcript; do not invent details."
+)
+
+WINDOW_FINDINGS_PROMPT = (
+    "A local pre-scan flagged the transcript windows below for negative sentiment, escalation "
+    "or abusive language. Review each window and return ONLY a JSON object: "
+    '{"findings": [{"window": 1, "type": "negative|escalation|abusive|risk|none", '
+    '"severity": "low|medium|high", "timestamp": "mm:ss or null", "evidence": "short quote", '
+    '"explanation": "one sentence"}], "summary": "two sentences on the call overall"}. '
+    'Use type "none" for windows that are false alarms.'
+)
+
+
+def window_context(report: LocalReport) -> str:
+    summ = report.summary()
+    traj = summ["trajectory"]
+    return (
+        f"LOCAL PRE-SCORE: overall {summ['overall']} ({summ['score']:+.2f}), "
+        f"{_label(traj['early'])} early -> {_label(traj['late'])} late; "
+        f"{summ['flagged_segments']} of {summ['segments']} segments flagged.\n\n"
+        f"FLAGGED WINDOWS:\n\n{report.window_text(settings.VOICE_SENTIMENT_WINDOW_TOKENS)}"
+    )
+
+
+def window_messages(report: LocalReport, prompt: str) -> list[dict]:
+    """Messages asking the LLM to analyze only the flagged windows (free-form answer)."""
+    return [
+        {"role": "system", "content": SENTIMENT_SYSTEM},
+        {
+            "role": "user",
+            "content": (
+                f"{prompt}\n\nOnly the windows a local pre-scan flagged are included; the rest of "
+                f"the call scored neutral or positive.\n\n{window_context(report)}"
+            ),
+        },
+    ]
+
+
+async def llm_window_findings(report: LocalReport, prompt: str | None = None) -> tuple[list[dict], str]:
+    """Tier-2 findings (each tagged tier "llm") and the LLM's call summary."""
+    extra = f"\n\nAnalyst instructions: {prompt}" if prompt else ""
+    text = await mistral_chat(
+        messages=[
+            {"role": "system", "content": SENTIMENT_SYSTEM},
+            {"role": "user", "content": f"{WINDOW_FINDINGS_PROMPT}{extra}\n\n{window_context(report)}"},
+        ],
+        temperature=0.0,
+        max_tokens=settings.VOICE_SENTIMENT_LLM_MAX_TOKENS,
+    )
+    match = _JSON_RE.search(text or "")
+    try:
+        data = json.loads(match.group(0)) if match else {}
+    except json.JSONDecodeError:
+        data = {}
+    if not isinstance(data, dict) or not isinstance(data.get("findings"), list):
+        return [{"tier": "llm", "type": "analysis", "explanation": (text or "").strip()}], ""
+    findings = [
+        {"tier": "llm", **f}
+        for f in data["findings"]
+        if isinstance(f, dict) and f.get("type") != "none"
+    ]
+    return findings, str(data.get("summary") or "")
@@ -3,70 +3,144 @@
 Voice Intelligence service layer.
 
 - Transcription: Mistral Audio Transcriptions endpoint (Voxtral).
-- LLM: Mistral Chat Completions (for Q&A + sentiment analysis).
+- LLM: Mistral Chat Completions (for Q&A + sentiment analysis) via the shared client in
+  app/services/ocr/mistral.py.
 
 Notes:
-- For demo/MVP we return plain transcript text. Later you can store transcript server-side by audio_id.
+- Transcripts are stored server-side by audio_id (app/services/storage/documents.py).
 - Voxtral endpoint supports options like diarize and timestamp granularities; keep minimal for now.
+- Audio is normalized before upload (preprocess_audio): mono, 16 kHz, silences trimmed.
+- Long recordings are cut at silences and transcribed concurrently (voxtral_transcribe_long).
 """
 
-import requests
+import asyncio
+import json
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
 from app.core.config import settings
+from app.core.metrics import stage
+from app.services.audio.decode import AudioDecodeError, DecodedAudio, decode_audio, encode_wav
+from app.services.audio.vad import FRAME_MS, frame_levels_db, plan_segments, silent_runs, speech_mask
+from app.services.ocr.admission import MistralUnavailable
+from app.services.ocr.mistral import get_mistral_client, is_transient
 
-MISTRAL_CHAT_URL = "https://api.mistral.ai/v1/chat/completions"
-MISTRAL_AUDIO_TRANSCRIBE_URL = "https://api.mistral.ai/v1/audio/transcriptions"
+logger = logging.getLogger(__name__)
 
+# Progress events, in order:
+#   {"stage": "segments", "segments": K, "duration": seconds}
+#   {"stage": "segment", "start": s, "end": e, "completed": i, "total": K}
+ProgressCallback = Callable[[dict], Awaitable[None]]
 
-def _auth_headers_json() -> dict:
-    api_key = getattr(settings, "MISTRAL_API_KEY", None)
-    if not api_key:
-        raise ValueError("MISTRAL_API_KEY is not set")
-    return {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-    }
 
+# ----------------------------
+# Audio preprocessing (NumPy)
+# ----------------------------
+@dataclass
+class PreparedAudio:
+    audio: DecodedAudio
+    # (start, end) seconds of the original recording that were kept, in order
+    kept: list[tuple[float, float]]
+    report: dict
 
-def _auth_headers_multipart() -> dict:
-    api_key = getattr(settings, "MISTRAL_API_KEY", None)
-    if not api_key:
-        raise ValueError("MISTRAL_API_KEY is not set")
-    # IMPORTANT: do NOT set Content-Type manually for multipart; requests will set boundary.
-    return {
-        "Authorization": f"Bearer {api_key}",
-        "Accept": "application/json",
-    }
+    def to_original(self, t: float) -> float:
+        """Map a time in the trimmed audio back to the original recording."""
+        elapsed = 0.0
+        for start, end in self.kept:
+            if t <= elapsed + (end - start):
+                return start + (t - elapsed)
+            elapsed += end - start
+        return self.kept[-1][1] if self.kept else t
 
 
-def mistral_chat(messages, model=None, temperature=0.2, max_tokens=800):
+def resample_audio(samples: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
     """
-    messages format:
-    [
-      {"role": "system", "content": "..."},
-      {"role": "user", "content": "..."}
-    ]
+    Downsample with a moving-average anti-alias filter + linear interpolation.
+    Cheap and O(n); plenty for speech recognition input.
     """
-    payload = {
-        "model": model or getattr(settings, "MISTRAL_CHAT_MODEL", "mistral-small-latest"),
-        "messages": messages,
-        "temperature": temperature,
-        "max_tokens": max_tokens,
-    }
+    if src_rate == dst_rate or not len(samples):
+        return samples
+    if src_rate > dst_rate:
+        width = max(1, round(src_rate / dst_rate))
+        if width > 1:
+            csum = np.cumsum(np.concatenate(([0.0], samples)), dtype=np.float64)
+            smoothed = (csum[width:] - csum[:-width]) / width
+            # Centre the window so the filter adds no delay
+            samples = np.concatenate((
+                np.full(width // 2, smoothed[0]),
+                smoothed,
+                np.full(width - 1 - width // 2, smoothed[-1]),
+            )).astype(np.float32)
+    n_out = int(round(len(samples) * dst_rate / src_rate))
+    positions = np.arange(n_out, dtype=np.float64) * (src_rate / dst_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
 
-    r = requests.post(MISTRAL_CHAT_URL, json=payload, headers=_auth_headers_json(), timeout=60)
-    if not r.ok:
-        try:
-            detail = r.json()
-        except Exception:
-            detail = r.text
-        raise RuntimeError(f"Mistral Chat API error ({r.status_code}): {detail}")
 
-    data = r.json()
-    return data["choices"][0]["message"]["content"]
+def _kept_spans(samples: np.ndarray, sample_rate: int, min_silence_ms: int, keep_ms: int) -> list[tuple[int, int]]:
+    """Sample ranges to keep: leading/trailing silence trimmed, long internal silences shortened."""
+    levels = frame_levels_db(samples, sample_rate, FRAME_MS)
+    frame = int(sample_rate * FRAME_MS / 1000)
+    mask = speech_mask(levels)
+    if not mask.any():
+        return [(0, len(samples))]
+
+    keep = int(sample_rate * keep_ms / 1000)
+    first, last = int(np.argmax(mask)), len(mask) - 1 - int(np.argmax(mask[::-1]))
+    lo = max(0, first * frame - keep)
+    hi = min(len(samples), (last + 1) * frame + keep)
 
+    spans = []
+    cursor = lo
+    for a, b in silent_runs(mask, int(min_silence_ms / FRAME_MS)):
+        if a <= first or b > last:
+            continue  # leading / trailing run, already trimmed
+        cut_from, cut_to = a * frame + keep // 2, b * frame - keep // 2
+        if cut_to > cut_from:
+            spans.append((cursor, cut_from))
+            cursor = cut_to
+    spans.append((cursor, hi))
+    return [(x, y) for x, y in spans if y > x]
 
-def voxtral_transcribe(
+
+def preprocess_audio(audio_bytes: bytes) -> PreparedAudio:
+    """
+    Audio counterpart to preprocess_for_ocr (blocking; run it in a thread):
+    decode -> downmix to mono -> resample to VOICE_SAMPLE_RATE -> trim leading/trailing
+    silence and shorten internal silences longer than VOICE_TRIM_MIN_SILENCE_MS.
+
+    Raises AudioDecodeError for audio that cannot be decoded locally.
+    """
+    t0 = time.perf_counter()
+    src = decode_audio(audio_bytes)
+    rate = settings.VOICE_SAMPLE_RATE
+    samples = resample_audio(src.samples, src.sample_rate, rate)
+
+    spans = _kept_spans(samples, rate, settings.VOICE_TRIM_MIN_SILENCE_MS, settings.VOICE_TRIM_KEEP_MS)
+    trimmed = np.concatenate([samples[a:b] for a, b in spans]) if spans else samples
+    if len(trimmed) < rate // 2:
+        # Nearly everything looked silent: keep the audio rather than send nothing
+        trimmed, spans = samples, [(0, len(samples))]
+
+    out = DecodedAudio(samples=trimmed, sample_rate=rate, channels=1)
+    report = {
+        "source_rate": src.sample_rate,
+        "source_channels": src.channels,
+        "sample_rate": rate,
+        "original_seconds": round(src.duration, 2),
+        "seconds": round(out.duration, 2),
+        "seconds_removed": round(src.duration - out.duration, 2),
+        "original_bytes": len(audio_bytes),
+        "ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+    return PreparedAudio(audio=out, kept=[(float(a / rate), float(b / rate)) for a, b in spans], report=report)
+
+
+async def voxtral_transcribe(
     audio_bytes: bytes,
     filename: str,
     content_type: str | None = None,
@@ -81,7 +155,7 @@ def voxtral_transcribe(
 
     Implementation uses multipart upload (file + params). This matches typical API behavior for audio STT.
     """
-    model = getattr(settings, "MISTRAL_VOXTRAL_MODEL", None) or "voxtral-mini-latest"
+    model = settings.MISTRAL_VOXTRAL_MODEL
 
     data = {"model": model}
     if language:
@@ -91,30 +165,230 @@ def voxtral_transcribe(
     if timestamps:
         # API expects an array; multipart form can repeat the field or send JSON-ish string.
         # Keep it simple: send as JSON string.
-        import json
         data["timestamp_granularities"] = json.dumps(timestamps)
 
     files = {
         "file": (filename or "audio", audio_bytes, content_type or "application/octet-stream")
     }
 
-    r = requests.post(
-        MISTRAL_AUDIO_TRANSCRIBE_URL,
-        headers=_auth_headers_multipart(),
-        data=data,
-        files=files,
-        timeout=180,
-    )
+    out = await get_mistral_client().transcribe(data=data, files=files)
+    text = (out.get("text") or "").strip()
+    if not text:
+        text = "(No transcript returned.)"
+    return text, out
+
 
-    if not r.ok:
+async def _transcribe_segment(
+    audio: DecodedAudio,
+    start: float,
+    end: float,
+    index: int,
+    language: str | None,
+    diarize: bool,
+    timestamps: list[str] | None,
+) -> dict:
+    """One silence-bounded segment as WAV; transport errors and 5xx are retried on their own."""
+    lo, hi = int(start * audio.sample_rate), int(end * audio.sample_rate)
+    with stage("encode_wav"):
+        wav = await run_in_threadpool(encode_wav, audio.samples[lo:hi], audio.sample_rate)
+
+    for attempt in range(settings.VOICE_CHUNK_RETRIES + 1):
         try:
-            detail = r.json()
-        except Exception:
-            detail = r.text
-        raise RuntimeError(f"Mistral Audio Transcription API error ({r.status_code}): {detail}")
+            _text, out = await voxtral_transcribe(
+                audio_bytes=wav,
+                filename=f"segment_{index:04d}.wav",
+                content_type="audio/wav",
+                language=language,
+                diarize=diarize,
+                timestamps=timestamps,
+            )
+            return out
+        except MistralUnavailable:
+            raise  # already retried by admission control
+        except Exception as e:
+            if not is_transient(e):
+                raise  # 4xx, bad input, bugs: retrying cannot help
+            if attempt == settings.VOICE_CHUNK_RETRIES:
+                raise RuntimeError(f"Transcription failed for {start:.1f}s-{end:.1f}s: {e}") from e
+            logger.warning("Transcription of %.1fs-%.1fs failed (attempt %d), retrying: %s", start, end, attempt + 1, e)
+            await asyncio.sleep(2 ** attempt)
 
-    out = r.json()
-    text = (out.get("text") or "").strip()
+
+def stitch_transcripts(
+    spans: list[tuple[float, float]],
+    outputs: list[dict],
+    keep_speakers: bool = True,
+) -> tuple[str, list[dict]]:
+    """
+    Joins per-segment responses in order. Voxtral segment timestamps are shifted by the
+    segment's offset; segments without timestamps become one entry spanning the whole cut.
+
+    keep_speakers=False moves each speaker label to "chunk_speaker" ("<chunk>:<label>"):
+    separate requests number their speakers independently, so "speaker_1" in two chunks
+    need not be the same person and must not be used to filter the whole recording.
+    """
+    texts: list[str] = []
+    segments: list[dict] = []
+    for index, ((start, end), out) in enumerate(zip(spans, outputs)):
+        text = (out.get("text") or "").strip()
+        if text:
+            texts.append(text)
+        inner = out.get("segments") or []
+        if inner:
+            for seg in inner:
+                shifted = dict(seg)
+                for key in ("start", "end"):
+                    if isinstance(seg.get(key), (int, float)):
+                        shifted[key] = round(seg[key] + start, 3)
+                if not keep_speakers:
+                    label = shifted.pop("speaker", None)
+                    label_id = shifted.pop("speaker_id", None)
+                    label = label if label is not None else label_id
+                    if label is not None:
+                        shifted["chunk_speaker"] = f"{index}:{label}"
+                segments.append(shifted)
+        elif text:
+            segments.append({"start": round(start, 3), "end": round(end, 3), "text": text})
+    return " ".join(texts), segments
+
+
+def _to_original_times(prepared: PreparedAudio | None, items: list[dict]) -> list[dict]:
+    """Timestamps in the trimmed audio -> timestamps in the recording the user uploaded."""
+    if prepared is None:
+        return items
+    out = []
+    for item in items:
+        item = dict(item)
+        for key in ("start", "end"):
+            if isinstance(item.get(key), (int, float)):
+                item[key] = round(prepared.to_original(item[key]), 3)
+        out.append(item)
+    return out
+
+
+async def voxtral_transcribe_long(
+    audio_bytes: bytes,
+    filename: str,
+    content_type: str | None = None,
+    language: str | None = None,
+    diarize: bool = False,
+    timestamps: list[str] | None = None,
+    chunked: bool | None = None,
+    preprocess: bool | None = None,
+    on_progress: ProgressCallback | None = None,
+):
+    """
+    voxtral_transcribe for recordings of any length.
+    Returns: (transcript_text, raw_response_json)
+
+    preprocess (default VOICE_PREPROCESS) normalizes the audio first (preprocess_audio);
+    the normalized WAV is only sent in one piece when it is smaller than the upload.
+    raw_response_json["preprocess"] reports seconds removed and bytes saved.
+
+    chunked=None decides by duration (> VOICE_CHUNK_MIN_SECONDS); True forces chunking,
+    False sends one request. Chunked runs cut the audio at silences
+    (app/services/audio/vad.py) into ~VOICE_CHUNK_SECONDS segments, transcribe up to
+    VOICE_CHUNK_CONCURRENCY segments at a time and stitch text + timestamps back together.
+    raw_response_json then holds "text", "segments" and "chunks".
+
+    Timestamps always refer to the original recording. Audio that cannot be decoded
+    locally is sent as-is in one request.
+
+    With diarize=True, a chunked run gets speaker labels from separate requests that
+    cannot be matched up (segments do not overlap and the API returns no voice embeddings).
+    Its segments therefore carry no "speaker" (only a per-chunk "chunk_speaker"), so speaker
+    filters never select from them, and raw_response_json["speakers_reconciled"] is False.
+    """
+    if preprocess is None:
+        preprocess = settings.VOICE_PREPROCESS
+    if chunked is False and not preprocess:
+        return await voxtral_transcribe(audio_bytes, filename, content_type, language, diarize, timestamps)
+
+    prepared: PreparedAudio | None = None
+    try:
+        with stage("preprocess"):
+            if preprocess:
+                prepared = await run_in_threadpool(preprocess_audio, audio_bytes)
+                audio = prepared.audio
+            else:
+                audio = await run_in_threadpool(decode_audio, audio_bytes)
+    except AudioDecodeError as e:
+        logger.info("Transcribing %s in one request: %s", filename, e)
+        return await voxtral_transcribe(audio_bytes, filename, content_type, language, diarize, timestamps)
+
+    if chunked is False or (not chunked and audio.duration <= settings.VOICE_CHUNK_MIN_SECONDS):
+        with stage("encode_wav"):
+            wav = await run_in_threadpool(encode_wav, audio.samples, audio.sample_rate) if prepared else None
+        if wav is not None and len(wav) < len(audio_bytes):
+            text, out = await voxtral_transcribe(wav, "audio.wav", "audio/wav", language, diarize, timestamps)
+            out = dict(out)
+            out["segments"] = _to_original_times(prepared, out.get("segments") or [])
+            sent = len(wav)
+        else:
+            # Compressed uploads can be smaller than 16 kHz PCM; send those untouched
+            text, out = await voxtral_transcribe(audio_bytes, filename, content_type, language, diarize, timestamps)
+            out = dict(out)
+            sent = len(audio_bytes)
+            if prepared is not None:
+                prepared.report["seconds_removed"] = 0.0
+        if prepared is not None:
+            out["preprocess"] = {**prepared.report, "sent_bytes": sent, "bytes_saved": len(audio_bytes) - sent}
+        return text, out
+
+    with stage("segment_plan"):
+        spans = await run_in_threadpool(
+            plan_segments,
+            audio.samples,
+            audio.sample_rate,
+            settings.VOICE_CHUNK_SECONDS,
+            settings.VOICE_CHUNK_MAX_SECONDS,
+            settings.VOICE_MIN_SILENCE_MS,
+        )
+    if on_progress:
+        await on_progress({"stage": "segments", "segments": len(spans), "duration": round(audio.duration, 2)})
+
+    sem = asyncio.Semaphore(max(1, settings.VOICE_CHUNK_CONCURRENCY))
+    completed = 0
+
+    async def run_segment(index: int, start: float, end: float) -> dict:
+        nonlocal completed
+        async with sem:
+            out = await _transcribe_segment(audio, start, end, index, language, diarize, timestamps)
+        completed += 1
+        if on_progress:
+            await on_progress({
+                "stage": "segment",
+                "start": round(start, 2),
+                "end": round(end, 2),
+                "completed": completed,
+                "total": len(spans),
+            })
+        return out
+
+    tasks = [asyncio.create_task(run_segment(i, s, e)) for i, (s, e) in enumerate(spans)]
+    try:
+        outputs = await asyncio.gather(*tasks)
+    except BaseException:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    single = len(spans) == 1
+    with stage("stitch"):
+        text, segments = stitch_transcripts(spans, outputs, keep_speakers=single)
     if not text:
         text = "(No transcript returned.)"
-    return text, out
+    raw = {
+        "model": settings.MISTRAL_VOXTRAL_MODEL,
+        "text": text,
+        "segments": _to_original_times(prepared, segments),
+        "chunks": _to_original_times(prepared, [{"start": round(s, 3), "end": round(e, 3)} for s, e in spans]),
+        "duration": round(prepared.report["original_seconds"] if prepared else audio.duration, 3),
+    }
+    if diarize:
+        raw["speakers_reconciled"] = single
+    if prepared is not None:
+        sent = 2 * len(audio.samples) + 44 * len(spans)
+        raw["preprocess"] = {**prepared.report, "sent_bytes": sent, "bytes_saved": len(audio_bytes) - sent}
+    return text, raw
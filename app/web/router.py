@@ -3,6 +3,7 @@ from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
 from app.core.security import require_login, get_current_user
+from app.core.metrics import stage
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app/templates")
@@ -14,13 +15,15 @@ async def studio(request: Request):
         return guard
 
     user = get_current_user(request)
-    return templates.TemplateResponse(
-        "studio.html",
-        {
-            "request": request,
-            "user": user,
-            "page_title": "Studio Home",
-            "title": "CPCG Tech Studio"
-    }
-    )
+    with stage("template_render"):
+        response = templates.TemplateResponse(
+            "studio.html",
+            {
+                "request": request,
+                "user": user,
+                "page_title": "Studio Home",
+                "title": "CPCG Tech Studio"
+        }
+        )
+    return response
 
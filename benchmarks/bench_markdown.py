@@ -0,0 +1,127 @@
+# benchmarks/bench_markdown.py
+"""
+Micro-benchmarks for the pure-CPU text paths between Mistral responses and the prompt:
+
+    combine_pages    OCR response pages -> one markdown document (_combine_pages)
+    split_markdown   document -> retrieval / map-reduce chunks
+    count_tokens     local token estimate over a whole document
+    build_context    top-k retrieved chunks -> prompt context
+    format_segments  timestamped transcript segments -> prompt text
+    stitch           per-chunk transcription responses -> one transcript
+
+Each case reports per-call wall time percentiles over many calls (after a warm-up).
+
+Usage:
+    python -m benchmarks.bench_markdown
+    python -m benchmarks.bench_markdown --json
+    python -m benchmarks.bench_markdown --out results/markdown.json   # for benchmarks.compare
+"""
+
+import json
+import os
+import sys
+import time
+
+# The app modules import the DB session; nothing here touches the database
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.services.rag.chunking import count_tokens, split_markdown  # noqa: E402
+from app.services.rag.retrieval import RetrievedChunk, build_context  # noqa: E402
+from app.tools.docchat.service import _combine_pages  # noqa: E402
+from app.tools.voicechat.segments import Segment, format_segments  # noqa: E402
+from app.tools.voicechat.service import stitch_transcripts  # noqa: E402
+from benchmarks.mistral_stub import page_markdown  # noqa: E402
+from benchmarks.report import latency_summary, result, write_result  # noqa: E402
+
+PAGE_CHARS = 2500
+MIN_SECONDS = 0.5  # per case
+MAX_CALLS = 2000
+
+
+def _ocr_response(pages: int) -> dict:
+    return {"pages": [{"index": i, "markdown": page_markdown(i, PAGE_CHARS)} for i in range(pages)]}
+
+
+def _transcript_segments(n: int) -> list[Segment]:
+    return [
+        Segment(ord=i, start=i * 4.0, end=i * 4.0 + 3.8, text=f"Sentence number {i} about the invoice total.", speaker=f"speaker_{i % 2}")
+        for i in range(n)
+    ]
+
+
+def _chunk_outputs(chunks: int, per_chunk: int) -> tuple[list[tuple[float, float]], list[dict]]:
+    spans = [(c * 120.0, (c + 1) * 120.0) for c in range(chunks)]
+    outputs = [
+        {
+            "text": " ".join(f"Segment {k} of chunk {c}." for k in range(per_chunk)),
+            "segments": [
+                {"start": k * 120.0 / per_chunk, "end": (k + 1) * 120.0 / per_chunk, "text": f"Segment {k} of chunk {c}."}
+                for k in range(per_chunk)
+            ],
+        }
+        for c in range(chunks)
+    ]
+    return spans, outputs
+
+
+def cases() -> dict[str, tuple]:
+    """case name -> (fn, arg, input size in KB)."""
+    out = {}
+    for pages in (10, 100, 500):
+        data = _ocr_response(pages)
+        out[f"combine_pages_{pages}p"] = (_combine_pages, data, pages * PAGE_CHARS / 1024)
+
+    doc = _combine_pages(_ocr_response(100))[1]
+    out["split_markdown_100p"] = (split_markdown, doc, len(doc) / 1024)
+    out["count_tokens_100p"] = (count_tokens, doc, len(doc) / 1024)
+
+    chunks = [
+        RetrievedChunk(ord=c.ord, heading=c.heading, text=c.text, score=1.0 / (1 + c.ord))
+        for c in split_markdown(doc)[:8]
+    ]
+    out["build_context_top8"] = (build_context, chunks, sum(len(c.text) for c in chunks) / 1024)
+
+    segments = _transcript_segments(1800)  # ~2 h call
+    out["format_segments_2h"] = (format_segments, segments, sum(len(s.text) for s in segments) / 1024)
+
+    spans, outputs = _chunk_outputs(60, 30)
+    out["stitch_60_chunks"] = (lambda a: stitch_transcripts(*a), (spans, outputs), sum(len(o["text"]) for o in outputs) / 1024)
+    return out
+
+
+def _measure(fn, arg) -> tuple[list[float], int]:
+    for _ in range(3):
+        fn(arg)
+    samples = []
+    deadline = time.perf_counter() + MIN_SECONDS
+    while len(samples) < MAX_CALLS and (len(samples) < 20 or time.perf_counter() < deadline):
+        t0 = time.perf_counter()
+        fn(arg)
+        samples.append(time.perf_counter() - t0)
+    return samples, len(samples)
+
+
+def run() -> list[dict]:
+    rows = []
+    for name, (fn, arg, kb) in cases().items():
+        samples, calls = _measure(fn, arg)
+        rows.append({"case": name, "calls": calls, "input_kb": round(kb, 1), **latency_summary(samples)})
+    return rows
+
+
+def main(argv: list[str]) -> None:
+    rows = run()
+    if "--out" in argv:
+        write_result(result("markdown", rows), argv[argv.index("--out") + 1])
+        return
+    if "--json" in argv:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'case':24} {'input KB':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'calls':>6}")
+    for r in rows:
+        print(f"{r['case']:24} {r['input_kb']:9.1f} {r['p50_ms']:9.4f} {r['p95_ms']:9.4f} {r['p99_ms']:9.4f} {r['calls']:6d}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
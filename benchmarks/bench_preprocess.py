@@ -0,0 +1,118 @@
+# benchmarks/bench_preprocess.py
+"""
+CPU-time benchmark: fixed preprocess_for_ocr pipeline vs the adaptive staged pipeline.
+
+Usage:
+    python -m benchmarks.bench_preprocess                 # synthetic sample images
+    python -m benchmarks.bench_preprocess path/to/imgs/*  # your own images
+    python -m benchmarks.bench_preprocess --json          # machine-readable output
+    python -m benchmarks.bench_preprocess --out results/preprocess.json   # for benchmarks.compare
+
+Synthetic samples cover the common upload shapes: a clean 4000x3000 screenshot, a noisy
+low-light phone photo, a low-contrast A4 scan and a slightly blurred photo.
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from app.services.ocr.preprocess import preprocess_for_ocr_full, preprocess_for_ocr_staged
+from benchmarks.report import result, write_result
+
+REPEAT = 3
+
+
+def _text_page(w: int, h: int, ink: int = 0, paper: int = 255) -> np.ndarray:
+    img = np.full((h, w), paper, np.uint8)
+    scale = w / 1400
+    y = int(80 * scale)
+    line = 0
+    while y < h - int(40 * scale):
+        text = f"INV-{10000 + line}  Qty {line % 7 + 1}  Amount ${(line * 37.25) % 1000:.2f}  Patient ID 8841-{line:03d}"
+        cv2.putText(img, text, (int(40 * scale), y), cv2.FONT_HERSHEY_SIMPLEX, 0.9 * scale, ink, max(1, int(2 * scale)))
+        y += int(48 * scale)
+        line += 1
+    return img
+
+
+def synthetic_samples() -> dict[str, bytes]:
+    rng = np.random.default_rng(7)
+    samples = {}
+
+    samples["clean_screenshot_4000x3000"] = _text_page(4000, 3000)
+
+    photo = _text_page(4000, 3000, ink=40, paper=200).astype(np.float32)
+    gradient = np.linspace(0.6, 1.0, photo.shape[1], dtype=np.float32)[None, :]
+    photo = photo * gradient + rng.normal(0, 12, photo.shape)
+    samples["noisy_phone_photo_4000x3000"] = np.clip(photo, 0, 255).astype(np.uint8)
+
+    samples["low_contrast_scan_2480x3508"] = _text_page(2480, 3508, ink=110, paper=180)
+
+    blurred = cv2.GaussianBlur(_text_page(3024, 4032), (0, 0), sigmaX=2.5)
+    samples["blurry_photo_3024x4032"] = blurred
+
+    out = {}
+    for name, gray in samples.items():
+        ok, buf = cv2.imencode(".jpg", gray, [cv2.IMWRITE_JPEG_QUALITY, 92])
+        out[name] = buf.tobytes()
+    return out
+
+
+def _cpu_time(fn, data: bytes) -> float:
+    best = float("inf")
+    for _ in range(REPEAT):
+        t0 = time.process_time()
+        fn(data)
+        best = min(best, time.process_time() - t0)
+    return best
+
+
+def run(images: dict[str, bytes]) -> list[dict]:
+    rows = []
+    for name, data in images.items():
+        full_s = _cpu_time(preprocess_for_ocr_full, data)
+        adaptive_s = _cpu_time(preprocess_for_ocr_staged, data)
+        _, report = preprocess_for_ocr_staged(data)
+        rows.append({
+            "image": name,
+            "full_cpu_ms": round(full_s * 1000, 1),
+            "adaptive_cpu_ms": round(adaptive_s * 1000, 1),
+            "saved_cpu_ms": round((full_s - adaptive_s) * 1000, 1),
+            "saved_pct": round(100 * (1 - adaptive_s / full_s), 1) if full_s else 0.0,
+            "stages": report["stages"],
+            "metrics": report["metrics"],
+        })
+    return rows
+
+
+def main(argv: list[str]) -> None:
+    as_json = "--json" in argv
+    out = argv[argv.index("--out") + 1] if "--out" in argv else None
+    paths = [a for a in argv if not a.startswith("--") and a != out]
+    if paths:
+        images = {Path(p).name: Path(p).read_bytes() for p in paths}
+    else:
+        images = synthetic_samples()
+
+    rows = run(images)
+    if out:
+        write_result(result("preprocess", rows, {"repeat": REPEAT, "images": "custom" if paths else "synthetic"}), out)
+        return
+    if as_json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'image':34} {'full ms':>9} {'adaptive ms':>12} {'saved':>8}  stages")
+    for r in rows:
+        print(
+            f"{r['image']:34} {r['full_cpu_ms']:9.1f} {r['adaptive_cpu_ms']:12.1f} "
+            f"{r['saved_pct']:7.1f}%  {','.join(r['stages'])}"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,219 @@
+# benchmarks/bench_startup.py
+"""
+Worker startup benchmark:
+
+    import_app     `import app.main` in a fresh interpreter (ms, RSS, heavy modules loaded)
+    boot_to_ready  uvicorn process spawn -> first HTTP response (ms, RSS of the process tree)
+    first_login    first GET /auth/google/login after boot (ms); the OpenID discovery document
+                   and JWKS come from a local server that answers after --metadata-latency-ms,
+                   standing in for accounts.google.com
+
+Each case runs --repeat times in new processes. The database is a fresh SQLite file,
+migrated once up front when the tree has migrations/ (use --database-url for Postgres,
+where per-table create_all checks at startup cost more round trips).
+
+Usage:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --out results/startup-after.json
+    git worktree add /tmp/before HEAD~1
+    python -m benchmarks.bench_startup --app-dir /tmp/before --out results/startup-before.json
+    python -m benchmarks.compare results/startup-before.json results/startup-after.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+
+from benchmarks.load import ROOT, _free_port, _spawn, _stop, migrate
+from benchmarks.report import latency_summary, result, tree_rss_mb, write_result
+
+HEAVY_MODULES = ("cv2", "numpy", "sqlalchemy", "authlib")
+
+_IMPORT_PROBE = """
+import json, resource, sys, time
+t0 = time.perf_counter()
+import app.main
+ms = (time.perf_counter() - t0) * 1000
+print(json.dumps({
+    "ms": ms,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+class _MetadataServer:
+    """Serves an OpenID discovery document and an empty JWKS after a fixed delay."""
+
+    def __init__(self, latency_ms: float):
+        port = _free_port()
+        self.url = f"http://127.0.0.1:{port}/.well-known/openid-configuration"
+        base = f"http://127.0.0.1:{port}"
+        documents = {
+            "/.well-known/openid-configuration": {
+                "issuer": "https://accounts.google.com",
+                "authorization_endpoint": f"{base}/o/oauth2/v2/auth",
+                "token_endpoint": f"{base}/token",
+                "userinfo_endpoint": f"{base}/v1/userinfo",
+                "jwks_uri": f"{base}/oauth2/v3/certs",
+            },
+            "/oauth2/v3/certs": {"keys": []},
+        }
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(latency_ms / 1000)
+                body = json.dumps(documents.get(self.path, {})).encode()
+                self.send_response(200 if self.path in documents else 404)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self._httpd.shutdown()
+
+
+def _env(tmp: Path, args, metadata_url: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": args.database_url or f"sqlite:///{tmp / 'startup.db'}",
+        "MISTRAL_API_KEY": "stub",
+        "MISTRAL_BASE_URL": "http://127.0.0.1:9",  # never called
+        "GOOGLE_CLIENT_ID": "bench",
+        "GOOGLE_CLIENT_SECRET": "bench",
+        "GOOGLE_METADATA_URL": metadata_url,
+        "OCR_CACHE_DIR": str(tmp / "ocr-cache"),
+        "RAG_INDEX_DIR": str(tmp / "rag-index"),
+        "MAPREDUCE_CACHE_DIR": str(tmp / "mapreduce"),
+        "METRICS_DIR": "",
+    })
+    return env
+
+
+def bench_import(app_dir: Path, env: dict, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", _IMPORT_PROBE % (HEAVY_MODULES,)],
+            cwd=app_dir, env=env, capture_output=True, text=True, check=True,
+        )
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    loaded = set(runs[-1]["modules"])
+    return {
+        "case": "import_app",
+        "runs": repeat,
+        **latency_summary([r["ms"] / 1000 for r in runs]),
+        "rss_mb": round(max(r["rss_mb"] for r in runs), 1),
+        **{f"loads_{m}": int(m in loaded) for m in HEAVY_MODULES},
+    }
+
+
+async def _boot_once(app_dir: Path, env: dict, tmp: Path, login_delay: float) -> tuple[float, float, float | None]:
+    """Returns (seconds to first response, tree RSS MB at ready, first login seconds or None on failure)."""
+    port = _free_port()
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    started = time.perf_counter()
+    proc = _spawn(cmd, env, tmp / "app.log", cwd=app_dir)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError((tmp / "app.log").read_text(errors="replace")[-2000:])
+                try:
+                    await client.get("/auth/google/logout")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.005)
+            ready = time.perf_counter() - started
+            rss = tree_rss_mb(proc.pid)
+
+            await asyncio.sleep(login_delay)
+            t0 = time.perf_counter()
+            r = await client.get("/auth/google/login")
+            login = time.perf_counter() - t0
+            if r.status_code not in (302, 307):
+                # e.g. an older tree that ignores GOOGLE_METADATA_URL and has no route to Google
+                print(f"first login answered {r.status_code}", file=sys.stderr)
+                login = None
+        return ready, rss, login
+    finally:
+        _stop(proc)
+
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--app-dir", default=str(ROOT), help="tree to benchmark (e.g. a git worktree of an older commit)")
+    parser.add_argument("--database-url", help="default: a fresh SQLite file")
+    parser.add_argument("--metadata-latency-ms", type=float, default=150.0, help="simulated Google discovery / JWKS latency")
+    parser.add_argument("--login-delay", type=float, default=0.5, help="seconds between ready and the first login")
+    parser.add_argument("--no-prefetch", action="store_true", help="OAUTH_PREFETCH=false (metadata fetched by the first login)")
+    parser.add_argument("--out", help="write the result JSON here (see benchmarks.compare)")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+    app_dir = Path(args.app_dir).resolve()
+
+    metadata = _MetadataServer(args.metadata_latency_ms)
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench-startup-") as tmpdir:
+            tmp = Path(tmpdir)
+            env = _env(tmp, args, metadata.url)
+            if args.no_prefetch:
+                env["OAUTH_PREFETCH"] = "false"
+            if (app_dir / "migrations").is_dir():
+                migrate(env, cwd=app_dir)
+
+            rows = [bench_import(app_dir, env, args.repeat)]
+            boots = [asyncio.run(_boot_once(app_dir, env, tmp, args.login_delay)) for _ in range(args.repeat)]
+    finally:
+        metadata.close()
+
+    rows.append({
+        "case": "boot_to_ready",
+        "runs": args.repeat,
+        **latency_summary([b[0] for b in boots]),
+        "rss_mb": round(max(b[1] for b in boots), 1),
+    })
+    logins = [b[2] for b in boots if b[2] is not None]
+    rows.append({"case": "first_login", "runs": args.repeat, "errors": args.repeat - len(logins), **latency_summary(logins)})
+
+    data = result("startup", rows, {
+        "app_dir": str(app_dir),
+        "repeat": args.repeat,
+        "metadata_latency_ms": args.metadata_latency_ms,
+        "login_delay_seconds": args.login_delay,
+        "oauth_prefetch": not args.no_prefetch,
+        "database": "sqlite" if not args.database_url else args.database_url.split(":", 1)[0],
+    })
+    if args.out:
+        write_result(data, args.out)
+    if args.json:
+        write_result(data, None)
+        return
+
+    print(f"{'case':16} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'RSS MB':>8}")
+    for r in rows:
+        rss = f"{r['rss_mb']:8.1f}" if "rss_mb" in r else f"{'':8}"
+        print(f"{r['case']:16} {r['p50_ms']:9.1f} {r['p95_ms']:9.1f} {r['max_ms']:9.1f} {rss}")
+    print("modules loaded by import app.main: " + ", ".join(m for m in HEAVY_MODULES if rows[0][f"loads_{m}"]))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
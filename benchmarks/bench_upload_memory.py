@@ -0,0 +1,125 @@
+# benchmarks/bench_upload_memory.py
+"""
+Peak-RSS benchmark: buffered PDF upload -> OCR request vs the streamed path.
+
+    before  await file.read() -> base64 -> data URL -> json body (what upload used to do)
+    after   spool_upload (hash + size check over the spooled file) -> ocr_streamed
+
+Each mode runs in a fresh subprocess against a transport that drains the request body
+chunk by chunk (nothing leaves the machine), and reports how much its peak RSS grew.
+
+Usage:
+    python -m benchmarks.bench_upload_memory            # 40 MB synthetic PDF
+    python -m benchmarks.bench_upload_memory --mb 100
+    python -m benchmarks.bench_upload_memory --json
+"""
+
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+MODES = ("before", "after")
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class _DrainTransport(httpx.AsyncBaseTransport):
+    """Reads the request body incrementally (like a socket would) and returns an empty OCR result."""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        async for chunk in request.stream:
+            self.sent += len(chunk)
+        return httpx.Response(200, json={"pages": [{"index": 0, "markdown": "ok"}]})
+
+
+async def _run_mode(mode: str, path: str) -> dict:
+    from starlette.datastructures import UploadFile
+
+    from app.services.ocr.mistral import MistralClient
+    from app.services.storage.uploads import spool_upload
+
+    client = MistralClient(base_url="http://bench.local", api_key="bench")
+    transport = _DrainTransport()
+    await client._http.aclose()
+    client._http = httpx.AsyncClient(base_url="http://bench.local", transport=transport)
+
+    baseline = _peak_rss_mb()
+    t0 = time.perf_counter()
+    with open(path, "rb") as fh:
+        upload = UploadFile(file=fh, filename="bench.pdf")
+        if mode == "before":
+            import base64
+
+            file_bytes = await upload.read()
+            b64 = base64.b64encode(file_bytes).decode("utf-8")
+            await client.ocr({"type": "document_url", "document_url": f"data:application/pdf;base64,{b64}"})
+        else:
+            spooled = await spool_upload(upload, max_bytes=os.path.getsize(path))
+            await client.ocr_streamed(
+                "document_url", "application/pdf", spooled.base64_chunks, spooled.base64_length()
+            )
+    elapsed = time.perf_counter() - t0
+    await client.aclose()
+
+    return {
+        "mode": mode,
+        "file_mb": round(os.path.getsize(path) / 1e6, 1),
+        "body_mb": round(transport.sent / 1e6, 1),
+        "peak_rss_growth_mb": round(_peak_rss_mb() - baseline, 1),
+        "seconds": round(elapsed, 3),
+    }
+
+
+def _child(mode: str, path: str) -> None:
+    print(json.dumps(asyncio.run(_run_mode(mode, path))))
+
+
+def run(size_mb: int) -> list[dict]:
+    rows = []
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp:
+        tmp.write(b"%PDF-1.4\n")
+        for _ in range(size_mb):
+            tmp.write(os.urandom(1024 * 1024))
+        tmp.flush()
+        for mode in MODES:
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_upload_memory", "--child", mode, tmp.name],
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+            rows.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return rows
+
+
+def main(argv: list[str]) -> None:
+    if argv[:1] == ["--child"]:
+        _child(argv[1], argv[2])
+        return
+
+    size_mb = int(argv[argv.index("--mb") + 1]) if "--mb" in argv else 40
+    rows = run(size_mb)
+    if "--json" in argv:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'mode':8} {'file MB':>8} {'body MB':>8} {'peak RSS +MB':>13} {'seconds':>8}")
+    for r in rows:
+        print(f"{r['mode']:8} {r['file_mb']:8.1f} {r['body_mb']:8.1f} {r['peak_rss_growth_mb']:13.1f} {r['seconds']:8.3f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,107 @@
+# benchmarks/compare.py
+"""
+Compares two benchmark result files (written with --out by bench_markdown, bench_preprocess
+or load) and prints the change in every numeric field, row by row.
+
+Exits 1 when a latency field (*_ms) or peak_rss_mb grew by more than --threshold percent,
+or throughput (rps) dropped by more than that, so it can gate CI on a fixed machine.
+
+Usage:
+    python -m benchmarks.compare results/before.json results/after.json
+    python -m benchmarks.compare before.json after.json --threshold 15 --fields p95_ms,p99_ms,rps
+"""
+
+import argparse
+import json
+import sys
+
+# Row identity: the first of these keys present in a row
+KEY_FIELDS = ("case", "image")
+LOWER_IS_BETTER_SUFFIXES = ("_ms", "_mb")
+HIGHER_IS_BETTER = {"rps", "saved_cpu_ms", "saved_pct"}
+
+
+def _flatten(row: dict, prefix: str = "") -> dict[str, float]:
+    out = {}
+    for k, v in row.items():
+        if isinstance(v, dict):
+            out.update(_flatten(v, f"{prefix}{k}."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[f"{prefix}{k}"] = float(v)
+    return out
+
+
+def _rows(data: dict) -> dict[str, dict[str, float]]:
+    rows = {}
+    for row in data.get("rows", []):
+        key = next((str(row[k]) for k in KEY_FIELDS if k in row), None)
+        if key is not None:
+            rows[key] = _flatten(row)
+    return rows
+
+
+def _regressed(field: str, before: float, after: float, threshold: float) -> bool:
+    if before <= 0:
+        return False
+    change = (after - before) / before * 100
+    if field in HIGHER_IS_BETTER:
+        return change < -threshold
+    if field.endswith(LOWER_IS_BETTER_SUFFIXES) and not field.startswith("upstream"):
+        return change > threshold
+    return False
+
+
+def compare(before: dict, after: dict, threshold: float, fields: set[str] | None) -> list[str]:
+    """Prints the comparison; returns the regressions as 'row field' strings."""
+    if before.get("benchmark") != after.get("benchmark"):
+        print(f"warning: comparing {before.get('benchmark')} with {after.get('benchmark')}", file=sys.stderr)
+    if before.get("config") != after.get("config"):
+        print(f"warning: configs differ:\n  {before.get('config')}\n  {after.get('config')}", file=sys.stderr)
+
+    old, new = _rows(before), _rows(after)
+    regressions = []
+    print(f"{before.get('git') or '?'} -> {after.get('git') or '?'}")
+    print(f"{'row':28} {'field':24} {'before':>12} {'after':>12} {'change':>9}")
+    for key in new:
+        if key not in old:
+            print(f"{key:28} (new row)")
+            continue
+        for field, value in new[key].items():
+            if fields and field not in fields:
+                continue
+            prev = old[key].get(field)
+            if prev is None:
+                continue
+            change = f"{(value - prev) / prev * 100:+8.1f}%" if prev else "      n/a"
+            flag = ""
+            if _regressed(field, prev, value, threshold):
+                regressions.append(f"{key} {field}")
+                flag = "  REGRESSION"
+            print(f"{key:28} {field:24} {prev:12.4f} {value:12.4f} {change}{flag}")
+    for key in old.keys() - new.keys():
+        print(f"{key:28} (missing)")
+    return regressions
+
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change counted as a regression")
+    parser.add_argument("--fields", help="comma-separated fields to show / check (default: all numeric)")
+    args = parser.parse_args(argv)
+
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+    fields = {s.strip() for s in args.fields.split(",")} if args.fields else None
+
+    regressions = compare(before, after, args.threshold, fields)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:g}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
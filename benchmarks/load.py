@@ -0,0 +1,561 @@
+# benchmarks/load.py
+"""
+End-to-end load test: the app (uvicorn workers) against the local Mistral stub, driven
+over HTTP by closed-loop clients. Nothing leaves the machine.
+
+For each scenario: setup (e.g. upload the document that queries run against), a short
+warm-up, then --concurrency clients send requests back to back for --duration seconds.
+Reported per scenario: requests, errors, requests/s, latency p50/p95/p99 (plus time to
+first streamed byte for SSE endpoints), peak RSS of the app's process tree (workers and
+preprocess pool) and the Mistral calls it caused per request (from the stub's counters).
+
+Uploads are made unique per request (their SHA-256 differs) so content caches do not turn
+the OCR / transcription path into a cache hit; the *_cached scenarios measure hits on
+purpose.
+
+Usage:
+    python -m benchmarks.load                                   # every scenario, realistic profile
+    python -m benchmarks.load --profile instant --concurrency 32 --duration 20 --out results/load.json
+    python -m benchmarks.load --scenarios docchat_query,voice_query --workers 2
+    python -m benchmarks.load --database-url postgresql+psycopg://...   # closer to production
+    python -m benchmarks.load --app-url http://127.0.0.1:8000 --app-pid 1234 --stub-url http://127.0.0.1:8900
+    python -m benchmarks.compare results/before.json results/after.json
+
+SQLite (the default database) serializes writes; use --database-url for write-heavy runs
+with several workers. RSS sampling reads /proc (Linux).
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+from benchmarks.mistral_stub import PROFILES, add_profile_args
+from benchmarks.report import latency_summary, result, tree_rss_mb, write_result
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+# ----------------------------
+# Payloads
+# ----------------------------
+
+def _png() -> bytes:
+    import cv2
+
+    img = np.full((1200, 1600), 255, np.uint8)
+    for row in range(20):
+        text = f"INV-{10000 + row}  Qty {row % 7 + 1}  Amount ${(row * 37.25) % 1000:.2f}"
+        cv2.putText(img, text, (40, 60 + row * 55), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2)
+    return cv2.imencode(".png", img)[1].tobytes()
+
+
+def _pdf(pages: int) -> bytes:
+    kids = " ".join(f"{3 + i} 0 R" for i in range(pages))
+    objs = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode(),
+    }
+    for i in range(pages):
+        objs[3 + i] = b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >>"
+    out = b"%PDF-1.4\n"
+    for k, v in objs.items():
+        out += b"%d 0 obj\n" % k + v + b"\nendobj\n"
+    return out + b"trailer\n<< /Root 1 0 R >>\n%%EOF\n"
+
+
+def _wav(seconds: float, rate: int = 16000) -> bytes:
+    """Speech-like bursts (tone + noise) with ~0.8 s pauses: cut points for chunking, short enough not to be trimmed."""
+    rng = np.random.default_rng(1)
+    t = np.arange(int(seconds * rate)) / rate
+    envelope = (np.sin(2 * np.pi * t / 2.0) > -0.3).astype(np.float32)
+    signal_ = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(t.size)
+    pcm = np.clip(signal_ * envelope * 32767, -32768, 32767).astype("<i2")
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm.tobytes())
+    return buf.getvalue()
+
+
+def _unique(data: bytes, i: int, kind: str) -> bytes:
+    """Same decoded content, different SHA-256 (defeats content-addressed caches)."""
+    tag = f"{os.getpid()}-{time.monotonic_ns()}-{i}".encode()
+    if kind == "pdf":
+        return data + b"%" + tag + b"\n"
+    if kind == "wav":
+        # Overwrite the first samples after the 44-byte header; inaudible, but a new hash
+        return data[:44] + tag.ljust(32, b"\0")[:32] + data[76:]
+    return data + tag  # PNG decoders stop at IEND
+
+
+class Payloads:
+    def __init__(self):
+        self._cache: dict[str, bytes] = {}
+
+    def get(self, name: str, make: Callable[[], bytes]) -> bytes:
+        if name not in self._cache:
+            self._cache[name] = make()
+        return self._cache[name]
+
+
+# ----------------------------
+# Scenarios
+# ----------------------------
+
+@dataclass
+class Outcome:
+    status: int
+    ttfb: float | None = None  # seconds to the first streamed event (SSE endpoints)
+
+
+@dataclass
+class Scenario:
+    name: str
+    description: str
+    request: Callable[["Run", int], Awaitable[Outcome]]
+    setup: Callable[["Run"], Awaitable[None]] | None = None
+
+
+@dataclass
+class Run:
+    client: httpx.AsyncClient
+    payloads: Payloads
+    state: dict = field(default_factory=dict)
+
+
+async def _post_file(run: Run, url: str, name: str, data: bytes, ctype: str) -> Outcome:
+    r = await run.client.post(url, files={"file": (name, data, ctype)})
+    return Outcome(r.status_code)
+
+
+async def _sse(run: Run, url: str, payload: dict) -> Outcome:
+    start = time.perf_counter()
+    ttfb = None
+    async with run.client.stream("POST", url, json=payload) as r:
+        async for line in r.aiter_lines():
+            if ttfb is None and line.startswith("data:"):
+                ttfb = time.perf_counter() - start
+        return Outcome(r.status_code, ttfb)
+
+
+async def _upload_doc(run: Run, pages: int) -> None:
+    pdf = _unique(run.payloads.get(f"pdf{pages}", lambda: _pdf(pages)), 0, "pdf")
+    r = await run.client.post("/api/docchat/upload", files={"file": ("setup.pdf", pdf, "application/pdf")})
+    r.raise_for_status()
+    run.state["doc_id"] = r.json()["doc_id"]
+
+
+async def _upload_call(run: Run, seconds: float) -> None:
+    wav = _unique(run.payloads.get(f"wav{seconds}", lambda: _wav(seconds)), 0, "wav")
+    r = await run.client.post("/api/voice/upload", files={"file": ("setup.wav", wav, "audio/wav")})
+    r.raise_for_status()
+    run.state["audio_id"] = r.json()["audio_id"]
+
+
+def _scenarios() -> dict[str, Scenario]:
+    async def doc_setup(run: Run) -> None:
+        await _upload_doc(run, 60)
+
+    async def call_setup(run: Run) -> None:
+        await _upload_call(run, 600)
+
+    def query(run: Run, question: str, **extra) -> dict:
+        return {"doc_id": run.state["doc_id"], "question": question, **extra}
+
+    async def _json_post(run: Run, url: str, payload: dict) -> Outcome:
+        r = await run.client.post(url, json=payload)
+        return Outcome(r.status_code)
+
+    items = [
+        Scenario(
+            "docchat_upload_image",
+            "PNG screenshot: preprocess pool + one OCR call",
+            lambda run, i: _post_file(run, "/api/docchat/upload", "snip.png", _unique(run.payloads.get("png", _png), i, "png"), "image/png"),
+        ),
+        Scenario(
+            "docchat_upload_pdf",
+            "3-page PDF: streamed base64 body, one OCR call",
+            lambda run, i: _post_file(run, "/api/docchat/upload", "doc.pdf", _unique(run.payloads.get("pdf3", lambda: _pdf(3)), i, "pdf"), "application/pdf"),
+        ),
+        Scenario(
+            "docchat_upload_pdf_batched",
+            "40-page PDF: Files API upload + concurrent page-range OCR",
+            lambda run, i: _post_file(run, "/api/docchat/upload", "big.pdf", _unique(run.payloads.get("pdf40", lambda: _pdf(40)), i, "pdf"), "application/pdf"),
+        ),
+        Scenario(
+            "docchat_query",
+            "retrieval answer over a 60-page document, new question each time",
+            lambda run, i: _json_post(run, "/api/docchat/query", query(run, f"What is the amount on reference line {i}?")),
+            doc_setup,
+        ),
+        Scenario(
+            "docchat_query_cached",
+            "same question repeated: answer-cache hits",
+            lambda run, i: _json_post(run, "/api/docchat/query", query(run, "What is the total amount due?")),
+            doc_setup,
+        ),
+        Scenario(
+            "docchat_query_stream",
+            "streamed retrieval answer (SSE), new question each time",
+            lambda run, i: _sse(run, "/api/docchat/query/stream", query(run, f"Which clause mentions reference {i}?")),
+            doc_setup,
+        ),
+        Scenario(
+            "docchat_mapreduce",
+            "whole-document question: cached digests + reduce",
+            lambda run, i: _json_post(run, "/api/docchat/query", query(run, f"Summarize the document, focusing on item {i}.", mode="mapreduce")),
+            doc_setup,
+        ),
+        Scenario(
+            "voice_upload",
+            "30 s WAV: preprocess + one transcription call",
+            lambda run, i: _post_file(run, "/api/voice/upload", "call.wav", _unique(run.payloads.get("wav30", lambda: _wav(30)), i, "wav"), "audio/wav"),
+        ),
+        Scenario(
+            "voice_upload_long",
+            "5 min WAV: cut at silences, segments transcribed concurrently",
+            lambda run, i: _post_file(run, "/api/voice/upload", "long.wav", _unique(run.payloads.get("wav300", lambda: _wav(300)), i, "wav"), "audio/wav"),
+        ),
+        Scenario(
+            "voice_query",
+            "question over a 10 min call's timestamped segments",
+            lambda run, i: _json_post(run, "/api/voice/query", {"audio_id": run.state["audio_id"], "question": f"What did they say about order {i}?"}),
+            call_setup,
+        ),
+        Scenario(
+            "voice_query_stream",
+            "streamed answer over a 10 min call (SSE)",
+            lambda run, i: _sse(run, "/api/voice/query/stream", {"audio_id": run.state["audio_id"], "question": f"When was invoice {i} discussed?"}),
+            call_setup,
+        ),
+        Scenario(
+            "voice_sentiment_local",
+            "local NumPy sentiment tier only",
+            lambda run, i: _json_post(run, "/api/voice/sentiment", {"audio_id": run.state["audio_id"], "tier": "local"}),
+            call_setup,
+        ),
+        Scenario(
+            "voice_sentiment",
+            "local tier + LLM on flagged windows",
+            lambda run, i: _json_post(run, "/api/voice/sentiment", {"audio_id": run.state["audio_id"], "tier": "auto"}),
+            call_setup,
+        ),
+    ]
+    return {s.name: s for s in items}
+
+
+SCENARIOS = _scenarios()
+
+
+# ----------------------------
+# Processes
+# ----------------------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _spawn(cmd: list[str], env: dict, log_path: Path, cwd: Path = ROOT) -> subprocess.Popen:
+    log = open(log_path, "wb")
+    return subprocess.Popen(cmd, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+
+
+def migrate(env: dict, cwd: Path = ROOT) -> None:
+    """alembic upgrade head against env's DATABASE_URL (the app does not create tables)."""
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        cwd=cwd, env=env, check=True, capture_output=True,
+    )
+
+
+def _stop(proc: subprocess.Popen | None) -> None:
+    if proc is None or proc.poll() is not None:
+        return
+    os.killpg(proc.pid, signal.SIGTERM)
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        os.killpg(proc.pid, signal.SIGKILL)
+        proc.wait()
+
+
+async def _wait_ready(url: str, proc: subprocess.Popen | None, log_path: Path | None, timeout: float = 90) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url, timeout=5) as client:
+        while time.monotonic() < deadline:
+            if proc is not None and proc.poll() is not None:
+                tail = log_path.read_text(errors="replace")[-2000:] if log_path else ""
+                raise RuntimeError(f"{url} exited during startup:\n{tail}")
+            try:
+                if (await client.get("/metrics")).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"{url} did not become ready in {timeout:.0f}s")
+
+
+class RssSampler:
+    """Peak RSS of a process tree, sampled on a thread (the event loop is busy)."""
+
+    def __init__(self, pid: int | None, interval: float = 0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, tree_rss_mb(self.pid))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        if self.pid:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+# ----------------------------
+# Driver
+# ----------------------------
+
+async def _drive(run: Run, scenario: Scenario, concurrency: int, seconds: float, record: bool) -> tuple[list, Counter]:
+    latencies: list[tuple[float, float | None]] = []
+    statuses: Counter = Counter()
+    deadline = time.perf_counter() + seconds
+    counter = iter(range(10**9))
+
+    async def client_loop() -> None:
+        while time.perf_counter() < deadline:
+            i = next(counter)
+            start = time.perf_counter()
+            try:
+                outcome = await scenario.request(run, i)
+            except httpx.HTTPError as e:
+                outcome = Outcome(0)
+                statuses[type(e).__name__] += 1
+            elapsed = time.perf_counter() - start
+            if record:
+                statuses[str(outcome.status)] += outcome.status != 0
+                if 200 <= outcome.status < 300:
+                    latencies.append((elapsed, outcome.ttfb))
+
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return latencies, statuses
+
+
+async def _stub_counts(stub: httpx.AsyncClient) -> dict[str, int]:
+    data = (await stub.get("/stub/stats")).json()
+    return {endpoint: sum(by_status.values()) for endpoint, by_status in data["requests"].items()}
+
+
+async def run_scenarios(args, app_url: str, stub_url: str, app_pid: int | None) -> list[dict]:
+    rows = []
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency)
+    async with (
+        httpx.AsyncClient(base_url=app_url, timeout=timeout, limits=limits) as client,
+        httpx.AsyncClient(base_url=stub_url, timeout=10) as stub,
+    ):
+        run = Run(client=client, payloads=Payloads())
+        for name in args.scenarios:
+            scenario = SCENARIOS[name]
+            print(f"- {name}: {scenario.description}", file=sys.stderr, flush=True)
+            if scenario.setup is not None:
+                await scenario.setup(run)
+            if args.warmup > 0:
+                await _drive(run, scenario, args.concurrency, args.warmup, record=False)
+
+            before = await _stub_counts(stub)
+            with RssSampler(app_pid) as rss:
+                started = time.perf_counter()
+                latencies, statuses = await _drive(run, scenario, args.concurrency, args.duration, record=True)
+                elapsed = time.perf_counter() - started
+            after = await _stub_counts(stub)
+
+            ok = len(latencies)
+            total = sum(statuses.values())
+            upstream = {k: after.get(k, 0) - before.get(k, 0) for k in after}
+            row = {
+                "case": name,
+                "requests": total,
+                "ok": ok,
+                "errors": total - ok,
+                "error_rate": round((total - ok) / total, 4) if total else 0.0,
+                "rps": round(ok / elapsed, 2) if elapsed else 0.0,
+                **latency_summary([lat for lat, _ in latencies]),
+                "peak_rss_mb": round(rss.peak, 1),
+                "status": dict(statuses),
+                "upstream_per_request": {k: round(v / total, 2) for k, v in upstream.items() if v} if total else {},
+            }
+            ttfbs = [t for _, t in latencies if t is not None]
+            if ttfbs:
+                row.update(latency_summary(ttfbs, prefix="ttfb_"))
+            rows.append(row)
+    return rows
+
+
+def _app_env(args, tmp: Path, stub_url: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "MISTRAL_BASE_URL": stub_url,
+        "MISTRAL_API_KEY": "stub",
+        "DATABASE_URL": args.database_url or f"sqlite:///{tmp / 'bench.db'}",
+        "OCR_CACHE_DIR": str(tmp / "ocr-cache"),
+        "RAG_INDEX_DIR": str(tmp / "rag-index"),
+        "MAPREDUCE_CACHE_DIR": str(tmp / "mapreduce"),
+        "METRICS_DIR": str(tmp / "metrics"),
+    })
+    return env
+
+
+async def main_async(args) -> dict:
+    procs: list[subprocess.Popen] = []
+    with tempfile.TemporaryDirectory(prefix="bench-load-") as tmpdir:
+        tmp = Path(tmpdir)
+        try:
+            stub_url = args.stub_url
+            if not stub_url:
+                port = _free_port()
+                stub_url = f"http://127.0.0.1:{port}"
+                stub_cmd = [sys.executable, "-m", "benchmarks.mistral_stub", "--port", str(port), "--seed", "1"]
+                stub_cmd += _profile_argv(args)
+                procs.append(_spawn(stub_cmd, dict(os.environ), tmp / "stub.log"))
+                await _wait_ready_stub(stub_url, procs[-1], tmp / "stub.log")
+
+            app_url, app_pid = args.app_url, args.app_pid
+            if not app_url:
+                port = _free_port()
+                app_url = f"http://127.0.0.1:{port}"
+                app_cmd = [
+                    sys.executable, "-m", "uvicorn", "app.main:app",
+                    "--host", "127.0.0.1", "--port", str(port),
+                    "--workers", str(args.workers), "--log-level", "warning",
+                ]
+                env = _app_env(args, tmp, stub_url)
+                migrate(env)
+                procs.append(_spawn(app_cmd, env, tmp / "app.log"))
+                app_pid = procs[-1].pid
+                await _wait_ready(app_url, procs[-1], tmp / "app.log")
+
+            idle_rss = round(tree_rss_mb(app_pid), 1) if app_pid else 0.0
+            rows = await run_scenarios(args, app_url, stub_url, app_pid)
+        finally:
+            for proc in reversed(procs):
+                _stop(proc)
+
+    config = {
+        "profile": args.profile,
+        "concurrency": args.concurrency,
+        "duration_seconds": args.duration,
+        "warmup_seconds": args.warmup,
+        "workers": args.workers if not args.app_url else None,
+        "database": "sqlite" if not args.database_url else args.database_url.split(":", 1)[0],
+        "idle_rss_mb": idle_rss,
+    }
+    return result("load", rows, config)
+
+
+async def _wait_ready_stub(url: str, proc: subprocess.Popen, log_path: Path) -> None:
+    deadline = time.monotonic() + 30
+    async with httpx.AsyncClient(base_url=url, timeout=2) as client:
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(f"Mistral stub exited:\n{log_path.read_text(errors='replace')[-2000:]}")
+            try:
+                await client.get("/stub/stats")
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError("Mistral stub did not start")
+
+
+def _profile_argv(args) -> list[str]:
+    argv = ["--profile", args.profile]
+    if args.latency_scale != 1.0:
+        argv += ["--latency-scale", str(args.latency_scale)]
+    for name in ("spread", "error_rate", "retry_after", "ocr_pages", "page_chars", "answer_tokens", "stream_token_ms"):
+        value = getattr(args, name)
+        if value is not None:
+            argv += [f"--{name.replace('_', '-')}", str(value)]
+    return argv
+
+
+def _print_table(data: dict) -> None:
+    print(
+        f"{'case':28} {'req':>6} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'RSS MB':>8}",
+        file=sys.stderr,
+    )
+    for r in data["rows"]:
+        print(
+            f"{r['case']:28} {r['requests']:6d} {r['errors']:5d} {r['rps']:8.2f} "
+            f"{r['p50_ms']:9.1f} {r['p95_ms']:9.1f} {r['p99_ms']:9.1f} {r['peak_rss_mb']:8.1f}",
+            file=sys.stderr,
+        )
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=15.0, help="measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds per scenario")
+    parser.add_argument("--timeout", type=float, default=300.0, help="per-request timeout")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the app")
+    parser.add_argument("--database-url", help="default: a fresh SQLite file")
+    parser.add_argument("--app-url", help="use a running app instead of starting one")
+    parser.add_argument("--app-pid", type=int, help="pid of that app, for RSS sampling")
+    parser.add_argument("--stub-url", help="use a running Mistral stub instead of starting one")
+    parser.add_argument("--out", help="write the result JSON here (see benchmarks.compare)")
+    parser.add_argument("--json", action="store_true", help="print the result JSON to stdout")
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in args.scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    if args.app_url and not args.stub_url:
+        parser.error("--app-url needs --stub-url (the stub that app's MISTRAL_BASE_URL points at)")
+    assert args.profile in PROFILES
+    return args
+
+
+def main(argv: list[str]) -> None:
+    args = parse_args(argv)
+    data = asyncio.run(main_async(args))
+    _print_table(data)
+    if args.out:
+        write_result(data, args.out)
+    if args.json:
+        write_result(data, None)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
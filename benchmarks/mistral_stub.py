@@ -0,0 +1,386 @@
+# benchmarks/mistral_stub.py
+"""
+Local stand-in for the Mistral API, so throughput can be measured without spending quota.
+
+Serves every endpoint the app calls:
+    POST   /v1/chat/completions       JSON, or SSE deltas with "stream": true
+    POST   /v1/ocr                    data URLs, or a signed URL from /v1/files
+    POST   /v1/audio/transcriptions   multipart; segment timestamps follow the WAV duration
+    POST   /v1/embeddings             deterministic unit vectors (same text -> same vector)
+    POST   /v1/files, GET /v1/files/{id}/url, DELETE /v1/files/{id}
+    GET    /stub/stats                request counts by endpoint and status
+    POST   /stub/reset                clears the counters
+
+A profile (PROFILES) sets per-endpoint latency, its spread, the error rate and payload
+sizes; CLI flags override single fields.
+
+Usage:
+    python -m benchmarks.mistral_stub --port 8900 --profile realistic
+    python -m benchmarks.mistral_stub --profile degraded --error-rate 0.2
+    MISTRAL_BASE_URL=http://127.0.0.1:8900 MISTRAL_API_KEY=stub uvicorn app.main:app
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import math
+import random
+import re
+import time
+import uuid
+import wave
+from collections import Counter
+from dataclasses import asdict, dataclass, field, replace
+
+import numpy as np
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+ENDPOINTS = ("chat", "ocr", "transcribe", "embed", "files")
+
+
+@dataclass
+class Profile:
+    # Median latency in ms: chat per request, ocr per page, transcribe per audio minute,
+    # embed per request, files per request
+    latency_ms: dict[str, float] = field(default_factory=lambda: dict.fromkeys(ENDPOINTS, 0.0))
+    # Log-normal sigma around the median (0 = fixed latency; 0.5 gives a realistic p99 tail)
+    spread: float = 0.0
+    error_rate: float = 0.0
+    error_statuses: tuple[int, ...] = (429, 503)
+    retry_after: float = 1.0
+    ocr_pages: int = 1  # pages returned for images and PDFs without a readable /Count
+    page_chars: int = 1500
+    answer_tokens: int = 120
+    stream_token_ms: float = 0.0  # delay between streamed chat deltas
+    words_per_minute: int = 150
+    negative_ratio: float = 0.08  # share of transcript sentences the sentiment tier flags
+    embed_dim: int = 1024
+
+
+PROFILES = {
+    "instant": Profile(),
+    "realistic": Profile(
+        latency_ms={"chat": 700, "ocr": 900, "transcribe": 2500, "embed": 150, "files": 200},
+        spread=0.35,
+        stream_token_ms=15,
+    ),
+    "degraded": Profile(
+        latency_ms={"chat": 2100, "ocr": 2700, "transcribe": 7500, "embed": 450, "files": 600},
+        spread=0.6,
+        error_rate=0.15,
+        stream_token_ms=30,
+    ),
+    "large": Profile(
+        latency_ms={"chat": 1200, "ocr": 1200, "transcribe": 3000, "embed": 200, "files": 300},
+        spread=0.35,
+        ocr_pages=4,
+        page_chars=12000,
+        answer_tokens=800,
+        stream_token_ms=10,
+        words_per_minute=220,
+    ),
+}
+
+_WORDS = (
+    "invoice total amount due payment account customer order shipment contract clause "
+    "period quarter revenue balance schedule delivery reference policy coverage claim "
+    "patient provider service date number line item quantity price tax discount"
+).split()
+_SENTENCES = (
+    "Thanks for calling, how can I help you today?",
+    "I'm looking at the invoice from last month.",
+    "The total came to four hundred and twelve dollars.",
+    "Can you confirm the delivery date for the second order?",
+    "Sure, it is scheduled for the fourteenth.",
+    "Great, that works for us.",
+    "Let me check the account balance for you.",
+    "We applied the discount you asked about.",
+)
+_NEGATIVE = (
+    "This is completely unacceptable, I want to speak to a manager.",
+    "I'm really frustrated, nobody has fixed this in three weeks.",
+    "If this isn't resolved today I'm cancelling the contract.",
+)
+_COUNT_RE = re.compile(rb"/Count\s+(\d+)")
+
+
+def page_markdown(index: int, chars: int) -> str:
+    """One page of OCR-like markdown (heading, paragraphs, tables), deterministic per index."""
+    rng = random.Random(index)
+    parts = [f"# Section {index + 1}", ""]
+    size = 0
+    row = 0
+    while size < chars:
+        if row % 6 == 5:
+            parts.append("| Item | Qty | Amount |\n|---|---|---|")
+            parts.extend(f"| {rng.choice(_WORDS)} {k} | {rng.randint(1, 9)} | ${rng.uniform(5, 900):.2f} |" for k in range(4))
+        else:
+            words = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(12, 30)))
+            parts.append(f"{words.capitalize()} {rng.randint(1000, 99999)}.")
+        parts.append("")
+        size = sum(len(p) + 1 for p in parts)
+        row += 1
+    return "\n".join(parts)[: max(chars, 40)]
+
+
+class Stub:
+    def __init__(self, profile: Profile, seed: int | None = None):
+        self.profile = profile
+        self.rng = random.Random(seed)
+        self.counts: Counter[tuple[str, int]] = Counter()
+        self.bytes_in = 0
+        self.files: dict[str, int] = {}  # file id -> page count
+        self._pages = [page_markdown(i, profile.page_chars) for i in range(16)]
+
+    # --- shaping ---
+
+    async def delay(self, endpoint: str, units: float = 1.0) -> None:
+        base = self.profile.latency_ms.get(endpoint, 0.0) * units
+        if base <= 0:
+            return
+        if self.profile.spread > 0:
+            base *= self.rng.lognormvariate(0.0, self.profile.spread)
+        await asyncio.sleep(base / 1000)
+
+    def error(self, endpoint: str) -> Response | None:
+        if self.profile.error_rate <= 0 or self.rng.random() >= self.profile.error_rate:
+            return None
+        status = self.rng.choice(self.profile.error_statuses)
+        self.counts[(endpoint, status)] += 1
+        headers = {"Retry-After": f"{self.profile.retry_after:g}"} if status in (429, 503) else {}
+        return JSONResponse({"object": "error", "message": f"stub injected {status}"}, status, headers=headers)
+
+    def ok(self, endpoint: str, body) -> Response:
+        self.counts[(endpoint, 200)] += 1
+        return JSONResponse(body)
+
+    # --- payloads ---
+
+    def _answer(self) -> str:
+        words = [self.rng.choice(_WORDS) for _ in range(self.profile.answer_tokens)]
+        return " ".join(words).capitalize() + "."
+
+    def _transcript(self, seconds: float, diarize: bool) -> tuple[str, list[dict]]:
+        # One stock sentence (~9 words) per segment, paced at words_per_minute
+        n = max(1, math.ceil(seconds * self.profile.words_per_minute / 60 / 9))
+        step = seconds / n if seconds > 0 else 3.0
+        segments = []
+        for i in range(n):
+            text = (
+                self.rng.choice(_NEGATIVE)
+                if self.rng.random() < self.profile.negative_ratio
+                else self.rng.choice(_SENTENCES)
+            )
+            seg = {"start": round(i * step, 2), "end": round((i + 1) * step, 2), "text": text}
+            if diarize:
+                seg["speaker"] = f"speaker_{i % 2}"
+            segments.append(seg)
+        return " ".join(s["text"] for s in segments), segments
+
+    @staticmethod
+    def _wav_seconds(data: bytes) -> float | None:
+        try:
+            with wave.open(io.BytesIO(data)) as w:
+                return w.getnframes() / float(w.getframerate())
+        except (wave.Error, EOFError):
+            return None
+
+    def _vector(self, text: str) -> list[float]:
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        v = np.random.default_rng(seed).standard_normal(self.profile.embed_dim).astype(np.float32)
+        return (v / np.linalg.norm(v)).tolist()
+
+    def _ocr_pages(self, document: dict, pages: list[int] | None) -> int:
+        if pages:
+            return len(pages)
+        url = document.get("document_url") or document.get("image_url") or ""
+        if isinstance(url, dict):
+            url = url.get("url") or ""
+        if url.startswith("data:application/pdf;base64,"):
+            head = base64.b64decode(url.split(",", 1)[1][: 4 * 1024 * 1024], validate=False)
+            counts = [int(m) for m in _COUNT_RE.findall(head)]
+            return max(counts) if counts else self.profile.ocr_pages
+        if "/stub-files/" in url:
+            return self.files.get(url.rsplit("/", 1)[-1], self.profile.ocr_pages)
+        return self.profile.ocr_pages
+
+    # --- handlers ---
+
+    async def chat(self, request: Request) -> Response:
+        body = await request.body()
+        self.bytes_in += len(body)
+        payload = json.loads(body)
+        if (err := self.error("chat")) is not None:
+            return err
+        await self.delay("chat")
+        answer = self._answer()
+        if not payload.get("stream"):
+            return self.ok("chat", {
+                "id": f"stub-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "model": payload.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(body) // 4, "completion_tokens": self.profile.answer_tokens},
+            })
+
+        self.counts[("chat", 200)] += 1
+
+        async def events():
+            for i, word in enumerate(answer.split(" ")):
+                delta = word if i == 0 else f" {word}"
+                yield f"data: {json.dumps({'choices': [{'index': 0, 'delta': {'content': delta}}]})}\n\n"
+                if self.profile.stream_token_ms:
+                    await asyncio.sleep(self.profile.stream_token_ms / 1000)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def ocr(self, request: Request) -> Response:
+        body = await request.body()
+        self.bytes_in += len(body)
+        payload = json.loads(body)
+        if (err := self.error("ocr")) is not None:
+            return err
+        requested = payload.get("pages")
+        n = self._ocr_pages(payload.get("document") or {}, requested)
+        await self.delay("ocr", n)
+        indices = requested or list(range(n))
+        return self.ok("ocr", {
+            "model": payload.get("model"),
+            "pages": [
+                {"index": i, "markdown": self._pages[i % len(self._pages)], "images": [], "dimensions": None}
+                for i in indices
+            ],
+            "usage_info": {"pages_processed": len(indices), "doc_size_bytes": len(body)},
+        })
+
+    async def transcribe(self, request: Request) -> Response:
+        form = await request.form()
+        upload = form.get("file")
+        data = await upload.read() if upload is not None else b""
+        self.bytes_in += len(data)
+        if (err := self.error("transcribe")) is not None:
+            return err
+        seconds = self._wav_seconds(data) or len(data) / 16000  # compressed audio: ~128 kbit/s
+        await self.delay("transcribe", max(seconds / 60, 0.05))
+        text, segments = self._transcript(seconds, form.get("diarize") == "true")
+        out = {"model": form.get("model"), "text": text, "language": "en"}
+        if form.get("timestamp_granularities"):
+            out["segments"] = segments
+        return self.ok("transcribe", out)
+
+    async def embed(self, request: Request) -> Response:
+        body = await request.body()
+        self.bytes_in += len(body)
+        payload = json.loads(body)
+        if (err := self.error("embed")) is not None:
+            return err
+        await self.delay("embed")
+        texts = payload.get("input") or []
+        return self.ok("embed", {
+            "model": payload.get("model"),
+            "data": [{"index": i, "embedding": self._vector(t)} for i, t in enumerate(texts)],
+        })
+
+    async def upload_file(self, request: Request) -> Response:
+        form = await request.form()
+        upload = form.get("file")
+        data = await upload.read() if upload is not None else b""
+        self.bytes_in += len(data)
+        if (err := self.error("files")) is not None:
+            return err
+        await self.delay("files")
+        counts = [int(m) for m in _COUNT_RE.findall(data)]
+        file_id = uuid.uuid4().hex
+        self.files[file_id] = max(counts) if counts else self.profile.ocr_pages
+        return self.ok("files", {"id": file_id, "object": "file", "bytes": len(data)})
+
+    async def file_url(self, request: Request) -> Response:
+        if (err := self.error("files")) is not None:
+            return err
+        await self.delay("files")
+        file_id = request.path_params["file_id"]
+        return self.ok("files", {"url": f"{request.base_url}stub-files/{file_id}"})
+
+    async def delete_file(self, request: Request) -> Response:
+        self.files.pop(request.path_params["file_id"], None)
+        return self.ok("files", {"deleted": True})
+
+    async def stats(self, request: Request) -> Response:
+        by_endpoint: dict[str, dict[str, int]] = {}
+        for (endpoint, status), n in sorted(self.counts.items()):
+            by_endpoint.setdefault(endpoint, {})[str(status)] = n
+        return JSONResponse({"requests": by_endpoint, "bytes_in": self.bytes_in, "profile": asdict(self.profile)})
+
+    async def reset(self, request: Request) -> Response:
+        self.counts.clear()
+        self.bytes_in = 0
+        return JSONResponse({"ok": True})
+
+
+def create_app(profile: Profile, seed: int | None = None) -> Starlette:
+    stub = Stub(profile, seed)
+    return Starlette(routes=[
+        Route("/v1/chat/completions", stub.chat, methods=["POST"]),
+        Route("/v1/ocr", stub.ocr, methods=["POST"]),
+        Route("/v1/audio/transcriptions", stub.transcribe, methods=["POST"]),
+        Route("/v1/embeddings", stub.embed, methods=["POST"]),
+        Route("/v1/files", stub.upload_file, methods=["POST"]),
+        Route("/v1/files/{file_id}/url", stub.file_url, methods=["GET"]),
+        Route("/v1/files/{file_id}", stub.delete_file, methods=["DELETE"]),
+        Route("/stub/stats", stub.stats, methods=["GET"]),
+        Route("/stub/reset", stub.reset, methods=["POST"]),
+    ])
+
+
+def build_profile(args: argparse.Namespace) -> Profile:
+    profile = PROFILES[args.profile]
+    overrides = {}
+    if args.latency_scale != 1.0:
+        overrides["latency_ms"] = {k: v * args.latency_scale for k, v in profile.latency_ms.items()}
+    for name in ("spread", "error_rate", "retry_after", "ocr_pages", "page_chars", "answer_tokens", "stream_token_ms"):
+        value = getattr(args, name)
+        if value is not None:
+            overrides[name] = value
+    return replace(profile, **overrides)
+
+
+def add_profile_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="realistic")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiply every endpoint latency")
+    parser.add_argument("--spread", type=float, help="log-normal sigma of latencies")
+    parser.add_argument("--error-rate", type=float, help="share of requests answered 429/503")
+    parser.add_argument("--retry-after", type=float, help="Retry-After seconds sent with injected errors")
+    parser.add_argument("--ocr-pages", type=int, help="pages per image / unknown PDF")
+    parser.add_argument("--page-chars", type=int, help="markdown characters per OCR page")
+    parser.add_argument("--answer-tokens", type=int, help="words per chat answer")
+    parser.add_argument("--stream-token-ms", type=float, help="delay between streamed chat deltas")
+
+
+def main(argv: list[str] | None = None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--seed", type=int)
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+
+    profile = build_profile(args)
+    print(json.dumps({"stub": f"http://{args.host}:{args.port}", "profile": args.profile, **asdict(profile)}), flush=True)
+    started = time.time()
+    try:
+        uvicorn.run(create_app(profile, args.seed), host=args.host, port=args.port, log_level="warning")
+    finally:
+        print(f"stub stopped after {time.time() - started:.0f}s", flush=True)
+
+
+if __name__ == "__main__":
+    main()
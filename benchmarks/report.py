@@ -0,0 +1,99 @@
+# benchmarks/report.py
+"""
+Shared helpers for benchmark output: latency summaries, peak RSS and the result file.
+
+Every benchmark that writes a result file uses the same envelope so runs can be diffed
+with benchmarks.compare:
+
+    {"benchmark": "<name>", "created_at": ..., "git": "<commit>", "python": ..., "config": {...},
+     "rows": [{"case": "<name>", <numeric fields>...}, ...]}
+"""
+
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+from pathlib import Path
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def latency_summary(seconds: list[float], prefix: str = "") -> dict:
+    """p50/p95/p99/mean/max in ms for a list of durations in seconds."""
+    values = sorted(s * 1000 for s in seconds)
+    if not values:
+        return {f"{prefix}{k}_ms": 0.0 for k in ("p50", "p95", "p99", "mean", "max")}
+    return {
+        f"{prefix}p50_ms": round(percentile(values, 50), 4),
+        f"{prefix}p95_ms": round(percentile(values, 95), 4),
+        f"{prefix}p99_ms": round(percentile(values, 99), 4),
+        f"{prefix}mean_ms": round(sum(values) / len(values), 4),
+        f"{prefix}max_ms": round(values[-1], 4),
+    }
+
+
+def _children(pid: int) -> list[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def _rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def tree_rss_mb(pid: int) -> float:
+    """Current RSS of a process and all its descendants (Linux /proc; 0 elsewhere)."""
+    total, stack = 0, [pid]
+    while stack:
+        p = stack.pop()
+        total += _rss_kb(p)
+        stack.extend(_children(p))
+    return total / 1024
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def result(benchmark: str, rows: list[dict], config: dict | None = None) -> dict:
+    return {
+        "benchmark": benchmark,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git": git_commit(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "config": config or {},
+        "rows": rows,
+    }
+
+
+def write_result(data: dict, path: str | None) -> None:
+    """Writes to path (creating directories), or prints to stdout when path is None or '-'."""
+    text = json.dumps(data, indent=2)
+    if not path or path == "-":
+        print(text)
+        return
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text(text + "\n", encoding="utf-8")
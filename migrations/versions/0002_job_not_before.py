@@ -0,0 +1,24 @@
+"""jobs.not_before: earliest time a queued retry may be claimed
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:12:04
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("jobs") as batch_op:
+        batch_op.add_column(sa.Column("not_before", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("jobs") as batch_op:
+        batch_op.drop_column("not_before")
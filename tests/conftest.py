@@ -0,0 +1,16 @@
+# tests/conftest.py
+"""
+Settings are read from the environment when app.core.config is first imported, so point
+everything at throwaway locations before any test module imports the app.
+"""
+
+import os
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="app-tests-")
+
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ["RAG_INDEX_DIR"] = os.path.join(_TMP, "rag-index")
+os.environ["OCR_CACHE_DIR"] = ""
+os.environ["MAPREDUCE_CACHE_DIR"] = ""
+os.environ["METRICS_DIR"] = ""
@@ -0,0 +1,145 @@
+# tests/test_admission.py
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.services.ocr.admission import CircuitBreaker, MistralUnavailable, TokenBucket, retry_after_seconds
+from app.services.ocr.mistral import MistralAPIError, is_transient
+
+
+# ---- TokenBucket ----
+
+def test_bucket_burst_then_rate_limited():
+    bucket = TokenBucket(rate=50, burst=3)
+
+    async def take(n: int) -> float:
+        start = time.monotonic()
+        for _ in range(n):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(take(3)) < 0.015
+    assert asyncio.run(take(2)) >= 0.035  # two more tokens at 50/s
+    assert bucket.waiting == 0
+
+
+def test_bucket_refills_up_to_burst():
+    bucket = TokenBucket(rate=1000, burst=2)
+    asyncio.run(bucket.acquire())
+    time.sleep(0.01)
+    assert bucket.stats()["tokens"] == 2
+
+
+def test_bucket_disabled_when_rate_is_zero():
+    bucket = TokenBucket(rate=0, burst=1)
+
+    async def many():
+        for _ in range(100):
+            await bucket.acquire()
+
+    asyncio.run(many())
+    assert bucket.stats()["tokens"] == 1
+
+
+# ---- CircuitBreaker ----
+
+def _expire(breaker: CircuitBreaker) -> None:
+    breaker.opened_at -= breaker.open_for + 1
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker("ocr", failure_threshold=3, reset_seconds=30)
+    for _ in range(2):
+        assert breaker.before_call() is False
+        breaker.record_failure(False)
+    assert breaker.state == "closed"
+    breaker.record_failure(False)
+    assert breaker.state == "open"
+    with pytest.raises(MistralUnavailable) as exc:
+        breaker.before_call()
+    assert 29 < exc.value.retry_after <= 30
+    assert breaker.stats()["opens"] == 1
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker("ocr", failure_threshold=2, reset_seconds=30)
+    breaker.record_failure(False)
+    breaker.record_success(False)
+    breaker.record_failure(False)
+    assert breaker.state == "closed"
+
+
+def test_retry_after_extends_open_period():
+    breaker = CircuitBreaker("chat", failure_threshold=1, reset_seconds=5)
+    breaker.record_failure(False, retry_after=60)
+    assert breaker.remaining() > 55
+
+
+def test_half_open_allows_one_probe():
+    breaker = CircuitBreaker("chat", failure_threshold=1, reset_seconds=5)
+    breaker.record_failure(False)
+    _expire(breaker)
+
+    assert breaker.before_call() is True
+    assert breaker.state == "half_open"
+    with pytest.raises(MistralUnavailable):
+        breaker.before_call()  # second caller while the probe is out
+
+    breaker.record_success(True)
+    assert breaker.state == "closed"
+    assert breaker.before_call() is False
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker("chat", failure_threshold=5, reset_seconds=5)
+    for _ in range(5):
+        breaker.record_failure(False)
+    _expire(breaker)
+    assert breaker.before_call() is True
+    breaker.record_failure(True)
+    assert breaker.state == "open"
+    with pytest.raises(MistralUnavailable):
+        breaker.before_call()
+
+
+def test_abandoned_probe_lets_next_call_probe():
+    breaker = CircuitBreaker("chat", failure_threshold=1, reset_seconds=5)
+    breaker.record_failure(False)
+    _expire(breaker)
+    assert breaker.before_call() is True
+    breaker.abandon(True)
+    assert breaker.before_call() is True
+
+
+def test_breaker_disabled_with_zero_threshold():
+    breaker = CircuitBreaker("chat", failure_threshold=0, reset_seconds=5)
+    for _ in range(10):
+        breaker.record_failure(False)
+    assert breaker.before_call() is False
+
+
+# ---- retry classification ----
+
+def test_retry_after_header_forms():
+    assert retry_after_seconds(httpx.Response(429, headers={"Retry-After": "7"})) == 7.0
+    assert retry_after_seconds(httpx.Response(503, headers={"Retry-After": "Thu, 01 Jan 1970 00:00:00 GMT"})) == 0.0
+    assert retry_after_seconds(httpx.Response(503)) is None
+    assert retry_after_seconds(None) is None
+
+
+@pytest.mark.parametrize(
+    "exc, transient",
+    [
+        (httpx.ConnectError("refused"), True),
+        (httpx.ReadTimeout("slow"), True),
+        (MistralAPIError("Mistral OCR API error (501): ...", 501), True),
+        (MistralAPIError("Mistral OCR API error (400): ...", 400), False),
+        (MistralAPIError("Mistral OCR API error (422): ...", 422), False),
+        (ValueError("bad page range"), False),
+    ],
+)
+def test_is_transient(exc, transient):
+    assert is_transient(exc) is transient
@@ -0,0 +1,90 @@
+# tests/test_lexical.py
+
+import numpy as np
+import pytest
+
+from app.services.rag.lexical import MAX_TOKEN_CHARS, Bm25Index, tokenize
+from app.services.rag.retrieval import reciprocal_rank_fusion
+
+
+def test_tokenize_keeps_compound_ids_and_parts():
+    assert tokenize("Invoice INV-10023 total $1,240.50") == [
+        "invoice", "inv-10023", "inv", "10023", "total", "1,240.50", "1", "240", "50",
+    ]
+
+
+def test_bm25_ranks_exact_id_first():
+    index = Bm25Index.build([
+        "Invoice INV-10023 issued to Acme for consulting.",
+        "Invoice INV-10024 issued to Globex for hardware.",
+        "Payment terms: net 30 days.",
+    ])
+    hits = index.search("what is the amount on INV-10024?", k=3)
+    assert hits[0][0] == 1
+    assert all(a[1] >= b[1] for a, b in zip(hits, hits[1:]))
+
+
+def test_bm25_min_ratio_drops_weak_hits():
+    index = Bm25Index.build(["refund refund refund policy", "the policy", "unrelated text"])
+    assert [o for o, _ in index.search("refund policy", k=3)] == [0, 1]
+    assert [o for o, _ in index.search("refund policy", k=3, min_ratio=0.5)] == [0]
+
+
+def test_bm25_empty_and_unknown_terms():
+    assert Bm25Index.build([]).search("anything", k=5) == []
+    assert Bm25Index.build(["some text"]).search("missing", k=5) == []
+
+
+def test_bm25_save_load_roundtrip(tmp_path):
+    index = Bm25Index.build(["alpha beta", "beta gamma"])
+    index.save(tmp_path / "doc.npz")
+    loaded = Bm25Index.load(tmp_path / "doc.npz")
+    assert loaded.search("gamma", k=2) == index.search("gamma", k=2)
+
+
+def test_rrf_ignores_raw_scores_and_sums_ranks():
+    vector = [(3, 0.91), (1, 0.90)]
+    lexical = [(1, 12.5), (7, 3.0)]
+    fused = reciprocal_rank_fusion([vector, lexical], k=60)
+    assert fused[1] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[3] == pytest.approx(1 / 61)
+    assert max(fused, key=fused.get) == 1
+
+
+def test_rrf_empty_rankings():
+    assert reciprocal_rank_fusion([[], []], k=60) == {}
+
+
+def test_long_tokens_are_dropped_but_their_parts_kept():
+    url = "https://example.com/" + "a" * 300
+    toks = tokenize(f"see {url} and {'Q' * 200}")
+    assert all(len(t) <= MAX_TOKEN_CHARS for t in toks)
+    assert {"see", "https", "example", "com", "and"} <= set(toks)
+
+
+def test_vocabulary_size_does_not_depend_on_longest_token():
+    texts = [f"term{i} shared" for i in range(2000)]
+    small = Bm25Index.build(texts)
+    big = Bm25Index.build(texts + ["x" * 60])
+    assert big.nbytes - small.nbytes < 1000
+
+
+def test_term_lookup_in_packed_vocabulary():
+    index = Bm25Index.build(["alpha beta", "beta gamma", "inv-10023 delta"])
+    assert [o for o, _ in index.search("inv-10023", k=3)] == [2]
+    assert sorted(o for o, _ in index.search("beta", k=3)) == [0, 1]
+    assert index.search("aardvark zulu", k=3) == []
+
+
+def test_load_legacy_fixed_width_vocabulary(tmp_path):
+    index = Bm25Index.build(["alpha beta", "beta gamma"])
+    terms = [index._term(i).decode() for i in range(len(index.term_offs) - 1)]
+    np.savez(
+        tmp_path / "old.npz",
+        terms=np.array(terms, dtype=str),
+        offsets=index.offsets,
+        post_chunk=index.post_chunk,
+        post_tf=index.post_tf,
+        chunk_len=index.chunk_len,
+    )
+    assert Bm25Index.load(tmp_path / "old.npz").search("gamma", k=2) == index.search("gamma", k=2)
@@ -0,0 +1,42 @@
+# tests/test_mapreduce.py
+
+import pytest
+
+from app.services.rag.mapreduce import is_global_question
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "Summarize the document",
+        "Give me an overview of the contract",
+        "What are the key takeaways?",
+        "List all invoice numbers",
+        "list every action item",
+        "Give me all the dates",
+        "What are all the fees mentioned in the agreement?",
+        "Find all of the deadlines in this contract",
+        "What does each section cover?",
+        "What did every speaker agree to?",
+        "How many times was the refund mentioned?",
+        "Is the tone consistent throughout?",
+    ],
+)
+def test_global_questions(question):
+    assert is_global_question(question)
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "Are all fees refundable?",
+        "What is paid every month?",
+        "Is everything all right with the invoice?",
+        "Do all employees get a bonus?",
+        "Is the deposit due every quarter?",
+        "What is the total due on INV-10023?",
+        "Who signed the agreement?",
+    ],
+)
+def test_lookup_questions(question):
+    assert not is_global_question(question)
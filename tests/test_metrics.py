@@ -0,0 +1,52 @@
+# tests/test_metrics.py
+
+import asyncio
+
+import pytest
+
+from app.core.metrics import HTTP_REQUESTS, MetricsMiddleware, registry
+
+
+class _Route:
+    def __init__(self, path: str):
+        self.path = path
+
+
+def _call(app, path: str) -> None:
+    scope = {"type": "http", "path": path, "method": "GET", "route": _Route(path)}
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        pass
+
+    asyncio.run(MetricsMiddleware(app)(scope, receive, send))
+
+
+def _requests(template: str) -> float:
+    samples = registry.snapshot()[HTTP_REQUESTS.name]["samples"]
+    return sum(v for labels, v in samples if labels[1] == template)
+
+
+async def _boom(scope, receive, send):
+    raise RuntimeError("handler failed")
+
+
+async def _ok(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def test_errors_propagate_and_are_counted():
+    before = _requests("/api/boom")
+    with pytest.raises(RuntimeError):
+        _call(_boom, "/api/boom")
+    assert _requests("/api/boom") == before + 1
+
+
+def test_metrics_errors_propagate_and_are_not_counted():
+    with pytest.raises(RuntimeError):
+        _call(_boom, "/metrics")
+    _call(_ok, "/metrics")
+    assert _requests("/metrics") == 0
@@ -0,0 +1,26 @@
+# tests/test_ocr_batching.py
+
+import pytest
+
+from app.tools.docchat.service import _page_ranges
+
+
+@pytest.mark.parametrize(
+    "total, size, expected",
+    [
+        (10, 4, [(0, 4), (4, 8), (8, 10)]),
+        (8, 4, [(0, 4), (4, 8)]),
+        (3, 8, [(0, 3)]),
+        (1, 1, [(0, 1)]),
+        (0, 4, []),
+        (3, 0, [(0, 1), (1, 2), (2, 3)]),  # size is clamped to 1
+    ],
+)
+def test_page_ranges(total, size, expected):
+    assert _page_ranges(total, size) == expected
+
+
+def test_page_ranges_cover_every_page_once():
+    ranges = _page_ranges(101, 7)
+    pages = [p for start, end in ranges for p in range(start, end)]
+    assert pages == list(range(101))
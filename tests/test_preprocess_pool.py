@@ -0,0 +1,64 @@
+# tests/test_preprocess_pool.py
+
+import asyncio
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pytest
+
+from app.services.ocr.pool import PreprocessPool
+
+cv2 = pytest.importorskip("cv2")
+
+
+def _png() -> bytes:
+    img = np.full((120, 320), 255, dtype=np.uint8)
+    cv2.putText(img, "INV-10023", (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 1.2, 0, 2)
+    return cv2.imencode(".png", img)[1].tobytes()
+
+
+def _kill_workers(pool: PreprocessPool) -> None:
+    for proc in list(pool._executor._processes.values()):
+        proc.kill()
+        proc.join()
+
+
+@pytest.fixture
+def pool():
+    pool = PreprocessPool(workers=1, max_queue=2)
+    yield pool
+    pool.shutdown()
+
+
+def test_dead_idle_worker_is_replaced(pool):
+    image = _png()
+    out, _ = asyncio.run(pool.run(image))
+    assert out.startswith(b"\x89PNG")
+
+    broken = pool._executor
+    _kill_workers(pool)
+    time.sleep(0.5)  # let the executor notice
+
+    out, _ = asyncio.run(pool.run(image))
+    assert out.startswith(b"\x89PNG")
+    assert pool._executor is not broken
+    assert pool.in_flight == 0
+
+
+def test_only_the_in_flight_request_fails(pool):
+    image = _png()
+    asyncio.run(pool.run(image))
+
+    async def crash_mid_run():
+        task = asyncio.create_task(pool.run(image))
+        await asyncio.sleep(0)
+        _kill_workers(pool)
+        with pytest.raises(BrokenProcessPool):
+            await task
+
+    asyncio.run(crash_mid_run())
+    assert pool.in_flight == 0
+
+    out, _ = asyncio.run(pool.run(image))
+    assert out.startswith(b"\x89PNG")
@@ -0,0 +1,108 @@
+# tests/test_segments.py
+
+import pytest
+
+from app.tools.voicechat.segments import Segment, SegmentIndex, _keywords, normalize_segments
+
+
+@pytest.fixture
+def index() -> SegmentIndex:
+    return SegmentIndex([
+        Segment(0, 0.0, 300.0, "Hello, thanks for calling.", "speaker_1"),
+        Segment(1, 300.0, 900.0, "I was charged twice for my refund.", "speaker_2"),
+        Segment(2, 900.0, 1800.0, "Let me look into the refunds.", "speaker_1"),
+    ])
+
+
+@pytest.mark.parametrize(
+    "question, start, end",
+    [
+        ("what was said after minute 10?", 600, None),
+        ("anything before 5 minutes?", None, 300),
+        ("between minutes 2 and 4", 120, 240),
+        ("what happened around minute 12", 660, 780),
+        ("what happened at 12:30", 690, 810),
+        ("summarize the first 5 minutes", None, 300),
+        ("summarize the last 10 minutes", 1200, None),
+        ("what did they say about refunds", None, None),
+        ("what was said after 10m", 600, None),
+        ("until 12:30, what was agreed", None, 750),
+        # bare numbers are counts, not times
+        ("was the customer charged from 2 cards?", None, None),
+        ("what was promised by 3 people?", None, None),
+        ("did they call since 2 agents were busy", None, None),
+        ("what happened between 2 and 4 calls ago", None, None),
+        ("charged from 2 cards after minute 5", 300, None),
+    ],
+)
+def test_time_filters(index, question, start, end):
+    f = index.parse_filters(question)
+    assert (f.start, f.end) == (start, end)
+
+
+@pytest.mark.parametrize(
+    "question, speaker",
+    [
+        ("what did speaker_2 say?", "speaker_2"),
+        ("what did speaker 1 say about refunds", "speaker_1"),
+        ("what did Speaker #2 complain about", "speaker_2"),
+        ("what did speaker 3 say", None),
+        ("what did speaker 10 say", None),
+        ("what did speaker_10 say", None),
+        ("what did the caller say", None),
+    ],
+)
+def test_speaker_filters(index, question, speaker):
+    assert index.parse_filters(question).speaker == speaker
+
+
+def test_combined_filters_are_active(index):
+    f = index.parse_filters("what did speaker 2 say after minute 5")
+    assert (f.speaker, f.start, f.end) == ("speaker_2", 300, None)
+    assert f.active
+    assert not index.parse_filters("what was the refund amount").active
+
+
+def test_query_applies_filters(index):
+    assert [s.ord for s in index.query(speaker="speaker_1")] == [0, 2]
+    assert [s.ord for s in index.query(start=600)] == [1, 2]
+
+
+def test_normalize_segments_drops_untimed_and_empty():
+    segments = normalize_segments([
+        {"start": 0, "end": 1.5, "text": " hi ", "speaker_id": 1},
+        {"start": 1.5, "end": 2, "text": "  "},
+        {"text": "no times"},
+        {"start": 2, "end": 3, "text": "bye", "chunk_speaker": "1:speaker_1"},
+    ])
+    assert [(s.ord, s.text, s.speaker) for s in segments] == [(0, "hi", "1"), (1, "bye", None)]
+
+
+def test_bare_numbers_stay_keywords():
+    assert "2 cards" in _keywords("was I charged from 2 cards after minute 5")
+    assert "minute" not in _keywords("was I charged from 2 cards after minute 5")
+
+
+def test_whole_transcript_sent_unfiltered_when_it_fits(index):
+    segments, filters = index.select_for_question("what was said after minute 10?", budget_tokens=10_000)
+    assert [s.ord for s in segments] == [0, 1, 2]
+    assert not filters.active
+
+
+def test_filter_applies_over_budget():
+    long = SegmentIndex([
+        Segment(i, i * 120.0, (i + 1) * 120.0, f"part {i} " + "words " * 50, "speaker_1")
+        for i in range(10)
+    ])
+    segments, filters = long.select_for_question("what was said after minute 10?", budget_tokens=200)
+    assert filters.start == 600
+    assert segments and all(s.end > 600 for s in segments)
+
+
+def test_bare_number_does_not_filter_over_budget():
+    segments = [Segment(0, 0.0, 60.0, "I was charged on both of my 2 cards.", "speaker_2")]
+    segments += [Segment(i, i * 60.0, (i + 1) * 60.0, "unrelated filler " * 40, "speaker_1") for i in range(1, 10)]
+    index = SegmentIndex(segments)
+    chosen, filters = index.select_for_question("was the customer charged from 2 cards?", budget_tokens=150)
+    assert not filters.active
+    assert 0 in [s.ord for s in chosen]
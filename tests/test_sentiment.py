@@ -0,0 +1,68 @@
+# tests/test_sentiment.py
+
+import numpy as np
+
+from app.tools.voicechat.sentiment import flagged_windows, score_texts
+
+
+def test_polarity_and_negation():
+    scores = score_texts([
+        "Thanks, that was really helpful.",
+        "This is terrible and I am very frustrated.",
+        "The service was not bad at all.",
+        "Okay, my account number is 4471.",
+    ])
+    positive, negative, negated, neutral = scores.sentiment.tolist()
+    assert positive > 0.2
+    assert negative < -0.35
+    assert negated > 0
+    assert neutral == 0
+    assert "not bad" in scores.evidence[2]
+
+
+def test_negation_stops_at_clause_boundary():
+    scores = score_texts(["No, it is great."])
+    assert scores.sentiment[0] > 0
+    assert "great" in scores.evidence[0]
+
+
+def test_escalation_abuse_and_shouting_flags():
+    scores = score_texts([
+        "I want to speak to a manager right now.",
+        "Shut up, you idiot.",
+        "WHY IS THIS STILL NOT WORKING",
+        "Sure, I can wait a moment.",
+    ])
+    flags = scores.flags
+    assert flags["escalation"].tolist() == [True, False, True, False]
+    assert flags["abusive"].tolist() == [False, True, False, False]
+    assert scores.flagged.tolist() == [True, True, True, False]
+
+
+def test_score_texts_empty_batch():
+    scores = score_texts([])
+    assert len(scores.sentiment) == 0
+    assert scores.evidence == []
+
+
+def test_slice_keeps_rows_aligned():
+    scores = score_texts(["great", "terrible", "fine"])
+    part = scores.slice(1, 3)
+    assert part.sentiment.tolist() == scores.sentiment[1:3].tolist()
+    assert part.evidence == [["terrible"], ["fine"]]
+
+
+def test_flagged_windows_adds_context_and_merges():
+    flagged = np.array([0, 0, 1, 0, 0, 0, 1, 0, 1, 0], dtype=bool)
+    assert flagged_windows(flagged, context=1) == [(1, 3), (5, 9)]
+    assert flagged_windows(flagged, context=0) == [(2, 2), (6, 6), (8, 8)]
+    assert flagged_windows(flagged, context=2) == [(0, 9)]
+
+
+def test_flagged_windows_clips_to_bounds():
+    assert flagged_windows(np.array([1, 0, 0, 0, 1], dtype=bool), context=1) == [(0, 1), (3, 4)]
+
+
+def test_flagged_windows_nothing_flagged():
+    assert flagged_windows(np.zeros(5, dtype=bool), context=1) == []
+    assert flagged_windows(np.zeros(0, dtype=bool), context=1) == []
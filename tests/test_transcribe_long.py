@@ -0,0 +1,34 @@
+# tests/test_transcribe_long.py
+
+from app.tools.voicechat.service import stitch_transcripts
+
+
+def test_stitch_shifts_segment_times():
+    text, segments = stitch_transcripts(
+        [(0.0, 30.0), (30.0, 55.0)],
+        [
+            {"text": "Hello.", "segments": [{"start": 1.0, "end": 2.5, "text": "Hello."}]},
+            {"text": "Bye.", "segments": [{"start": 0.5, "end": 1.25, "text": "Bye."}]},
+        ],
+    )
+    assert text == "Hello. Bye."
+    assert [(s["start"], s["end"]) for s in segments] == [(1.0, 2.5), (30.5, 31.25)]
+
+
+def test_stitch_untimed_output_spans_its_cut():
+    text, segments = stitch_transcripts([(10.0, 20.0), (20.0, 30.0)], [{"text": "Only text."}, {"text": ""}])
+    assert text == "Only text."
+    assert segments == [{"start": 10.0, "end": 20.0, "text": "Only text."}]
+
+
+def test_stitch_without_speakers_keeps_chunk_labels():
+    outputs = [
+        {"text": "a", "segments": [{"start": 0, "end": 1, "text": "a", "speaker": "speaker_1"}]},
+        {"text": "b", "segments": [{"start": 0, "end": 1, "text": "b", "speaker_id": "speaker_1"}]},
+    ]
+    _, kept = stitch_transcripts([(0, 5), (5, 10)], outputs)
+    assert [s.get("speaker") for s in kept] == ["speaker_1", None]
+
+    _, dropped = stitch_transcripts([(0, 5), (5, 10)], outputs, keep_speakers=False)
+    assert all("speaker" not in s and "speaker_id" not in s for s in dropped)
+    assert [s["chunk_speaker"] for s in dropped] == ["0:speaker_1", "1:speaker_1"]
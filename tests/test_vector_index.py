@@ -0,0 +1,103 @@
+# tests/test_vector_index.py
+
+import numpy as np
+import pytest
+
+from app.services.rag.retrieval import VectorIndex
+
+
+def _unit(rows: list[list[float]]) -> np.ndarray:
+    v = np.asarray(rows, dtype=np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+@pytest.fixture(params=["float32", "int8"])
+def index(request, tmp_path):
+    return VectorIndex(str(tmp_path / "vectors"), dtype=request.param)
+
+
+def test_add_and_search(index):
+    index.add("a", _unit([[1, 0, 0], [0, 1, 0]]), "m")
+    index.add("b", _unit([[0, 0, 1]]), "m")
+    hits = index.search(_unit([[0, 0.1, 1]]), k=2)[0]
+    assert [(d, o) for d, o, _ in hits] == [("b", 0), ("a", 1)]
+    assert hits[0][2] == pytest.approx(0.995, abs=0.01)
+    assert index.stats()["rows"] == 3
+
+
+def test_search_restricted_to_doc(index):
+    index.add("a", _unit([[1, 0], [0.7, 0.7]]), "m")
+    index.add("b", _unit([[1, 0]]), "m")
+    hits = index.search(_unit([[1, 0]]), k=5, doc_id="a")[0]
+    assert [(d, o) for d, o, _ in hits] == [("a", 0), ("a", 1)]
+    assert index.search(_unit([[1, 0]]), k=5, doc_id="missing") == [[]]
+
+
+def test_readd_tombstones_previous_rows(index):
+    index.add("a", _unit([[1, 0], [0, 1]]), "m")
+    index.add("a", _unit([[0, 1]]), "m")
+    stats = index.stats()
+    assert (stats["rows"], stats["dead_rows"], stats["documents"]) == (3, 2, 1)
+    hits = index.search(_unit([[1, 0]]), k=5)[0]
+    assert [(d, o) for d, o, _ in hits] == [("a", 0)]
+
+
+def test_delete_then_compact(index):
+    index.add("a", _unit([[1, 0]]), "m")
+    index.add("b", _unit([[0, 1], [0.6, 0.8]]), "m")
+    assert index.delete("a")
+    assert not index.delete("a")
+    assert not index.compact(min_dead_ratio=0.5)  # 1 of 3 rows dead
+
+    index.add("c", _unit([[1, 1]]), "m")
+    index.delete("c")
+    assert index.compact(min_dead_ratio=0.5)  # 2 of 4 rows dead
+    stats = index.stats()
+    assert (stats["rows"], stats["dead_rows"], stats["generation"]) == (2, 0, 1)
+    hits = index.search(_unit([[0, 1]]), k=5)[0]
+    assert [(d, o) for d, o, _ in hits] == [("b", 0), ("b", 1)]
+    assert not (index.root / "vectors-0.bin").exists()
+
+
+def test_other_instance_sees_writes(tmp_path):
+    writer = VectorIndex(str(tmp_path), dtype="float32")
+    reader = VectorIndex(str(tmp_path), dtype="float32")
+    assert reader.search(_unit([[1, 0]]), k=1) == [[]]
+    writer.add("a", _unit([[1, 0]]), "m")
+    assert reader.has_doc("a", "m")
+    assert not reader.has_doc("a", "other-model")
+    assert reader.search(_unit([[1, 0]]), k=1)[0][0][:2] == ("a", 0)
+
+
+@pytest.mark.parametrize("change", ["dim", "model", "dtype"])
+def test_backend_change_resets_index(tmp_path, change):
+    VectorIndex(str(tmp_path), dtype="float32").add("old", _unit([[1, 0]]), "m")
+    index = VectorIndex(str(tmp_path), dtype="int8" if change == "dtype" else "float32")
+    vectors = _unit([[1, 0, 0]]) if change == "dim" else _unit([[1, 0]])
+    index.add("new", vectors, "m2" if change == "model" else "m")
+    stats = index.stats()
+    assert (stats["rows"], stats["documents"]) == (1, 1)
+    assert stats["dtype"] == index.dtype
+    assert [d for d, _, _ in index.search(vectors, k=5)[0]] == ["new"]
+
+
+def test_invalid_dtype(tmp_path):
+    with pytest.raises(ValueError):
+        VectorIndex(str(tmp_path), dtype="float16")
+
+
+def test_torn_tail_from_crashed_writer_is_dropped(tmp_path):
+    index = VectorIndex(str(tmp_path), dtype="int8")
+    index.add("a", _unit([[1, 0], [0, 1]]), "m")
+    # A writer died after appending data but before publishing meta.json
+    vec_path, scale_path = index._data_paths(0)
+    with open(vec_path, "ab") as fh:
+        fh.write(b"\x7f\x7f" * 3)
+    with open(scale_path, "ab") as fh:
+        fh.write(np.full(5, 1000.0, dtype=np.float32).tobytes())
+
+    index.add("b", _unit([[0.6, 0.8]]), "m")
+    assert scale_path.stat().st_size == 3 * 4
+    hits = index.search(_unit([[0.6, 0.8]]), k=1)[0]
+    assert hits[0][:2] == ("b", 0)
+    assert hits[0][2] == pytest.approx(1.0, abs=0.02)